@@ -1,6 +1,38 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
+# manage.py commands that serve requests, every other command (migrate,
+# shell, run_download_worker, ...) starts no background threads
+SERVING_COMMANDS = {'runserver'}
+
+
+def _serves_requests():
+    """True in web, ASGI and bot processes, False in management commands and celery"""
+    program = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if program == 'manage.py':
+        if len(sys.argv) < 2 or sys.argv[1] not in SERVING_COMMANDS:
+            return False
+        # The autoreloader's parent process only watches files
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return program != 'celery'
+
 
 class DownloaderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'downloader'
+
+    def ready(self):
+        # Wakes long-poll status requests when a download is saved
+        from . import status_updates  # noqa: F401
+
+        if _serves_requests():
+            from .expiry import get_expiry_scheduler
+            from .jobs import get_queue_maintenance
+
+            # Leases of jobs cut off by a restart are reclaimed, their staging
+            # swept and files that came due while the process was down are
+            # released without waiting for the next submission
+            get_queue_maintenance().start()
+            get_expiry_scheduler().start()
@@ -0,0 +1,233 @@
+"""
+Multi-item posts: Instagram carousels/sidecars and Pinterest boards
+Every item is downloaded concurrently (with a per-job cap) and recorded as
+a MediaAsset of the one DownloadedVideo, so a carousel takes about as long
+as its largest item
+"""
+
+import copy
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+from django.conf import settings
+from django.utils import timezone
+
+from . import http_client, segmented, staging
+from .content_store import FALLBACK_VARIANT_PREFIX, attach_blob, fallback_variant, release_file, store_file
+from .formats import format_id_selector, plan_formats
+from .models import DownloadedVideo, MediaAsset
+
+logger = logging.getLogger(__name__)
+
+# Referer sent with direct item fetches, CDNs check it against the platform
+PLATFORM_REFERERS = {
+    'instagram': 'https://www.instagram.com/',
+    'facebook': 'https://www.facebook.com/',
+    'tiktok': 'https://www.tiktok.com/',
+    'pinterest': 'https://www.pinterest.com/',
+}
+
+# One item of a post, either a direct media URL or a yt-dlp entry info dict
+CarouselItem = namedtuple('CarouselItem', ['position', 'media_type', 'url', 'entry'])
+
+
+def get_carousel_concurrency():
+    """Items of one job downloaded at the same time"""
+    return getattr(settings, 'CAROUSEL_CONCURRENCY', 4)
+
+
+def get_carousel_max_items():
+    return getattr(settings, 'CAROUSEL_MAX_ITEMS', 20)
+
+
+def items_from_children(children):
+    """Items from bypass media_info children ({'is_video', 'video_url', 'image_url'})"""
+    items = []
+    for child in children[:get_carousel_max_items()]:
+        if child.get('is_video') and child.get('video_url'):
+            items.append(CarouselItem(len(items), 'video', child['video_url'], None))
+        elif child.get('image_url'):
+            items.append(CarouselItem(len(items), 'image', child['image_url'], None))
+    return items
+
+
+def items_from_info(info):
+    """Items from a yt-dlp playlist info dict, None if it isn't a playlist"""
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        return None
+    entries = [entry for entry in (info.get('entries') or []) if entry]
+    return [
+        CarouselItem(position, 'video' if entry.get('formats') else 'image', entry.get('url'), entry)
+        for position, entry in enumerate(entries[:get_carousel_max_items()])
+    ]
+
+
+def _fetch_url(url, media_path, name, media_type, platform, timeout, deadline=None):
+    """Stream a direct media URL into media_path, returns the file path"""
+    from .utils import IMAGE_FORMAT_EXTENSIONS, _image_ext_from_response, _stream_image_to_temp
+
+    referer = PLATFORM_REFERERS.get(platform)
+    headers = {'Referer': referer} if referer else {}
+    if media_type == 'video':
+        file_path = os.path.join(media_path, f"{name}.mp4")
+        segmented.download(url, file_path, headers=headers, timeout=timeout, deadline=deadline)
+        return file_path
+
+    response = http_client.get(url, stream=True, timeout=(10, timeout),
+                               headers=headers)
+    try:
+        response.raise_for_status()
+        tmp_path, image_format, _ = _stream_image_to_temp(response, media_path, deadline=deadline)
+    finally:
+        response.close()
+
+    ext = IMAGE_FORMAT_EXTENSIONS.get(image_format) or _image_ext_from_response(response, url)
+    file_path = os.path.join(media_path, f"{name}.{ext}")
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def _fetch_entry(item, media_path, name, ydl_opts, platform, timeout, deadline=None):
+    """Download a yt-dlp entry with its own YoutubeDL (instances aren't thread safe)"""
+    from .utils import _get_downloaded_filepath
+
+    entry = item.entry
+    if item.media_type == 'image':
+        thumbnails = [t for t in entry.get('thumbnails') or [] if t.get('url')]
+        url = entry.get('url') or (thumbnails and max(
+            thumbnails, key=lambda t: (t.get('width') or 0) * (t.get('height') or 0))['url'])
+        if not url:
+            raise ValueError('No image found')
+        return _fetch_url(url, media_path, name, 'image', platform, timeout, deadline)
+
+    opts = {**ydl_opts, 'outtmpl': os.path.join(media_path, f'{name}.%(ext)s')}
+    last_error = None
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        for fmt in plan_formats(entry.get('formats'), platform)[:3]:
+            try:
+                ydl.format_selector = format_id_selector(fmt['format_id'])
+                result = ydl.process_ie_result(copy.deepcopy(entry), download=True)
+                file_path = _get_downloaded_filepath(ydl, result)
+                if os.path.exists(file_path):
+                    return file_path
+            except Exception as e:
+                last_error = e
+    raise last_error or ValueError('No format could be downloaded')
+
+
+def download_items(video_obj, items, deadline, ydl_opts=None):
+    """
+    Download every item of a post, at most CAROUSEL_CONCURRENCY at a time
+    The worker threads only do network and disk IO, the results are stored
+    and recorded on the calling thread
+    Returns [(item, file path)] of the items that were downloaded
+    """
+    media_path = staging.job_dir(video_obj)
+    timeout = deadline.timeout(300)
+
+    def fetch(item):
+        name = f'item_{item.position + 1}'
+        if item.entry is not None:
+            return _fetch_entry(item, media_path, name, ydl_opts or {}, video_obj.platform, timeout, deadline)
+        return _fetch_url(item.url, media_path, name, item.media_type, video_obj.platform, timeout, deadline)
+
+    workers = max(1, min(get_carousel_concurrency(), len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='carousel') as pool:
+        futures = [(item, pool.submit(fetch, item)) for item in items]
+
+    downloaded = []
+    for item, future in futures:
+        try:
+            downloaded.append((item, future.result()))
+        except Exception as e:
+            logger.warning(f"Carousel item {item.position + 1} of {video_obj.url} failed: {e}")
+    return downloaded
+
+
+def finish_carousel(video_obj, downloaded, fallback=False):
+    """
+    Record downloaded items as MediaAssets and complete video_obj
+    The DownloadedVideo itself points at the first item, fallback marks the
+    stored items as written by a fallback strategy
+    """
+    from .utils import schedule_file_cleanup
+
+    video_obj.assets.all().delete()
+    assets = []
+    for item, file_path in downloaded:
+        asset = MediaAsset(video=video_obj, position=len(assets), source_url=(item.url or '')[:1000])
+        variant = fallback_variant(item.media_type) if fallback else item.media_type
+        store_file(asset, file_path, item.media_type, variant=variant)
+        asset.save()
+        assets.append(asset)
+
+    first = assets[0]
+    attach_blob(video_obj, first.blob)
+    video_obj.status = 'completed'
+    video_obj.completed_at = timezone.now()
+    video_obj.save()
+
+    schedule_file_cleanup(video_obj, delay_minutes=10)
+    return assets
+
+
+def reuse_carousel(video_obj):
+    """
+    Complete video_obj from the stored items of another download of the same
+    post. Items are stored under media_key/N, so the post's own key has no
+    blob of its own
+    Returns False if there is no such download or one of its files is gone
+    """
+    from .utils import schedule_file_cleanup
+
+    # Items of fallback strategies (low quality copies) are never reused
+    source = DownloadedVideo.objects.filter(
+        media_key=video_obj.media_key, status='completed', assets__blob__isnull=False,
+    ).exclude(pk=video_obj.pk).exclude(
+        assets__blob__variant__startswith=FALLBACK_VARIANT_PREFIX,
+    ).order_by('-completed_at').first()
+    if source is None:
+        return False
+
+    def drop(assets):
+        for asset in assets:
+            release_file(asset, save=False)
+            asset.delete()
+        return False
+
+    if not video_obj.title or video_obj.title == 'Processing...':
+        video_obj.title = source.title
+    video_obj.assets.all().delete()
+    assets = []
+    for item in source.assets.select_related('blob'):
+        asset = MediaAsset(video=video_obj, position=item.position, source_url=item.source_url)
+        if item.blob is None or not os.path.exists(item.blob.file_path) or not attach_blob(asset, item.blob):
+            return drop(assets)
+        asset.save()
+        assets.append(asset)
+
+    if not attach_blob(video_obj, assets[0].blob):
+        return drop(assets)
+    video_obj.status = 'completed'
+    video_obj.completed_at = timezone.now()
+    video_obj.save()
+
+    schedule_file_cleanup(video_obj, delay_minutes=10)
+    return True
+
+
+def download_carousel(video_obj, items, deadline, ydl_opts=None, fallback=False):
+    """
+    Download a multi-item post into video_obj (fallback as in finish_carousel)
+    Returns True if at least one item was downloaded
+    """
+    downloaded = download_items(video_obj, items, deadline, ydl_opts)
+    if not downloaded:
+        return False
+    if len(downloaded) < len(items):
+        logger.info(f"Downloaded {len(downloaded)} of {len(items)} items of {video_obj.url}")
+    finish_carousel(video_obj, downloaded, fallback=fallback)
+    return True
@@ -0,0 +1,192 @@
+"""
+Circuit breaker per (platform, strategy)
+Keeps the recent outcomes of every download strategy in the Django cache.
+A strategy whose recent failure rate is too high is skipped (open) until a
+cooldown passes, then one job probes it (half open) and its result closes
+or reopens the circuit. Healthy strategies are tried best first. When the
+cache backend fails every circuit counts as closed, a broken cache must not
+stop downloads
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'circuit:'
+STATE_TTL = 24 * 60 * 60
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_CONFIG = {
+    'WINDOW': 20,         # outcomes remembered per strategy
+    'MAX_AGE': 600,       # seconds an outcome counts as recent
+    'MIN_CALLS': 5,       # outcomes needed before the circuit can open
+    'FAILURE_RATE': 0.8,  # open when this share of the window failed
+    'COOLDOWN': 120,      # seconds before an open circuit is probed again
+    'CACHE': 'default',
+}
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'CIRCUIT_BREAKER', {}))
+    return config
+
+
+def _cache(config):
+    return caches[config['CACHE']]
+
+
+def _key(platform, strategy):
+    return f'{KEY_PREFIX}{platform}:{strategy}'
+
+
+def _load(cache, platform, strategy, config, now):
+    state = cache.get(_key(platform, strategy)) or {'results': [], 'opened_at': None}
+    # Outcomes are (timestamp, 1 or 0), forget the ones that aren't recent
+    state['results'] = [r for r in state['results'] if now - r[0] < config['MAX_AGE']]
+    return state
+
+
+def _state_of(state, config, now):
+    if state['opened_at'] is None:
+        return CLOSED
+    if now - state['opened_at'] < config['COOLDOWN']:
+        return OPEN
+    return HALF_OPEN
+
+
+def _success_rate(state):
+    """Recent success rate, smoothed so unknown strategies start at 0.5"""
+    results = state['results']
+    return (sum(ok for _, ok in results) + 1) / (len(results) + 2)
+
+
+def get_state(platform, strategy):
+    config = get_config()
+    now = time.time()
+    return _state_of(_load(_cache(config), platform, strategy, config, now), config, now)
+
+
+def order_strategies(platform, strategies):
+    """
+    Drop strategies whose circuit is open and sort the rest by recent
+    success rate (ties keep the given order)
+    """
+    config = get_config()
+    cache = _cache(config)
+    now = time.time()
+    ranked = []
+    try:
+        for index, strategy in enumerate(strategies):
+            state = _load(cache, platform, strategy, config, now)
+            if _state_of(state, config, now) == OPEN:
+                continue
+            ranked.append((-_success_rate(state), index, strategy))
+    except Exception as e:
+        logger.warning(f"Circuit breaker cache unavailable, keeping the {platform} strategy order: {e}")
+        return list(strategies)
+    return [strategy for _, _, strategy in sorted(ranked)]
+
+
+def all_open(platform, strategies):
+    """Check whether the circuit of every strategy is open"""
+    config = get_config()
+    cache = _cache(config)
+    now = time.time()
+    try:
+        return all(_state_of(_load(cache, platform, strategy, config, now), config, now) == OPEN for strategy in strategies)
+    except Exception as e:
+        logger.warning(f"Circuit breaker cache unavailable: {e}")
+        return False
+
+
+def allow(platform, strategy, last_resort=False):
+    """
+    Check right before running a strategy
+    A half open circuit lets exactly one caller through as the probe, so
+    does an open one when it is the last resort of its platform
+    """
+    config = get_config()
+    cache = _cache(config)
+    now = time.time()
+    try:
+        state = _state_of(_load(cache, platform, strategy, config, now), config, now)
+        if state == CLOSED:
+            return True
+        if state == OPEN and not last_resort:
+            return False
+        return cache.add(_key(platform, strategy) + ':probe', True, timeout=config['COOLDOWN'])
+    except Exception as e:
+        logger.warning(f"Circuit breaker cache unavailable, running {platform}/{strategy}: {e}")
+        return True
+
+
+def record(platform, strategy, success, counted=True):
+    """
+    Record the outcome of a strategy
+    Failures that say nothing about the strategy (a private, deleted or
+    invalid post) are not counted, they only end a probe
+    Concurrent writers may drop an outcome now and then, which is fine for
+    a failure rate
+    """
+    try:
+        _record(platform, strategy, success, counted)
+    except Exception as e:
+        logger.warning(f"Circuit breaker cache unavailable, outcome of {platform}/{strategy} not recorded: {e}")
+
+
+def _record(platform, strategy, success, counted):
+    config = get_config()
+    cache = _cache(config)
+    key = _key(platform, strategy)
+    if not success and not counted:
+        cache.delete(key + ':probe')
+        return
+
+    now = time.time()
+    state = _load(cache, platform, strategy, config, now)
+    was = _state_of(state, config, now)
+
+    state['results'] = (state['results'] + [(now, 1 if success else 0)])[-config['WINDOW']:]
+
+    if was != CLOSED:
+        # Outcome of the half open probe (or of a job started before the
+        # circuit opened) decides the circuit
+        if success:
+            state['opened_at'] = None
+            state['results'] = [(now, 1)]
+            logger.info(f"Circuit {platform}/{strategy} closed")
+        else:
+            state['opened_at'] = now
+        cache.delete(key + ':probe')
+    else:
+        results = state['results']
+        failures = sum(1 for _, ok in results if not ok)
+        if len(results) >= config['MIN_CALLS'] and failures / len(results) >= config['FAILURE_RATE']:
+            state['opened_at'] = now
+            logger.warning(f"Circuit {platform}/{strategy} opened after {failures}/{len(results)} failures")
+
+    cache.set(key, state, timeout=STATE_TTL)
+
+
+def breaker_stats(platform, strategies):
+    """State and recent success rate of each strategy (for debugging)"""
+    config = get_config()
+    cache = _cache(config)
+    now = time.time()
+    stats = {}
+    for strategy in strategies:
+        state = _load(cache, platform, strategy, config, now)
+        stats[strategy] = {
+            'state': _state_of(state, config, now),
+            'calls': len(state['results']),
+            'success_rate': _success_rate(state),
+        }
+    return stats
@@ -0,0 +1,160 @@
+"""
+Batched cleanup of old download files
+Expired rows are walked in keyset order on (completed_at, id), one chunk at
+a time. Every chunk is released with a handful of bulk queries in one short
+transaction and its files are deleted afterwards on a bounded thread pool,
+so a backlog of hundreds of thousands of files doesn't hold the database
+"""
+
+import logging
+import os
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .models import DownloadedVideo, MediaAsset, MediaBlob
+
+logger = logging.getLogger(__name__)
+
+# Outcome of one chunk, released/freed/failed are totals so far
+CleanupProgress = namedtuple('CleanupProgress', ['chunk', 'rows', 'released', 'freed', 'failed'])
+
+
+def get_chunk_size():
+    return getattr(settings, 'CLEANUP_CHUNK_SIZE', 500)
+
+
+def get_cleanup_workers():
+    return getattr(settings, 'CLEANUP_WORKERS', 8)
+
+
+def _expired(cutoff):
+    return DownloadedVideo.objects.filter(
+        status='completed',
+        completed_at__lt=cutoff,
+    ).exclude(file_path='')
+
+
+def _chunks(queryset, chunk_size):
+    """Rows of queryset in (completed_at, id) order, chunk_size at a time"""
+    after = None
+    while True:
+        rows = queryset
+        if after is not None:
+            rows = rows.filter(Q(completed_at__gt=after[0]) | Q(completed_at=after[0], pk__gt=after[1]))
+        chunk = list(
+            rows.order_by('completed_at', 'pk').values_list('pk', 'completed_at', 'blob_id', 'file_path')[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1][1], chunk[-1][0]
+
+
+def _release_chunk(chunk):
+    """
+    Drop the file references of a chunk of rows (and of their carousel items)
+    with bulk queries, returns the paths of the files nobody references any more
+    """
+    ids = [pk for pk, _, _, _ in chunk]
+    with transaction.atomic():
+        # Rows released by someone else since they were read are skipped
+        locked = DownloadedVideo.objects.filter(pk__in=ids).exclude(file_path='')
+        if connection.features.has_select_for_update:
+            locked = locked.select_for_update()
+        rows = list(locked.values_list('pk', 'blob_id', 'file_path'))
+        if not rows:
+            return [], 0
+        ids = [pk for pk, _, _ in rows]
+
+        assets = list(MediaAsset.objects.filter(video_id__in=ids).values_list('blob_id', 'file_path'))
+        references = Counter(blob_id for _, blob_id, _ in rows if blob_id)
+        references.update(blob_id for blob_id, _ in assets if blob_id)
+        # Files stored before the content store existed belong to their row
+        orphans = [path for _, blob_id, path in rows if not blob_id and path]
+        orphans += [path for blob_id, path in assets if not blob_id and path]
+
+        DownloadedVideo.objects.filter(pk__in=ids).update(blob=None, file_path='', filename='', expires_at=None)
+        MediaAsset.objects.filter(video_id__in=ids).delete()
+
+        # One UPDATE per distinct number of references dropped
+        by_count = {}
+        for blob_id, count in references.items():
+            by_count.setdefault(count, []).append(blob_id)
+        for count, blob_ids in by_count.items():
+            MediaBlob.objects.filter(pk__in=blob_ids).update(ref_count=F('ref_count') - count)
+
+        dead_blobs = list(
+            MediaBlob.objects.filter(pk__in=list(references), ref_count__lte=0).values_list('pk', 'sha256', 'file_path')
+        )
+        MediaBlob.objects.filter(pk__in=[pk for pk, _, _ in dead_blobs], ref_count__lte=0).delete()
+
+        # The same content may have been stored again under a new blob
+        reused = set(MediaBlob.objects.filter(
+            sha256__in=[sha256 for _, sha256, _ in dead_blobs]
+        ).values_list('sha256', flat=True))
+
+    return [path for _, sha256, path in dead_blobs if sha256 not in reused] + orphans, len(rows)
+
+
+def _remove(file_path):
+    """Delete a file, returns (bytes freed, error or None)"""
+    try:
+        size = os.path.getsize(file_path)
+        os.remove(file_path)
+        return size, None
+    except FileNotFoundError:
+        return 0, None
+    except OSError as e:
+        return 0, e
+
+
+def _size(file_path):
+    try:
+        return os.path.getsize(file_path), None
+    except FileNotFoundError:
+        return 0, None
+    except OSError as e:
+        return 0, e
+
+
+def iter_cleanup(cutoff, chunk_size=None, workers=None, dry_run=False):
+    """
+    Release the files of downloads completed before cutoff
+    Yields a CleanupProgress after every chunk
+    dry_run only measures what would be freed
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    workers = workers or get_cleanup_workers()
+    released = freed = failed = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cleanup') as pool:
+        for number, chunk in enumerate(_chunks(_expired(cutoff), chunk_size), 1):
+            if dry_run:
+                paths, rows = [path for _, _, _, path in chunk], len(chunk)
+                results = pool.map(_size, paths)
+            else:
+                paths, rows = _release_chunk(chunk)
+                results = pool.map(_remove, paths)
+
+            for path, (size, error) in zip(paths, results):
+                if error:
+                    failed += 1
+                    logger.error(f"Error deleting file {path}: {error}")
+                freed += size
+            released += rows
+            yield CleanupProgress(number, rows, released, freed, failed)
+
+
+def cleanup_old_downloads(cutoff, **options):
+    """Run iter_cleanup to the end, returns the last CleanupProgress"""
+    progress = CleanupProgress(0, 0, 0, 0, 0)
+    for progress in iter_cleanup(cutoff, **options):
+        logger.info(
+            f"Cleanup chunk {progress.chunk}: {progress.released} released, "
+            f"{progress.freed / (1024*1024):.2f} MB freed"
+        )
+    return progress
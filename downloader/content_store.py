@@ -0,0 +1,186 @@
+"""
+Content-addressed store for completed downloads
+Every DownloadedVideo of the same media references one MediaBlob, the file
+is only deleted when the last reference to it is released.
+Files are stored under their SHA-256 with a two-level directory fan-out
+(downloads/ab/cd/abcd...mp4), so names never collide and no directory
+grows without bound. The title is only used as the download filename
+"""
+
+import hashlib
+import logging
+import os
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaBlob
+from .staging import publish
+
+logger = logging.getLogger(__name__)
+
+# Levels of two hex characters in front of a stored file (256 dirs each)
+SHARD_LEVELS = 2
+
+# Variant prefix of blobs written by fallback strategies (thumbnails, low
+# quality or scraped copies), they are never reused for other downloads
+FALLBACK_VARIANT_PREFIX = 'fallback:'
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(sha256, ext):
+    """Where the file with this content hash is stored"""
+    shards = [sha256[2 * level:2 * level + 2] for level in range(SHARD_LEVELS)]
+    return os.path.join(settings.MEDIA_ROOT, 'downloads', *shards, f'{sha256}{ext}')
+
+
+def display_filename(title, file_path, fallback='download'):
+    """Human-readable name a stored file is downloaded as"""
+    safe_title = "".join(c for c in (title or '') if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
+    return f"{safe_title or fallback}{os.path.splitext(file_path)[1]}"
+
+
+def fallback_variant(variant):
+    """Variant of a blob written by a fallback strategy"""
+    return f'{FALLBACK_VARIANT_PREFIX}{variant}'
+
+
+def find_blob(media_key, variant=None, media_type=None):
+    """
+    Find a reusable stored blob for a media key (and variant or media type),
+    or None. Blobs of fallback strategies are never returned
+    """
+    if not media_key:
+        return None
+    blobs = MediaBlob.objects.filter(media_key=media_key, ref_count__gt=0).exclude(
+        variant__startswith=FALLBACK_VARIANT_PREFIX
+    )
+    if variant:
+        blobs = blobs.filter(variant=variant)
+    if media_type:
+        blobs = blobs.filter(media_type=media_type)
+    for blob in blobs[:5]:
+        if os.path.exists(blob.file_path):
+            return blob
+    return None
+
+
+def attach_blob(video_obj, blob):
+    """
+    Point a DownloadedVideo at an existing blob and take a reference
+    Returns False if the blob was released in the meantime
+    """
+    if not MediaBlob.objects.filter(pk=blob.pk, ref_count__gt=0).update(ref_count=F('ref_count') + 1):
+        return False
+    video_obj.blob = blob
+    video_obj.file_path = blob.file_path
+    video_obj.media_type = blob.media_type
+    if blob.title and (not video_obj.title or video_obj.title == 'Processing...'):
+        video_obj.title = blob.title
+    video_obj.filename = display_filename(video_obj.title, blob.file_path, blob.media_type)
+    return True
+
+
+def store_file(video_obj, file_path, media_type, variant=''):
+    """
+    Store a freshly downloaded (staged) file and reference it from video_obj
+    (a DownloadedVideo or one of its MediaAssets)
+    The file is moved to its content-addressed path. If a blob with the
+    same content already exists the new copy is removed and the existing
+    blob is referenced instead
+    """
+    sha256 = hash_file(file_path)
+    stored_path = blob_path(sha256, os.path.splitext(file_path)[1].lower())
+
+    for _ in range(3):
+        blob = MediaBlob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            size = os.path.getsize(file_path)
+            try:
+                with transaction.atomic():
+                    blob = MediaBlob.objects.create(
+                        media_key=video_obj.media_key or '',
+                        variant=variant,
+                        sha256=sha256,
+                        file_path=stored_path,
+                        size=size,
+                        media_type=media_type,
+                        title=(video_obj.title or '')[:255],
+                        ref_count=1,
+                    )
+                    # Same content always lands on the same path, so the
+                    # file is in place before the blob row is visible
+                    publish(file_path, stored_path)
+            except IntegrityError:
+                # Another worker stored the same content first
+                continue
+            video_obj.blob = blob
+            video_obj.file_path = blob.file_path
+            video_obj.filename = display_filename(video_obj.title, blob.file_path, media_type)
+            video_obj.media_type = media_type
+            return blob
+
+        if os.path.exists(blob.file_path) and attach_blob(video_obj, blob):
+            if os.path.abspath(blob.file_path) != os.path.abspath(file_path):
+                os.remove(file_path)
+                logger.info(f"Deduplicated {file_path} into blob {blob.pk}")
+            return blob
+
+        # Blob file is gone or the blob is being released, drop it and retry
+        if not os.path.exists(blob.file_path):
+            MediaBlob.objects.filter(pk=blob.pk).delete()
+
+    raise IOError(f"Could not store {file_path} in the content store")
+
+
+def release_file(video_obj, save=True):
+    """
+    Drop video_obj's reference to its file (and to its carousel items)
+    The file is deleted only when no other download references it
+    Returns the number of bytes freed on disk
+    """
+    freed = 0
+    blob_id = video_obj.blob_id
+
+    assets = getattr(video_obj, 'assets', None)
+    if assets is not None and video_obj.pk:
+        for asset in assets.all():
+            freed += release_file(asset, save=False)
+            asset.delete()
+
+    if blob_id:
+        MediaBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+        blob = MediaBlob.objects.filter(pk=blob_id, ref_count__lte=0).first()
+        # Conditional delete, only one releaser gets to remove the file
+        if blob and MediaBlob.objects.filter(pk=blob_id, ref_count__lte=0).delete()[0]:
+            # The same content may have been stored again in the meantime
+            if not MediaBlob.objects.filter(sha256=blob.sha256).exists():
+                freed += _remove(blob.file_path)
+    elif video_obj.file_path:
+        # Downloads stored before the content store existed
+        freed += _remove(video_obj.file_path)
+
+    video_obj.blob = None
+    video_obj.file_path = ''
+    video_obj.filename = ''
+    if save:
+        video_obj.save(update_fields=['blob', 'file_path', 'filename'])
+    return freed
+
+
+def _remove(file_path):
+    try:
+        size = os.path.getsize(file_path)
+        os.remove(file_path)
+        return size
+    except FileNotFoundError:
+        return 0
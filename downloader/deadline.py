@@ -0,0 +1,68 @@
+"""
+End-to-end deadline of a download job
+A job gets one budget when it is accepted, every stage takes its timeouts
+and retries from what is left of it instead of from fixed settings
+"""
+
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class DeadlineExceeded(Exception):
+    """The job's time budget ran out"""
+
+    def __init__(self, stage=None):
+        self.stage = stage
+        super().__init__(f"Deadline exceeded{f' during {stage}' if stage else ''}")
+
+
+def get_job_deadline():
+    """Seconds a job may take from being accepted to being done"""
+    return getattr(settings, 'DOWNLOAD_JOB_DEADLINE', 600)
+
+
+class Deadline:
+    """Absolute point in (wall clock) time, so it survives a hand-over to a worker"""
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds):
+        return cls(time.time() + seconds)
+
+    @classmethod
+    def for_job(cls, video_obj):
+        """Deadline of a DownloadedVideo, counted from when it was accepted"""
+        accepted = video_obj.created_at or timezone.now()
+        return cls(accepted.timestamp() + get_job_deadline())
+
+    def remaining(self):
+        return max(self.expires_at - time.time(), 0.0)
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage=None):
+        """Raise DeadlineExceeded if no time is left"""
+        if self.expired:
+            raise DeadlineExceeded(stage)
+
+    def child(self, seconds):
+        """Deadline for one stage, at most seconds long and never past this one"""
+        return Deadline(min(self.expires_at, time.time() + seconds))
+
+    def timeout(self, default):
+        """A stage timeout shrunk to the remaining time"""
+        self.check()
+        return min(default, self.remaining())
+
+    def retries(self, default, per_try):
+        """How many of default retries of per_try seconds each still fit"""
+        return max(min(default, int(self.remaining() // max(per_try, 1)) - 1), 0)
+
+    def __repr__(self):
+        return f"<Deadline {self.remaining():.1f}s left>"
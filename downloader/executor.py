@@ -0,0 +1,131 @@
+"""
+Bounded download worker pool shared by the web views and the Telegram bot
+Keeps a fixed number of download threads per process and a bounded backlog
+so a burst of submissions can't start hundreds of yt-dlp runs at once
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadQueueFull(Exception):
+    """Raised when the download backlog is full and the job was not accepted"""
+
+
+class DownloadExecutor:
+    """Fixed-size pool of download worker threads with a bounded backlog"""
+
+    def __init__(self, max_workers=4, max_backlog=50):
+        self.max_workers = max_workers
+        self.max_backlog = max_backlog
+        self._queue = queue.Queue(maxsize=max_backlog)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def _ensure_workers(self):
+        """Start worker threads lazily on the first submission"""
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.max_workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    name=f'download-worker-{i}',
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                with self._lock:
+                    self._active += 1
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    logger.exception(f"Download job failed: {e}")
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+                finally:
+                    with self._lock:
+                        self._active -= 1
+            finally:
+                # Worker threads are long-lived, don't keep stale DB connections
+                close_old_connections()
+                self._queue.task_done()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue a job and return a Future for its result
+        Raises DownloadQueueFull if the backlog is full
+        """
+        self._ensure_workers()
+        future = Future()
+        try:
+            self._queue.put_nowait((future, fn, args, kwargs))
+        except queue.Full:
+            raise DownloadQueueFull(
+                f"Download backlog is full ({self.max_backlog} jobs waiting)"
+            )
+        return future
+
+    def stats(self):
+        """Current pool usage, useful for logging and debugging"""
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queue.qsize(),
+                'max_backlog': self.max_backlog,
+            }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_download_executor():
+    """Get the process-wide download executor configured from settings"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DownloadExecutor(
+                    max_workers=getattr(settings, 'DOWNLOAD_WORKERS', 4),
+                    max_backlog=getattr(settings, 'DOWNLOAD_QUEUE_SIZE', 50),
+                )
+    return _executor
+
+
+def submit_download(video_obj):
+    """
+    Queue a DownloadedVideo job on the shared executor
+    Raises DownloadQueueFull if the backlog is full
+    """
+    from .jobs import get_queue_maintenance, run_job
+
+    executor = get_download_executor()
+    # Recovers staging and reclaims leases once jobs run in this process
+    get_queue_maintenance().start()
+    return executor.submit(run_job, video_obj.pk)
+
+
+def queue_overflow_to_workers():
+    """
+    True when jobs that don't fit in the local backlog should stay pending
+    for run_download_worker processes instead of being rejected
+    """
+    return getattr(settings, 'DOWNLOAD_QUEUE_OVERFLOW', 'reject') == 'queue'
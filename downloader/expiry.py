@@ -0,0 +1,151 @@
+"""
+Expiry of downloaded files
+A completed download keeps its file for a while, then the file is released.
+The deadline is stored on the row (DownloadedVideo.expires_at) and one
+scheduler thread per process keeps the upcoming deadlines in a heap, wakes
+up when the earliest one is due and releases everything due in one batch.
+Deadlines survive restarts, a new scheduler loads them from the table
+"""
+
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .content_store import release_file
+from .models import DownloadedVideo
+
+logger = logging.getLogger(__name__)
+
+
+def get_batch_size():
+    return getattr(settings, 'FILE_EXPIRY_BATCH_SIZE', 200)
+
+
+def get_poll_interval():
+    """Seconds between checks of the table for deadlines set by other processes"""
+    return getattr(settings, 'FILE_EXPIRY_POLL_INTERVAL', 60)
+
+
+def release_due(now=None, limit=None):
+    """
+    Release the files of every download whose deadline passed
+    Each row is claimed by clearing its expires_at first, so a row due in
+    several processes at once is released only once
+    Returns (released, bytes freed)
+    """
+    now = now or timezone.now()
+    limit = limit or get_batch_size()
+    released = freed = 0
+
+    while True:
+        due = list(
+            DownloadedVideo.objects.filter(expires_at__lte=now)
+            .order_by('expires_at')
+            .values_list('pk', 'expires_at')[:limit]
+        )
+        for pk, expires_at in due:
+            if not DownloadedVideo.objects.filter(pk=pk, expires_at=expires_at).update(expires_at=None):
+                continue  # Claimed by another process or rescheduled
+            try:
+                freed += release_file(DownloadedVideo.objects.get(pk=pk))
+                released += 1
+            except Exception as e:
+                logger.error(f"Could not release file of download {pk}: {e}")
+        if len(due) < limit:
+            break
+
+    if released:
+        logger.info(f"Released {released} expired file(s), {freed / (1024 * 1024):.2f} MB freed")
+    return released, freed
+
+
+class ExpiryScheduler:
+    """Single thread that runs release_due when the next deadline is due"""
+
+    def __init__(self):
+        self._heap = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, expires_at):
+        with self._condition:
+            heapq.heappush(self._heap, expires_at)
+            self._condition.notify()
+            self._ensure_thread()
+
+    def start(self):
+        with self._condition:
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='file-expiry', daemon=True)
+            self._thread.start()
+
+    def _load_pending(self):
+        """Deadlines left in the table by earlier processes"""
+        pending = DownloadedVideo.objects.filter(expires_at__isnull=False).values_list('expires_at', flat=True)
+        with self._condition:
+            for expires_at in pending.iterator():
+                heapq.heappush(self._heap, expires_at)
+
+    def _wait_until_due(self):
+        """Block until the earliest deadline is due or the poll interval passed"""
+        with self._condition:
+            while True:
+                now = timezone.now()
+                if not (self._heap and self._heap[0] <= now):
+                    wait = get_poll_interval()
+                    if self._heap:
+                        wait = min(wait, (self._heap[0] - now).total_seconds())
+                    if self._condition.wait(timeout=max(wait, 0.1)):
+                        continue  # A new deadline was scheduled
+                # Everything due now is covered by one release_due, which
+                # also picks up deadlines set by other processes
+                now = timezone.now()
+                while self._heap and self._heap[0] <= now:
+                    heapq.heappop(self._heap)
+                return
+
+    def _run(self):
+        try:
+            self._load_pending()
+        except Exception as e:
+            logger.error(f"Could not load pending file expiries: {e}")
+        finally:
+            close_old_connections()
+
+        while True:
+            self._wait_until_due()
+            try:
+                release_due()
+            except Exception as e:
+                logger.error(f"File expiry failed: {e}")
+            finally:
+                close_old_connections()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_expiry_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ExpiryScheduler()
+    return _scheduler
+
+
+def schedule_expiry(video_obj, delay_minutes=10):
+    """Release the file of video_obj after delay_minutes"""
+    expires_at = timezone.now() + timedelta(minutes=delay_minutes)
+    DownloadedVideo.objects.filter(pk=video_obj.pk).update(expires_at=expires_at)
+    video_obj.expires_at = expires_at
+    get_expiry_scheduler().schedule(expires_at)
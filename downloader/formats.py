@@ -0,0 +1,114 @@
+"""
+Local format planner for extracted yt-dlp info dicts
+Ranks the already-extracted formats against a per-platform policy so
+download_video can walk the candidates without new extractions
+"""
+
+# Policy per platform. Formats inside the limits are preferred, the
+# highest resolution inside the limits wins; formats over the limits are
+# kept as fallbacks, smallest first.
+DEFAULT_FORMAT_POLICY = {
+    'max_height': 720,
+    'max_filesize': 500 * 1024 * 1024,  # 500MB
+    'preferred_exts': ['mp4', 'webm'],
+    'preferred_vcodecs': ['avc1', 'h264', 'hevc', 'h265', 'vp9', 'av01'],
+    # Direct files first, then segmented streams yt-dlp can still handle
+    'preferred_protocols': ['https', 'http', 'm3u8_native', 'm3u8', 'http_dash_segments'],
+    # Video-only formats need ffmpeg to merge audio, keep them last
+    'require_audio': True,
+}
+
+PLATFORM_FORMAT_POLICIES = {
+    'instagram': {
+        'max_height': 1080,
+    },
+    'facebook': {
+        'max_height': 720,
+    },
+    'tiktok': {
+        'max_height': 1080,
+    },
+    'pinterest': {
+        'max_height': 1080,
+    },
+}
+
+# Protocols yt-dlp reports for formats that are not real media
+UNSUPPORTED_PROTOCOLS = {'mhtml'}
+
+
+def get_format_policy(platform):
+    """Get the format policy for a platform merged over the defaults"""
+    policy = DEFAULT_FORMAT_POLICY.copy()
+    policy.update(PLATFORM_FORMAT_POLICIES.get(platform, {}))
+    return policy
+
+
+def _rank(value, preferred):
+    """Position of a value in a preference list, unknown values go last"""
+    value = (value or '').lower()
+    for i, item in enumerate(preferred):
+        if value.startswith(item):
+            return i
+    return len(preferred)
+
+
+def _filesize(fmt):
+    return fmt.get('filesize') or fmt.get('filesize_approx') or 0
+
+
+def format_sort_key(fmt, policy):
+    """Sort key for a format, lower is better"""
+    height = fmt.get('height') or 0
+    filesize = _filesize(fmt)
+    has_audio = fmt.get('acodec') != 'none'
+
+    over_height = bool(policy['max_height'] and height > policy['max_height'])
+    over_filesize = bool(policy['max_filesize'] and filesize > policy['max_filesize'])
+
+    return (
+        not has_audio if policy['require_audio'] else False,
+        over_filesize,
+        over_height,
+        _rank(fmt.get('protocol'), policy['preferred_protocols']),
+        # Best resolution inside the limits, smallest one above them
+        height if over_height else -height,
+        _rank(fmt.get('vcodec'), policy['preferred_vcodecs']),
+        _rank(fmt.get('ext'), policy['preferred_exts']),
+        -(fmt.get('tbr') or 0),
+    )
+
+
+def plan_formats(formats, platform):
+    """
+    Rank extracted formats for a platform
+    Returns the downloadable video formats, best candidate first
+    """
+    policy = get_format_policy(platform)
+    candidates = [
+        f for f in formats or []
+        if f.get('url')
+        and f.get('vcodec') != 'none'
+        and f.get('protocol') not in UNSUPPORTED_PROTOCOLS
+    ]
+    return sorted(candidates, key=lambda f: format_sort_key(f, policy))
+
+
+def format_id_selector(format_id):
+    """yt-dlp format selector that picks exactly one format by id"""
+    def selector(ctx):
+        return iter([f for f in ctx['formats'] if f.get('format_id') == format_id])
+    return selector
+
+
+def describe_format(fmt):
+    """Short summary of a format for logs and the debug endpoint"""
+    return {
+        'format_id': fmt.get('format_id', 'unknown'),
+        'ext': fmt.get('ext', 'unknown'),
+        'resolution': fmt.get('resolution', 'unknown'),
+        'filesize': _filesize(fmt),
+        'vcodec': fmt.get('vcodec', 'unknown'),
+        'acodec': fmt.get('acodec', 'unknown'),
+        'protocol': fmt.get('protocol', 'unknown'),
+    }
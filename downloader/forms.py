@@ -2,7 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import DownloadedVideo
-from .utils import detect_platform, validate_url
+from .url_classifier import classify_url
 
 
 class VideoDownloadForm(forms.ModelForm):
@@ -20,12 +20,11 @@ class VideoDownloadForm(forms.ModelForm):
     def clean_url(self):
         url = self.cleaned_data['url']
         
-        # Detect platform and validate URL
-        platform = detect_platform(url)
-        is_valid, message = validate_url(url, platform)
+        # Detect platform and validate URL in one pass
+        classified = classify_url(url)
         
-        if not is_valid:
-            raise forms.ValidationError(message)
+        if not classified.is_valid:
+            raise forms.ValidationError(classified.message)
         
         return url
 
@@ -0,0 +1,164 @@
+"""
+Shared HTTP client for every direct fetch in the downloader
+One process-wide session with keep-alive connection pools per host group,
+so repeated requests to the same host reuse TCP/TLS connections instead of
+doing a new handshake each time
+"""
+
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from . import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36'
+
+# Host group -> pool settings, a group matches the host and its subdomains
+DEFAULT_HOST_POOLS = {
+    'instagram.com': {'pool_maxsize': 10, 'timeout': (10, 30)},
+    'cdninstagram.com': {'pool_maxsize': 20, 'timeout': (10, 300)},
+    'fbcdn.net': {'pool_maxsize': 20, 'timeout': (10, 300)},
+    'pinimg.com': {'pool_maxsize': 20, 'timeout': (10, 60)},
+    'api.telegram.org': {'pool_maxsize': 4, 'timeout': (5, 30)},
+}
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_TIMEOUT = (10, 30)  # (connect, read)
+
+
+class HttpClient:
+    """
+    Thread-safe wrapper around one requests.Session
+    Every host group gets its own HTTPAdapter, hosts outside the configured
+    groups share the default adapter (which still pools per host)
+    """
+
+    def __init__(self, host_pools=None, pool_maxsize=DEFAULT_POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT):
+        self.host_pools = host_pools if host_pools is not None else DEFAULT_HOST_POOLS
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = DEFAULT_USER_AGENT
+        # The session is shared by every user's jobs, never keep cookies
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+        self.default_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', self.default_adapter)
+        self.session.mount('http://', self.default_adapter)
+
+        self.adapters = {
+            host: HTTPAdapter(pool_connections=10, pool_maxsize=config.get('pool_maxsize', pool_maxsize))
+            for host, config in self.host_pools.items()
+        }
+        # Look up the adapter by host instead of by URL prefix, so CDN
+        # subdomains (scontent-*.cdninstagram.com) land in their group
+        self.session.get_adapter = self._get_adapter
+
+    def _host_group(self, url):
+        return rate_limiter.match_host_group(url, self.host_pools)
+
+    def _get_adapter(self, url):
+        group = self._host_group(url)
+        if group:
+            return self.adapters[group]
+        return self.default_adapter
+
+    def get_timeout(self, url):
+        group = self._host_group(url)
+        if group:
+            return self.host_pools[group].get('timeout', self.timeout)
+        return self.timeout
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the host's pool and rate limit"""
+        kwargs.setdefault('timeout', self.get_timeout(url))
+        rate_limiter.acquire(url)
+        response = self.session.request(method, url, **kwargs)
+        rate_limiter.observe_response(url, response)
+        return response
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def stats(self):
+        """
+        Connection pool statistics per host
+        A request that didn't need a new connection counts as a pool hit
+        """
+        hosts = {}
+        adapters = [('default', self.default_adapter)] + list(self.adapters.items())
+        for group, adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                misses = pool.num_connections
+                hits = max(pool.num_requests - misses, 0)
+                hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                    'group': group,
+                    'requests': pool.num_requests,
+                    'hits': hits,
+                    'misses': misses,
+                    'idle': pool.pool.qsize() if pool.pool else 0,
+                }
+
+        hits = sum(h['hits'] for h in hosts.values())
+        misses = sum(h['misses'] for h in hosts.values())
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'hosts': hosts,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Get the process-wide HTTP client configured from settings"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = getattr(settings, 'HTTP_CLIENT', {})
+                host_pools = dict(DEFAULT_HOST_POOLS)
+                host_pools.update(config.get('HOSTS', {}))
+                _client = HttpClient(
+                    host_pools=host_pools,
+                    pool_maxsize=config.get('POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+                    timeout=config.get('TIMEOUT', DEFAULT_TIMEOUT),
+                )
+    return _client
+
+
+def get(url, **kwargs):
+    return get_http_client().get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    return get_http_client().head(url, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return get_http_client().post(url, data=data, json=json, **kwargs)
+
+
+def pool_stats():
+    return get_http_client().stats()
@@ -3,13 +3,16 @@ Advanced Instagram downloader with hosting-specific bypass techniques
 Designed to work on PythonAnywhere and other hosting platforms
 """
 
-import requests
 import re
 import json
-import time
 import random
 from urllib.parse import quote, unquote
-from django.conf import settings
+
+from . import http_client, segmented, staging
+from .carousel import items_from_children, download_carousel
+from .content_store import fallback_variant
+from .deadline import Deadline, DeadlineExceeded
+from .strategies import StrategyResult, register
 
 
 def get_random_mobile_headers():
@@ -50,39 +53,33 @@ def extract_shortcode_from_url(url):
     return None
 
 
-def try_direct_api_bypass(shortcode):
-    """
-    Try to extract Instagram content using direct API calls
-    This method works better on hosting platforms
-    """
+def fetch_embed_media_info(shortcode, timeout=30):
+    """Extract media info from the post's embed page"""
     try:
-        # Method 1: Try the embed endpoint
         embed_url = f"https://www.instagram.com/p/{shortcode}/embed"
         
-        session = requests.Session()
-        session.headers.update(get_random_mobile_headers())
-        
-        # Add random delay
-        time.sleep(random.uniform(1, 3))
+        response = http_client.get(embed_url, headers=get_random_mobile_headers(), timeout=(10, timeout))
+        if response.status_code != 200:
+            return None
         
-        response = session.get(embed_url, timeout=30)
-        if response.status_code == 200:
-            content = response.text
-            
-            # Extract JSON data from embed page
-            json_pattern = r'window\._sharedData\s*=\s*({.+?});'
-            match = re.search(json_pattern, content)
-            
-            if match:
-                try:
-                    data = json.loads(match.group(1))
-                    media_info = extract_media_from_shared_data(data, shortcode)
-                    if media_info:
-                        return media_info
-                except json.JSONDecodeError:
-                    pass
+        # Extract JSON data from embed page
+        json_pattern = r'window\._sharedData\s*=\s*({.+?});'
+        match = re.search(json_pattern, response.text)
+        if match:
+            try:
+                data = json.loads(match.group(1))
+                return extract_media_from_shared_data(data, shortcode)
+            except json.JSONDecodeError:
+                pass
+        return None
         
-        # Method 2: Try mobile endpoint
+    except Exception as e:
+        return None
+
+
+def fetch_api_media_info(shortcode, timeout=30):
+    """Extract media info from the ?__a=1 web API"""
+    try:
         mobile_url = f"https://www.instagram.com/p/{shortcode}/?__a=1&__d=dis"
         
         mobile_headers = get_random_mobile_headers()
@@ -92,24 +89,26 @@ def try_direct_api_bypass(shortcode):
             'X-CSRFToken': 'missing',
         })
         
-        time.sleep(random.uniform(2, 4))
-        
-        response = session.get(mobile_url, headers=mobile_headers, timeout=30)
-        if response.status_code == 200:
-            try:
-                data = response.json()
-                media_info = extract_media_from_api_response(data, shortcode)
-                if media_info:
-                    return media_info
-            except (json.JSONDecodeError, ValueError):
-                pass
-                
-        return None
+        response = http_client.get(mobile_url, headers=mobile_headers, timeout=(10, timeout))
+        if response.status_code != 200:
+            return None
+        try:
+            return extract_media_from_api_response(response.json(), shortcode)
+        except (json.JSONDecodeError, ValueError):
+            return None
         
     except Exception as e:
         return None
 
 
+def try_direct_api_bypass(shortcode):
+    """
+    Try to extract Instagram content using direct API calls
+    This method works better on hosting platforms
+    """
+    return fetch_embed_media_info(shortcode) or fetch_api_media_info(shortcode)
+
+
 def extract_media_from_shared_data(data, shortcode):
     """Extract media URLs from Instagram's _sharedData"""
     try:
@@ -140,12 +139,39 @@ def extract_media_from_shared_data(data, shortcode):
         # Try to get thumbnail
         media_info['thumbnail'] = media.get('display_url')
         
+        # Carousel (sidecar) posts list every slide as a child
+        edges = media.get('edge_sidecar_to_children', {}).get('edges', [])
+        children = [
+            {
+                'is_video': node.get('is_video', False),
+                'video_url': node.get('video_url'),
+                'image_url': node.get('display_url'),
+            }
+            for node in (edge.get('node', {}) for edge in edges)
+        ]
+        if len(children) > 1:
+            media_info['children'] = children
+        
         return media_info if (media_info.get('video_url') or media_info.get('image_url')) else None
         
     except Exception:
         return None
 
 
+def _media_urls_from_api_item(item):
+    """Video or image URL of one item of the web API response"""
+    if item.get('media_type') == 2:  # Video
+        video_versions = item.get('video_versions', [])
+        # Get the lowest quality for hosting compatibility
+        video_url = min(video_versions, key=lambda x: x.get('width', 0) * x.get('height', 0)) if video_versions else {}
+        return {'is_video': True, 'video_url': video_url.get('url')}
+    
+    candidates = item.get('image_versions2', {}).get('candidates', [])
+    # Get the highest quality image
+    image_url = max(candidates, key=lambda x: x.get('width', 0) * x.get('height', 0)) if candidates else {}
+    return {'is_video': False, 'image_url': image_url.get('url')}
+
+
 def extract_media_from_api_response(data, shortcode):
     """Extract media URLs from Instagram API response"""
     try:
@@ -157,23 +183,16 @@ def extract_media_from_api_response(data, shortcode):
         
         media_info = {
             'title': media.get('caption', {}).get('text', '') if media.get('caption') else '',
-            'media_type': 'video' if media.get('media_type') == 2 else 'image'
         }
         
-        if media.get('media_type') == 2:  # Video
-            media_info['is_video'] = True
-            video_versions = media.get('video_versions', [])
-            if video_versions:
-                # Get the lowest quality for hosting compatibility
-                video_url = min(video_versions, key=lambda x: x.get('width', 0) * x.get('height', 0))
-                media_info['video_url'] = video_url.get('url')
-        else:  # Image
-            media_info['is_video'] = False
-            candidates = media.get('image_versions2', {}).get('candidates', [])
-            if candidates:
-                # Get the highest quality image
-                image_url = max(candidates, key=lambda x: x.get('width', 0) * x.get('height', 0))
-                media_info['image_url'] = image_url.get('url')
+        # Carousel posts (media_type 8) keep their slides in carousel_media
+        children = [_media_urls_from_api_item(item) for item in media.get('carousel_media', [])]
+        if len(children) > 1:
+            media_info['children'] = children
+            media_info.update(children[0])
+        else:
+            media_info.update(_media_urls_from_api_item(media))
+        media_info['media_type'] = 'video' if media_info['is_video'] else 'image'
         
         # Thumbnail
         candidates = media.get('image_versions2', {}).get('candidates', [])
@@ -192,10 +211,6 @@ def download_instagram_content_bypass(video_obj):
     Specifically designed for hosting environments
     """
     try:
-        from .utils import download_image_from_url
-        from django.utils import timezone
-        import os
-        
         # Extract shortcode from URL
         shortcode = extract_shortcode_from_url(video_obj.url)
         if not shortcode:
@@ -206,93 +221,118 @@ def download_instagram_content_bypass(video_obj):
         
         if not media_info:
             return False, "Could not extract media information"
-            
-        # Update video object with extracted info
-        video_obj.title = media_info.get('title', 'Instagram Content')[:200]  # Limit length
-        video_obj.media_type = media_info['media_type']
-        video_obj.status = 'downloading'
-        video_obj.save()
         
-        # Create media directory
-        media_path = os.path.join(settings.MEDIA_ROOT, 'downloads', video_obj.platform)
-        os.makedirs(media_path, exist_ok=True)
-        
-        # Download the actual content
-        if media_info['is_video'] and media_info.get('video_url'):
-            success = download_media_file(
-                video_obj, 
-                media_info['video_url'], 
-                media_path,
-                'mp4'
-            )
-        elif media_info.get('image_url'):
-            success = download_media_file(
-                video_obj, 
-                media_info['image_url'], 
-                media_path,
-                'jpg'
-            )
-        else:
-            return False, "No downloadable media found"
-            
-        if success:
-            video_obj.status = 'completed'
-            video_obj.completed_at = timezone.now()
-            video_obj.save()
-            return True, "Download completed successfully"
-        else:
-            return False, "Failed to download media file"
+        return download_from_media_info(video_obj, media_info)
             
     except Exception as e:
         return False, f"Download error: {str(e)}"
 
 
-def download_media_file(video_obj, media_url, media_path, extension):
-    """Download media file from direct URL with hosting-optimized settings"""
-    try:
-        import os
+def download_from_media_info(video_obj, media_info, deadline=None, fallback=False):
+    """
+    Download the video, image or carousel described by a bypass media_info dict
+    fallback marks the stored file as written by a fallback strategy
+    """
+    from .utils import finish_download
+    
+    deadline = deadline or Deadline.after(300)
+    
+    # Update video object with extracted info
+    video_obj.title = media_info.get('title', 'Instagram Content')[:200]  # Limit length
+    video_obj.media_type = media_info['media_type']
+    video_obj.status = 'downloading'
+    video_obj.save()
+    
+    # Files are written to the job's staging directory, the content store
+    # moves them to their final place when complete
+    media_path = staging.job_dir(video_obj)
+    
+    if media_info.get('children'):
+        items = items_from_children(media_info['children'])
+        if download_carousel(video_obj, items, deadline, fallback=fallback):
+            return True, "Download completed successfully"
+        return False, "Failed to download carousel items"
+    
+    timeout = deadline.timeout(300)
+    
+    # Download the actual content
+    if media_info['is_video'] and media_info.get('video_url'):
+        success = download_media_file(
+            video_obj, 
+            media_info['video_url'], 
+            media_path,
+            'mp4',
+            timeout=timeout,
+            deadline=deadline
+        )
+    elif media_info.get('image_url'):
+        success = download_media_file(
+            video_obj, 
+            media_info['image_url'], 
+            media_path,
+            'jpg',
+            timeout=timeout,
+            deadline=deadline
+        )
+    else:
+        return False, "No downloadable media found"
         
-        # Create session with optimal settings for hosting
-        session = requests.Session()
-        session.headers.update(get_random_mobile_headers())
+    if success:
+        variant = media_info['media_type']
+        if fallback:
+            variant = fallback_variant(variant)
+        finish_download(video_obj, video_obj.file_path, media_info['media_type'], variant=variant)
+        return True, "Download completed successfully"
+    else:
+        return False, "Failed to download media file"
+
+
+def _media_info_strategy(fetch):
+    """Strategy that gets media_info with fetch(shortcode, timeout) and downloads it"""
+    def strategy(video_obj, deadline):
+        shortcode = extract_shortcode_from_url(video_obj.url)
+        if not shortcode:
+            return StrategyResult(False, "Invalid Instagram URL format")
         
-        # Add random delay to avoid rate limiting
-        time.sleep(random.uniform(2, 5))
+        media_info = fetch(shortcode, timeout=deadline.timeout(30))
+        if not media_info:
+            return StrategyResult(False, "Could not extract media information")
         
-        # Download with streaming for large files
-        response = session.get(
-            media_url, 
-            stream=True, 
-            timeout=(30, 300),  # (connect timeout, read timeout)
-            headers={
-                'Range': 'bytes=0-',  # Request full file
-                'Referer': 'https://www.instagram.com/'
-            }
-        )
+        success, message = download_from_media_info(video_obj, media_info, deadline, fallback=True)
+        return StrategyResult(success, None if success else message)
+    return strategy
+
+
+# Embed page and ?__a=1 API as separate strategies, so each gets its own
+# circuit and metrics
+embed_strategy = register('embed', timeout=120, fallback=True)(_media_info_strategy(fetch_embed_media_info))
+api_strategy = register('api', timeout=120, fallback=True)(_media_info_strategy(fetch_api_media_info))
+
+
+def download_media_file(video_obj, media_url, media_path, extension, timeout=300, deadline=None):
+    """Download media file from direct URL with hosting-optimized settings"""
+    try:
+        import os
         
-        response.raise_for_status()
+        headers = get_random_mobile_headers()
+        headers['Referer'] = 'https://www.instagram.com/'
         
-        # Create safe filename
-        safe_title = "".join(c for c in video_obj.title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
-        if not safe_title:
-            safe_title = f"instagram_content_{int(time.time())}"
-            
-        filename = f"{safe_title}.{extension}"
-        file_path = os.path.join(media_path, filename)
+        # Stable name, so a retried job resumes the same partial file
+        file_path = os.path.join(media_path, f"media.{extension}")
         
-        # Download in chunks to handle large files on hosting
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        # Parallel byte ranges over pooled connections, resumed if an
+        # earlier attempt was cut off
+        segmented.download(media_url, file_path, headers=headers, timeout=timeout, deadline=deadline)
         
         # Verify file was downloaded
         if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            video_obj.filename = filename
             video_obj.file_path = file_path
             return True
         else:
             return False
             
+    except DeadlineExceeded:
+        # The job is out of time, the strategy runner reports a timeout
+        raise
     except Exception as e:
         return False
\ No newline at end of file
@@ -0,0 +1,365 @@
+"""
+Durable download job queue on top of the DownloadedVideo table
+Workers claim rows with a lease, keep it alive with heartbeats, and rows
+whose lease expired (worker crashed or was recycled) are re-claimed
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .deadline import Deadline
+from .models import DownloadedVideo
+from .staging import has_partials
+from .status_updates import bump_status_version
+
+logger = logging.getLogger(__name__)
+
+
+def get_lease_seconds():
+    return getattr(settings, 'DOWNLOAD_LEASE_SECONDS', 120)
+
+
+def get_max_attempts():
+    return getattr(settings, 'DOWNLOAD_MAX_ATTEMPTS', 3)
+
+
+def get_worker_id():
+    """Identifier of this worker process, unique across nodes"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    """
+    Rows that are waiting or whose owner stopped heartbeating, jobs parked
+    on another job's download are not claimable until it is done
+    """
+    return (Q(status='pending') | Q(status='downloading', lease_expires_at__lt=now)) & Q(waiting_for='')
+
+
+def claim_job(video_id, owner=None):
+    """
+    Atomically take ownership of a job
+    Returns the claimed DownloadedVideo, or None if another worker owns it
+    """
+    owner = owner or get_worker_id()
+    now = timezone.now()
+    claimed = DownloadedVideo.objects.filter(
+        _claimable(now),
+        pk=video_id,
+        attempts__lt=get_max_attempts(),
+    ).update(
+        status='downloading',
+        lease_owner=owner,
+        lease_expires_at=now + timedelta(seconds=get_lease_seconds()),
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    bump_status_version()
+    return DownloadedVideo.objects.get(pk=video_id)
+
+
+def claim_next_job(owner=None):
+    """Claim the oldest claimable job, or return None if the queue is empty"""
+    now = timezone.now()
+    candidates = DownloadedVideo.objects.filter(
+        _claimable(now),
+        attempts__lt=get_max_attempts(),
+    ).order_by('created_at').values_list('pk', flat=True)[:10]
+
+    for video_id in candidates:
+        video = claim_job(video_id, owner)
+        if video:
+            return video
+    return None
+
+
+def release_job(video_obj, owner=None):
+    """Drop the lease once the worker is done with a job"""
+    owner = owner or get_worker_id()
+    DownloadedVideo.objects.filter(pk=video_obj.pk, lease_owner=owner).update(
+        lease_owner='',
+        lease_expires_at=None,
+    )
+    video_obj.lease_owner = ''
+    video_obj.lease_expires_at = None
+
+
+def requeue_for_resume(video_obj):
+    """
+    Put a failed job that left a partial download back in the queue, so its
+    staging directory is kept and the next attempt resumes the file
+    Returns False for terminal failures: nothing to resume, attempts used
+    up, deadline passed, or the job wasn't run through the queue
+    """
+    if video_obj.status != 'failed' or not video_obj.lease_owner:
+        return False
+    if video_obj.attempts >= get_max_attempts() or Deadline.for_job(video_obj).expired:
+        return False
+    if not has_partials(video_obj):
+        return False
+    video_obj.status = 'pending'
+    logger.info(f"Job {video_obj.pk} failed with a partial download, re-queued to resume it")
+    return True
+
+
+def reclaim_expired_leases():
+    """
+    Put jobs with an expired lease back in the queue
+    Jobs that used up all their attempts are marked as failed, jobs parked
+    on a media lock whose holder died are woken up
+    """
+    from .singleflight import release_expired
+
+    release_expired()
+    now = timezone.now()
+    expired = DownloadedVideo.objects.filter(
+        Q(lease_expires_at__lt=now) | Q(lease_expires_at__isnull=True),
+        status='downloading',
+    )
+
+    failed = expired.filter(attempts__gte=get_max_attempts()).update(
+        status='failed',
+        error_message='Yuklab olish bir necha marta to\'xtab qoldi. Qaytadan urinib ko\'ring.',
+        lease_owner='',
+        lease_expires_at=None,
+    )
+    requeued = expired.filter(attempts__lt=get_max_attempts()).update(
+        status='pending',
+        lease_owner='',
+        lease_expires_at=None,
+    )
+
+    if failed or requeued:
+        bump_status_version()
+        logger.info(f"Reclaimed expired leases: {requeued} re-queued, {failed} failed")
+    return requeued, failed
+
+
+class JobHeartbeat:
+    """Single background thread that renews the leases of in-flight jobs"""
+
+    def __init__(self, owner=None):
+        self.owner = owner or get_worker_id()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, video_obj):
+        with self._lock:
+            self._jobs[video_obj.pk] = video_obj
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='download-heartbeat', daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, video_obj):
+        with self._lock:
+            self._jobs.pop(video_obj.pk, None)
+
+    def beat(self):
+        """Extend the lease of every job this process is working on"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if not jobs:
+            return
+
+        now = timezone.now()
+        expires = now + timedelta(seconds=get_lease_seconds())
+        # Keep the in-memory rows in sync so a later full save() doesn't
+        # write back an older lease
+        for video_obj in jobs:
+            video_obj.heartbeat_at = now
+            video_obj.lease_expires_at = expires
+
+        DownloadedVideo.objects.filter(
+            pk__in=[video_obj.pk for video_obj in jobs],
+            lease_owner=self.owner,
+        ).update(heartbeat_at=now, lease_expires_at=expires)
+
+        # Media locks held by these jobs live as long as the jobs do
+        from .singleflight import renew
+        renew(self.owner)
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        interval = max(get_lease_seconds() / 3, 1)
+        while True:
+            time.sleep(interval)
+            try:
+                self.beat()
+            except Exception as e:
+                logger.error(f"Heartbeat failed: {e}")
+            finally:
+                close_old_connections()
+
+
+_heartbeat = None
+_heartbeat_lock = threading.Lock()
+
+
+def get_heartbeat():
+    global _heartbeat
+    if _heartbeat is None:
+        with _heartbeat_lock:
+            if _heartbeat is None:
+                _heartbeat = JobHeartbeat()
+    return _heartbeat
+
+
+def run_claimed_job(video_obj):
+    """
+    Run download_video for a job this worker already owns
+    The job keeps the deadline it got when it was accepted
+    """
+    from .utils import download_video
+
+    heartbeat = get_heartbeat()
+    heartbeat.add(video_obj)
+    try:
+        video_obj = download_video(video_obj, Deadline.for_job(video_obj))
+        # A failed attempt that left a partial download went back to the
+        # queue, run the next attempt right away so it resumes the file
+        while video_obj.status == 'pending':
+            retry = claim_job(video_obj.pk, heartbeat.owner)
+            if retry is None:
+                break
+            heartbeat.remove(video_obj)
+            video_obj = retry
+            heartbeat.add(video_obj)
+            video_obj = download_video(video_obj, Deadline.for_job(video_obj))
+        return video_obj
+    finally:
+        heartbeat.remove(video_obj)
+        release_job(video_obj, heartbeat.owner)
+
+
+def requeued_job_ids(limit=10):
+    """Oldest pending jobs that already ran, re-queued after a crash or a failed attempt"""
+    return list(DownloadedVideo.objects.filter(
+        status='pending',
+        waiting_for='',
+        attempts__gt=0,
+        attempts__lt=get_max_attempts(),
+    ).order_by('created_at').values_list('pk', flat=True)[:limit])
+
+
+class QueueMaintenance:
+    """
+    Upkeep of the queue in processes that run jobs on the in-process executor
+    Without run_download_worker nothing else reclaims expired leases or
+    sweeps staging, so this thread recovers staging when the executor
+    starts, then periodically reclaims leases and runs re-queued jobs
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._submitted = set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='download-maintenance', daemon=True
+                )
+                self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def resubmit(self, video_ids=None):
+        """Hand re-queued jobs (by default the oldest ones) to the local executor"""
+        from .executor import DownloadQueueFull, get_download_executor, queue_overflow_to_workers
+
+        # run_download_worker processes drain the queue in that mode
+        if queue_overflow_to_workers():
+            return
+        executor = get_download_executor()
+        for video_id in requeued_job_ids() if video_ids is None else video_ids:
+            with self._lock:
+                if video_id in self._submitted:
+                    continue
+                self._submitted.add(video_id)
+            try:
+                future = executor.submit(run_job, video_id)
+            except DownloadQueueFull:
+                with self._lock:
+                    self._submitted.discard(video_id)
+                return
+            future.add_done_callback(lambda f, video_id=video_id: self._forget(video_id))
+
+    def _forget(self, video_id):
+        with self._lock:
+            self._submitted.discard(video_id)
+
+    def _run(self):
+        from django.db import close_old_connections
+
+        from .staging import recover_staging
+
+        try:
+            recover_staging()
+        except Exception as e:
+            logger.error(f"Staging recovery failed: {e}")
+        finally:
+            close_old_connections()
+
+        interval = max(get_lease_seconds() / 2, 1)
+        while True:
+            try:
+                reclaim_expired_leases()
+                self.resubmit()
+            except Exception as e:
+                logger.error(f"Queue maintenance failed: {e}")
+            finally:
+                close_old_connections()
+            time.sleep(interval)
+
+
+_maintenance = None
+_maintenance_lock = threading.Lock()
+
+
+def get_queue_maintenance():
+    global _maintenance
+    if _maintenance is None:
+        with _maintenance_lock:
+            if _maintenance is None:
+                _maintenance = QueueMaintenance()
+    return _maintenance
+
+
+def wake_jobs(video_ids):
+    """
+    Jobs were put back in the queue, run them now if this process runs jobs
+    on its executor, run_download_worker processes pick them up on their own
+    """
+    bump_status_version()
+    maintenance = get_queue_maintenance()
+    if maintenance.running:
+        maintenance.resubmit(video_ids)
+
+
+def run_job(video_id):
+    """
+    Claim and run a queued job
+    If another worker already owns it, return the row as it is now
+    """
+    video_obj = claim_job(video_id, get_heartbeat().owner)
+    if video_obj is None:
+        logger.info(f"Job {video_id} is owned by another worker, skipping")
+        return DownloadedVideo.objects.get(pk=video_id)
+    return run_claimed_job(video_obj)
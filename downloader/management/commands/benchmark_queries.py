@@ -0,0 +1,175 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from downloader.cleanup import _expired
+from downloader.jobs import _claimable, get_max_attempts
+from downloader.models import DownloadedVideo
+from downloader.pagination import encode_cursor, get_page_size, page_queryset
+
+PLATFORMS = ['instagram', 'facebook', 'tiktok', 'pinterest']
+
+
+class Rollback(Exception):
+    """Raised to throw away the synthetic rows"""
+
+
+class Command(BaseCommand):
+    help = ('Load synthetic downloads and report EXPLAIN plans and latencies of the '
+            'view, job and cleanup queries (everything is rolled back afterwards)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=200000,
+            help='Synthetic DownloadedVideo rows to load (default: 200000)'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Users the rows are spread over (default: 1000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Runs per query, the median is reported (default: 20)'
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Also run every query without the DownloadedVideo indexes'
+        )
+        parser.add_argument(
+            '--no-explain',
+            action='store_true',
+            help='Only report latencies'
+        )
+
+    def handle(self, *args, **options):
+        if options['compare'] and not connection.features.can_rollback_ddl:
+            self.stdout.write(self.style.WARNING(
+                f"{connection.vendor} can't roll back DDL, --compare is ignored"
+            ))
+            options['compare'] = False
+
+        try:
+            with transaction.atomic():
+                power_user = self._load(options['rows'], options['users'])
+                self._report('With indexes', power_user, options)
+                if options['compare']:
+                    self._drop_indexes()
+                    self._report('Without indexes', power_user, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Synthetic rows rolled back')
+
+    def _load(self, rows, users, batch_size=10000):
+        """Insert synthetic users and downloads, returns the user with the longest history"""
+        started = time.monotonic()
+        tag = f'bench{int(time.time())}'
+        User.objects.bulk_create([User(username=f'{tag}_{i}') for i in range(users)])
+        user_ids = list(User.objects.filter(username__startswith=f'{tag}_').values_list('pk', flat=True))
+        # A tenth of the rows belong to one power user
+        power_user_id = user_ids[0]
+
+        now = timezone.now()
+        batch = []
+        for i in range(rows):
+            created_at = now - timedelta(seconds=random.randint(0, 90 * 24 * 3600))
+            roll = random.random()
+            status = 'completed' if roll < 0.9 else 'failed' if roll < 0.95 else 'pending' if roll < 0.98 else 'downloading'
+            completed = status == 'completed'
+            batch.append(DownloadedVideo(
+                user_id=power_user_id if i % 10 == 0 else random.choice(user_ids),
+                url=f'https://www.instagram.com/p/{tag}{i}/',
+                platform=random.choice(PLATFORMS),
+                media_type='video',
+                title=f'Synthetic {i}',
+                status=status,
+                error_message='' if status != 'failed' else 'x' * 500,
+                created_at=created_at,
+                completed_at=created_at + timedelta(seconds=30) if completed else None,
+                file_path=f'/tmp/{tag}/{i}.mp4' if completed and random.random() < 0.05 else '',
+                media_key=f'instagram:{tag}{i % (rows // 3 or 1)}',
+                expires_at=now + timedelta(minutes=random.randint(-5, 10)) if completed and random.random() < 0.01 else None,
+            ))
+            if len(batch) >= batch_size:
+                DownloadedVideo.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            DownloadedVideo.objects.bulk_create(batch)
+
+        self.stdout.write(f'Loaded {rows} rows for {users} users in {time.monotonic() - started:.1f}s')
+        return User.objects.get(pk=power_user_id)
+
+    def _queries(self, user):
+        now = timezone.now()
+        media_key = DownloadedVideo.objects.filter(user=user).values_list('media_key', flat=True).first()
+        sample = DownloadedVideo.objects.filter(user=user).values_list('pk', flat=True).first()
+        # Cursor of the last page of the history
+        oldest = DownloadedVideo.objects.filter(user=user).order_by('created_at', 'pk')[get_page_size():].first()
+        oldest = encode_cursor(oldest) if oldest else None
+        return [
+            ('home: recent downloads', lambda: DownloadedVideo.objects.filter(user=user)[:5]),
+            ('download_list: first page', lambda: page_queryset(DownloadedVideo.objects.filter(user=user))),
+            ('download_list: last page', lambda: page_queryset(DownloadedVideo.objects.filter(user=user), oldest)),
+            ('check_status', lambda: DownloadedVideo.objects.filter(pk=sample, user=user)),
+            ('jobs: claim_next_job', lambda: DownloadedVideo.objects.filter(
+                _claimable(now), attempts__lt=get_max_attempts()
+            ).order_by('created_at').values_list('pk', flat=True)[:10]),
+            ('cleanup: expired chunk', lambda: _expired(now - timedelta(minutes=10)).order_by(
+                'completed_at', 'pk'
+            ).values_list('pk', 'completed_at', 'blob_id', 'file_path')[:500]),
+            ('expiry: due files', lambda: DownloadedVideo.objects.filter(
+                expires_at__lte=now
+            ).order_by('expires_at').values_list('pk', 'expires_at')[:200]),
+            ('dedup: same media key', lambda: DownloadedVideo.objects.filter(media_key=media_key)[:5]),
+        ]
+
+    def _report(self, heading, user, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(heading))
+        for label, query in self._queries(user):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(query())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f'  {label}: {statistics.median(timings):.2f} ms median, {max(timings):.2f} ms max')
+            if not options['no_explain']:
+                for line in self._explain(query(), heading):
+                    self.stdout.write(f'      {line}')
+
+    def _explain(self, queryset, heading):
+        """
+        EXPLAIN output of queryset, like QuerySet.explain() but tagged with
+        the heading, so SQLite doesn't reuse a plan cached before the
+        indexes were dropped
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {heading} */', params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+    def _drop_indexes(self):
+        """Drop every DownloadedVideo index but the primary key, unique and foreign key ones"""
+        meta = DownloadedVideo._meta
+        editor = connection.schema_editor()
+        foreign_keys = [[field.column] for field in meta.concrete_fields if field.is_relation]
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, meta.db_table)
+            for name, info in constraints.items():
+                if not info['index'] or info['primary_key'] or info['unique'] or info['columns'] in foreign_keys:
+                    continue
+                cursor.execute(editor.sql_delete_index % {
+                    'table': editor.quote_name(meta.db_table),
+                    'name': editor.quote_name(name),
+                })
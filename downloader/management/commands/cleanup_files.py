@@ -1,9 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
-import os
 import logging
-from downloader.models import DownloadedVideo
+from downloader.cleanup import CleanupProgress, iter_cleanup
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +21,18 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be deleted without actually deleting'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows released per batch (default: CLEANUP_CHUNK_SIZE, 500)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Threads deleting files (default: CLEANUP_WORKERS, 8)'
+        )
 
     def handle(self, *args, **options):
         minutes = options['minutes']
@@ -29,63 +40,33 @@ class Command(BaseCommand):
         
         cutoff_time = timezone.now() - timedelta(minutes=minutes)
         
-        # Find completed downloads older than cutoff time
-        old_downloads = DownloadedVideo.objects.filter(
-            status='completed',
-            completed_at__lt=cutoff_time,
-            file_path__isnull=False
-        ).exclude(file_path='')
-        
-        deleted_count = 0
-        freed_space = 0
-        
-        for download in old_downloads:
-            if download.file_path and os.path.exists(download.file_path):
-                try:
-                    # Get file size before deletion
-                    file_size = os.path.getsize(download.file_path)
-                    
-                    if dry_run:
-                        self.stdout.write(
-                            f"Would delete: {download.file_path} "
-                            f"({file_size / (1024*1024):.2f} MB) "
-                            f"from {download.platform} - {download.title[:30]}..."
-                        )
-                    else:
-                        os.remove(download.file_path)
-                        # Clear file path in database
-                        download.file_path = ''
-                        download.filename = ''
-                        download.save()
-                        
-                        self.stdout.write(
-                            self.style.SUCCESS(
-                                f"Deleted: {download.filename} "
-                                f"({file_size / (1024*1024):.2f} MB) "
-                                f"from {download.platform}"
-                            )
-                        )
-                    
-                    deleted_count += 1
-                    freed_space += file_size
-                    
-                except OSError as e:
-                    logger.error(f"Error deleting file {download.file_path}: {e}")
-                    self.stdout.write(
-                        self.style.ERROR(f"Failed to delete: {download.file_path}")
-                    )
+        # Completed downloads older than cutoff time, walked in chunks,
+        # shared files are only removed with their last reference
+        progress = CleanupProgress(0, 0, 0, 0, 0)
+        for progress in iter_cleanup(
+            cutoff_time,
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            dry_run=dry_run,
+        ):
+            self.stdout.write(
+                f"Chunk {progress.chunk}: {progress.rows} rows, "
+                f"{progress.released} total, "
+                f"{progress.freed / (1024*1024):.2f} MB"
+                + (self.style.ERROR(f", {progress.failed} failed") if progress.failed else "")
+            )
         
         if dry_run:
             self.stdout.write(
                 self.style.WARNING(
-                    f"DRY RUN: Would delete {deleted_count} files, "
-                    f"freeing {freed_space / (1024*1024):.2f} MB"
+                    f"DRY RUN: Would delete {progress.released} files, "
+                    f"freeing {progress.freed / (1024*1024):.2f} MB"
                 )
             )
         else:
             self.stdout.write(
                 self.style.SUCCESS(
-                    f"Cleanup completed: Deleted {deleted_count} files, "
-                    f"freed {freed_space / (1024*1024):.2f} MB"
+                    f"Cleanup completed: Deleted {progress.released} files, "
+                    f"freed {progress.freed / (1024*1024):.2f} MB"
                 )
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+import threading
+import time
+import logging
+from downloader.jobs import (
+    claim_next_job, run_claimed_job, reclaim_expired_leases,
+    get_heartbeat, get_lease_seconds,
+)
+from downloader.expiry import get_expiry_scheduler
+from downloader.staging import recover_staging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run download workers that process queued DownloadedVideo jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=2,
+            help='Number of download threads in this process (default: 2)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait when the queue is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs that are queued now and exit'
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        poll_interval = options['poll_interval']
+        once = options['once']
+        owner = get_heartbeat().owner
+
+        self.stdout.write(f"Starting {threads} download worker thread(s) as {owner}")
+        # Re-queue jobs of crashed workers and clear their partial files
+        kept, removed = recover_staging()
+        if kept or removed:
+            self.stdout.write(f"Recovered staging: {kept} kept for resume, {removed} removed")
+        # Releases files whose expiry passed while no process was running
+        get_expiry_scheduler().start()
+
+        workers = [
+            threading.Thread(
+                target=self._work,
+                args=(owner, poll_interval, once),
+                name=f'download-worker-{i}',
+                daemon=True
+            )
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+
+        reclaim_interval = get_lease_seconds() / 2
+        next_reclaim = time.monotonic() + reclaim_interval
+        try:
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(1)
+                if not once and time.monotonic() >= next_reclaim:
+                    reclaim_expired_leases()
+                    close_old_connections()
+                    next_reclaim = time.monotonic() + reclaim_interval
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Stopping download workers"))
+
+    def _work(self, owner, poll_interval, once):
+        while True:
+            try:
+                video = claim_next_job(owner)
+                if video is None:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+
+                result = run_claimed_job(video)
+                self.stdout.write(f"Job {result.pk}: {result.status}")
+            except Exception as e:
+                logger.error(f"Download worker error: {e}")
+                time.sleep(poll_interval)
+            finally:
+                close_old_connections()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from downloader import circuit_breaker, strategies
+import downloader.utils  # noqa: F401 registers the download strategies
+
+PLATFORMS = ['instagram', 'facebook', 'tiktok', 'pinterest']
+
+
+class Command(BaseCommand):
+    help = 'Show latency and success histograms of the download strategies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--platform',
+            choices=PLATFORMS,
+            help='Only show this platform'
+        )
+
+    def handle(self, *args, **options):
+        platforms = [options['platform']] if options['platform'] else PLATFORMS
+        labels = strategies.bucket_labels()
+
+        for platform in platforms:
+            names = strategies.get_platform_strategies(platform)
+            metrics = strategies.strategy_metrics(platform, names)
+            breakers = circuit_breaker.breaker_stats(platform, names)
+            # Current run order
+            order = strategies.ordered_strategies(platform)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{platform.title()} ({" > ".join(order)})'))
+            for name in names:
+                entry = metrics[name]
+                self.stdout.write(
+                    f'  {name}: {entry["runs"]} runs, '
+                    f'{entry["success_rate"]:.0%} success, '
+                    f'circuit {breakers[name]["state"]}'
+                )
+                for outcome in strategies.OUTCOMES:
+                    counts = entry[outcome]
+                    if not any(counts):
+                        continue
+                    histogram = ', '.join(
+                        f'{label}: {count}' for label, count in zip(labels, counts) if count
+                    )
+                    self.stdout.write(f'    {outcome:<8} {histogram}')
@@ -0,0 +1,171 @@
+"""
+Short-lived cache for extracted media metadata
+Keyed on the canonical media ID (platform + shortcode/numeric ID) so the
+same Reel pasted by many users is extracted once per TTL window
+"""
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'media_info:'
+
+
+class LocalMemoryBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=1000, **kwargs):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        # Callers may mutate the info dict, never hand out the cached one
+        return copy.deepcopy(value)
+
+    def set(self, key, value, ttl):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DjangoCacheBackend:
+    """Store entries in one of the configured Django CACHES"""
+
+    def __init__(self, alias='default', **kwargs):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(KEY_PREFIX + key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(KEY_PREFIX + key, value, timeout=ttl)
+
+    def delete(self, key):
+        self.cache.delete(KEY_PREFIX + key)
+
+
+class RedisBackend:
+    """Store entries as JSON in Redis (or any Redis-compatible server)"""
+
+    def __init__(self, location='redis://localhost:6379/0', **kwargs):
+        import redis
+        self.client = redis.Redis.from_url(location)
+
+    def get(self, key):
+        data = self.client.get(KEY_PREFIX + key)
+        return json.loads(data) if data else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(KEY_PREFIX + key, int(ttl), json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(KEY_PREFIX + key)
+
+
+BACKENDS = {
+    'local': LocalMemoryBackend,
+    'django': DjangoCacheBackend,
+    'redis': RedisBackend,
+}
+
+
+class MediaInfoCache:
+    """Metadata cache with hit/miss counters in front of a pluggable backend"""
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Get cached info for a media key, or None"""
+        if not key:
+            return None
+        try:
+            info = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Media info cache get failed for {key}: {e}")
+            info = None
+        self._count(info is not None)
+        return info
+
+    def set(self, key, info):
+        if not key or not info:
+            return
+        try:
+            self.backend.set(key, info, self.ttl)
+        except Exception as e:
+            logger.warning(f"Media info cache set failed for {key}: {e}")
+
+    def delete(self, key):
+        if key:
+            self.backend.delete(key)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_media_info_cache():
+    """Get the process-wide media info cache configured from settings"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = getattr(settings, 'MEDIA_INFO_CACHE', {})
+                backend_class = BACKENDS[config.get('BACKEND', 'local')]
+                backend = backend_class(
+                    max_entries=config.get('MAX_ENTRIES', 1000),
+                    alias=config.get('ALIAS', 'default'),
+                    location=config.get('LOCATION', 'redis://localhost:6379/0'),
+                )
+                _cache = MediaInfoCache(backend, ttl=config.get('TTL', 300))
+    return _cache
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0008_downloadedvideo_media_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0009_downloadedvideo_job_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_key', models.CharField(db_index=True, max_length=255)),
+                ('variant', models.CharField(blank=True, max_length=100)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file_path', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField(default=0)),
+                ('media_type', models.CharField(default='unknown', max_length=10)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='media_key',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='downloads', to='downloader.mediablob'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0010_media_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_key', models.CharField(max_length=255, unique=True)),
+                ('owner', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:26
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0011_medialock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('short_url', models.CharField(max_length=500, unique=True)),
+                ('canonical_url', models.CharField(max_length=500)),
+                ('resolved_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0012_shortlink'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField()),
+                ('media_type', models.CharField(choices=[('video', 'Video'), ('image', 'Image'), ('unknown', 'Unknown')], default='unknown', max_length=10)),
+                ('source_url', models.URLField(blank=True, max_length=1000)),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('file_path', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assets', to='downloader.mediablob')),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assets', to='downloader.downloadedvideo')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('video', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0013_media_asset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0014_downloadedvideo_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(fields=['user', '-created_at'], name='download_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(fields=['status', 'completed_at'], name='download_status_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(fields=['status', 'created_at'], name='download_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(fields=['media_key'], name='download_media_key_idx'),
+        ),
+    ]
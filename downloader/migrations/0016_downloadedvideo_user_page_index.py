@@ -0,0 +1,21 @@
+# Generated by Django 4.2.24 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0015_downloadedvideo_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='downloadedvideo',
+            name='download_user_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='download_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.24 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('downloader', '0017_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadedvideo',
+            name='waiting_for',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='downloadedvideo',
+            index=models.Index(condition=models.Q(('waiting_for', ''), _negated=True), fields=['waiting_for'], name='download_waiting_for_idx'),
+        ),
+    ]
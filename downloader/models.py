@@ -5,6 +5,46 @@ import random
 import string
 
 
+class MediaBlob(models.Model):
+    """Downloaded file shared by every DownloadedVideo of the same media"""
+    media_key = models.CharField(max_length=255, db_index=True)
+    variant = models.CharField(max_length=100, blank=True)  # format id or 'image'
+    sha256 = models.CharField(max_length=64, unique=True)
+    file_path = models.CharField(max_length=500)
+    size = models.BigIntegerField(default=0)
+    media_type = models.CharField(max_length=10, default='unknown')
+    title = models.CharField(max_length=255, blank=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.media_key} [{self.variant}] - {self.ref_count} refs"
+
+
+class MediaLock(models.Model):
+    """Cross-process lock held by the job currently downloading a media key"""
+    media_key = models.CharField(max_length=255, unique=True)
+    owner = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.media_key} - {self.owner}"
+
+
+class ShortLink(models.Model):
+    """Resolved short link (pin.it, vm.tiktok.com, fb.watch, ...) to canonical URL"""
+    short_url = models.CharField(max_length=500, unique=True)
+    canonical_url = models.CharField(max_length=500)
+    resolved_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.short_url} -> {self.canonical_url}"
+
+
 class DownloadedVideo(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -38,14 +78,72 @@ class DownloadedVideo(models.Model):
     error_message = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Canonical media ID and the shared file it points to (see downloader.content_store)
+    media_key = models.CharField(max_length=255, blank=True)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='downloads')
+    # Job queue ownership (see downloader.jobs)
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    # Media key of the in-flight download this job is parked on (see downloader.singleflight)
+    waiting_for = models.CharField(max_length=255, blank=True)
+    # When the file is released (see downloader.expiry), null when nothing is pending
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     
     class Meta:
         ordering = ['-created_at']
+        # One index per real access pattern, see the benchmark_queries command
+        indexes = [
+            # A user's downloads, newest first (home, download_list keyset pages)
+            models.Index(fields=['user', '-created_at', '-id'], name='download_user_created_idx'),
+            # Cleanup of old completed files, in (completed_at, id) order
+            models.Index(fields=['status', 'completed_at'], name='download_status_completed_idx'),
+            # Job queue, oldest pending job first
+            models.Index(fields=['status', 'created_at'], name='download_status_created_idx'),
+            # Downloads of the same media
+            models.Index(fields=['media_key'], name='download_media_key_idx'),
+            # Jobs parked on an in-flight download, woken when it is done.
+            # Partial, the column is empty on almost every row and the job
+            # queue filters on waiting_for='' through the status index
+            models.Index(fields=['waiting_for'], name='download_waiting_for_idx',
+                         condition=~models.Q(waiting_for='')),
+        ]
     
     def __str__(self):
         return f"{self.title or self.url} - {self.status}"
 
 
+class MediaAsset(models.Model):
+    """One item of a carousel, sidecar or board downloaded as a DownloadedVideo"""
+    video = models.ForeignKey(DownloadedVideo, on_delete=models.CASCADE, related_name='assets')
+    position = models.IntegerField()
+    media_type = models.CharField(max_length=10, choices=DownloadedVideo.MEDIA_TYPE_CHOICES, default='unknown')
+    source_url = models.URLField(max_length=1000, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    blob = models.ForeignKey(MediaBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='assets')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['position']
+        unique_together = ['video', 'position']
+    
+    def __str__(self):
+        return f"{self.video_id} #{self.position + 1} ({self.media_type})"
+    
+    @property
+    def media_key(self):
+        """Content store key of this item, derived from the post's media key"""
+        if self.video.media_key:
+            return f"{self.video.media_key}/{self.position}"
+        return ''
+    
+    @property
+    def title(self):
+        return f"{self.video.title} ({self.position + 1})"
+
+
 class TelegramUser(models.Model):
     """Model to store Telegram user information"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='telegram_profile')
@@ -0,0 +1,100 @@
+"""
+Keyset (cursor) pagination of a user's downloads
+Pages are read newest first on (created_at, id) straight from the
+(user, -created_at) index, so a page costs the same no matter how far back
+it is or how long the history is
+"""
+
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+
+# Columns the list templates need, the rest (error_message in full, lease
+# and storage bookkeeping) stays in the database
+LIST_COLUMNS = (
+    'id', 'title', 'filename', 'media_type', 'platform', 'url',
+    'status', 'created_at', 'completed_at',
+)
+ERROR_SUMMARY_LENGTH = 200
+
+
+def get_page_size():
+    return getattr(settings, 'DOWNLOAD_LIST_PAGE_SIZE', 50)
+
+
+def get_stats_cache():
+    return caches[getattr(settings, 'DOWNLOAD_STATS_CACHE', 'default')]
+
+
+def encode_cursor(download):
+    raw = f"{download.created_at.isoformat()}|{download.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor, raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def page_queryset(queryset, cursor=None, page_size=None):
+    """
+    Downloads of queryset older than cursor, newest first, with one row more
+    than the page so the caller can tell whether there is a next page
+    """
+    page_size = page_size or get_page_size()
+    queryset = queryset.only(*LIST_COLUMNS).annotate(
+        error_summary=Substr('error_message', 1, ERROR_SUMMARY_LENGTH)
+    ).order_by('-created_at', '-id')
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # The created_at__lte bound lets the database seek into the index
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk),
+            created_at__lte=created_at,
+        )
+    return queryset[:page_size + 1]
+
+
+def downloads_page(queryset, cursor=None, page_size=None):
+    """
+    One page of downloads older than cursor, newest first
+    Returns (downloads, cursor of the next page or None)
+    """
+    page_size = page_size or get_page_size()
+    downloads = list(page_queryset(queryset, cursor, page_size))
+    if len(downloads) > page_size:
+        downloads = downloads[:page_size]
+        return downloads, encode_cursor(downloads[-1])
+    return downloads, None
+
+
+def download_stats(user):
+    """
+    Totals per status of a user's downloads
+    Counting walks the whole history, so the result is cached for
+    DOWNLOAD_STATS_TTL seconds instead of being recounted on every page view
+    """
+    cache = get_stats_cache()
+    key = f'download_stats:{user.pk}'
+    stats = cache.get(key)
+    if stats is None:
+        from .models import DownloadedVideo
+
+        stats = DownloadedVideo.objects.filter(user=user).aggregate(
+            total=Count('pk'),
+            completed=Count('pk', filter=Q(status='completed')),
+            in_progress=Count('pk', filter=Q(status__in=['pending', 'downloading'])),
+            failed=Count('pk', filter=Q(status='failed')),
+        )
+        cache.set(key, stats, getattr(settings, 'DOWNLOAD_STATS_TTL', 30))
+    return stats
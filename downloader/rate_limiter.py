@@ -0,0 +1,207 @@
+"""
+Adaptive per-host rate limiter
+A token bucket per host group, kept in the Django cache so every process
+using the same cache shares one budget. Callers only wait when the bucket
+is empty, throttling responses (429/403/login wall) halve the host's rate
+and successful responses slowly raise it back. When the cache backend fails
+(database locked, Redis unreachable) requests are let through unlimited
+"""
+
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rate_limit:'
+
+# Host group -> bucket settings, rate is in requests per second
+DEFAULT_RATE_LIMITS = {
+    'instagram.com': {'rate': 0.5, 'burst': 5},
+    'cdninstagram.com': {'rate': 5, 'burst': 20},
+    'facebook.com': {'rate': 1, 'burst': 5},
+    'fbcdn.net': {'rate': 5, 'burst': 20},
+    'tiktok.com': {'rate': 1, 'burst': 5},
+    'pinterest.com': {'rate': 2, 'burst': 10},
+}
+
+THROTTLE_STATUS_CODES = {403, 429}
+THROTTLE_MESSAGES = ('429', 'too many requests', 'rate-limit', 'rate limit', 'login required', 'please wait a few minutes')
+
+BACKOFF_FACTOR = 0.5
+STATE_TTL = 60 * 60
+
+
+class RateLimited(Exception):
+    """The host's budget won't allow a request within the allowed wait"""
+
+
+def match_host_group(url, groups):
+    """Host group of a URL or host name, a group matches itself and its subdomains"""
+    host = (urlparse(url).hostname if '://' in url else url) or ''
+    host = host.lower()
+    for group in groups:
+        if host == group or host.endswith('.' + group):
+            return group
+    return None
+
+
+def get_rate_limits():
+    limits = dict(DEFAULT_RATE_LIMITS)
+    limits.update(getattr(settings, 'RATE_LIMITS', {}))
+    return limits
+
+
+def get_max_wait():
+    return getattr(settings, 'RATE_LIMIT_MAX_WAIT', 60)
+
+
+def _cache():
+    return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+
+@contextmanager
+def _locked(group):
+    """Short cross-process lock around one bucket update (fails open)"""
+    cache = _cache()
+    lock_key = f'{KEY_PREFIX}{group}:lock'
+    token = uuid.uuid4().hex
+    acquired = False
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline:
+        if cache.add(lock_key, token, timeout=5):
+            acquired = True
+            break
+        time.sleep(0.01)
+    try:
+        yield cache
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def _load(cache, group, config, now):
+    state = cache.get(KEY_PREFIX + group)
+    if state is None:
+        state = {'tokens': float(config['burst']), 'rate': float(config['rate']), 'updated': now, 'blocked_until': 0}
+    # Refill since the last update
+    elapsed = max(now - state['updated'], 0)
+    state['tokens'] = min(float(config['burst']), state['tokens'] + elapsed * state['rate'])
+    state['updated'] = now
+    return state
+
+
+def acquire(url, max_wait=None):
+    """
+    Take one request from the bucket of url's host
+    Blocks only while the bucket is empty, returns the seconds waited
+    Raises RateLimited if no token is available within max_wait seconds
+    """
+    limits = get_rate_limits()
+    group = match_host_group(url, limits)
+    if group is None:
+        return 0.0
+
+    config = limits[group]
+    max_wait = get_max_wait() if max_wait is None else max_wait
+    started = time.monotonic()
+
+    while True:
+        try:
+            with _locked(group) as cache:
+                now = time.time()
+                state = _load(cache, group, config, now)
+                if state['blocked_until'] <= now and state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    cache.set(KEY_PREFIX + group, state, timeout=STATE_TTL)
+                    return time.monotonic() - started
+                cache.set(KEY_PREFIX + group, state, timeout=STATE_TTL)
+                wait = max(state['blocked_until'] - now, (1 - state['tokens']) / state['rate'])
+        except Exception as e:
+            logger.warning(f"Rate limit cache unavailable, not limiting {group}: {e}")
+            return 0.0
+
+        waited = time.monotonic() - started
+        if waited + wait > max_wait:
+            raise RateLimited(f"Rate limit for {group} needs {wait:.1f}s, more than the {max_wait}s allowed")
+        time.sleep(wait)
+
+
+def report(url, throttled, retry_after=None):
+    """
+    Feed the outcome of a request back into its host's rate
+    Throttled requests halve the rate and empty the bucket, successful ones
+    add a small step back towards the configured rate
+    """
+    limits = get_rate_limits()
+    group = match_host_group(url, limits)
+    if group is None:
+        return
+
+    config = limits[group]
+    min_rate = config.get('min_rate', config['rate'] / 20)
+    try:
+        with _locked(group) as cache:
+            now = time.time()
+            state = _load(cache, group, config, now)
+            if throttled:
+                state['rate'] = max(min_rate, state['rate'] * BACKOFF_FACTOR)
+                state['tokens'] = 0.0
+                state['blocked_until'] = now + (retry_after if retry_after else 1 / state['rate'])
+                logger.warning(f"Throttled by {group}, rate lowered to {state['rate']:.3f}/s")
+            elif state['rate'] < config['rate']:
+                state['rate'] = min(float(config['rate']), state['rate'] + config['rate'] * 0.05)
+            else:
+                return
+            cache.set(KEY_PREFIX + group, state, timeout=STATE_TTL)
+    except Exception as e:
+        logger.warning(f"Rate limit cache unavailable, outcome for {group} not recorded: {e}")
+
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_login_wall(response):
+    return '/accounts/login' in response.url or '/login/' in urlparse(response.url).path
+
+
+def observe_response(url, response):
+    """Report an HTTP response for url's host"""
+    if response.status_code in THROTTLE_STATUS_CODES or is_login_wall(response):
+        report(url, True, _retry_after(response))
+    elif response.status_code < 400:
+        report(url, False)
+
+
+def observe_error(url, error):
+    """Report a failed fetch (e.g. a yt-dlp error) if it looks like throttling"""
+    message = str(error).lower()
+    if any(marker in message for marker in THROTTLE_MESSAGES):
+        report(url, True)
+
+
+def get_state(url):
+    """Current bucket of url's host (for debugging), None if it's not limited"""
+    limits = get_rate_limits()
+    group = match_host_group(url, limits)
+    if group is None:
+        return None
+    with _locked(group) as cache:
+        return dict(_load(cache, group, limits[group], time.time()), group=group)
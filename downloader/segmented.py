@@ -0,0 +1,229 @@
+"""
+Segmented, resumable downloads of direct media URLs (CDN video and image files)
+The size and range support are probed first, then the file is preallocated
+and SEGMENTS byte ranges are fetched in parallel into it. Progress is kept in
+a sidecar next to the partial file, so a download cut off by a crash or a
+timeout continues where it stopped on the next attempt
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import http_client
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'SEGMENTS': 4,                       # parallel ranges per file
+    'MIN_SEGMENT_SIZE': 4 * 1024 * 1024,  # smaller files use one stream
+    'BUFFER_SIZE': 1024 * 1024,          # bytes read per chunk
+    'SAVE_INTERVAL': 2,                  # seconds between sidecar saves
+}
+
+PART_SUFFIX = '.part'
+STATE_SUFFIX = '.part.json'
+
+CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadIncomplete(Exception):
+    """Some ranges could not be fetched, the partial file is kept for a resume"""
+
+
+def get_config():
+    config = dict(DEFAULT_CONFIG)
+    config.update(getattr(settings, 'SEGMENTED_DOWNLOAD', {}))
+    return config
+
+
+def probe(url, headers=None, timeout=30):
+    """
+    Ask for the first byte of url
+    Returns (total size or None, True if byte ranges are supported, validator)
+    The validator (ETag or Last-Modified) tells if a partial file still
+    belongs to the same content
+    """
+    response = http_client.get(url, stream=True, timeout=(10, timeout),
+                               headers={**(headers or {}), 'Range': 'bytes=0-0'})
+    try:
+        response.raise_for_status()
+        validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if response.status_code == 206:
+            match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+            if match and match.group(3) != '*':
+                return int(match.group(3)), True, validator
+            return None, False, validator
+        length = response.headers.get('Content-Length')
+        return (int(length) if length and length.isdigit() else None), False, validator
+    finally:
+        response.close()
+
+
+def split_ranges(total, segments, min_size):
+    """[[start, end]] (inclusive) covering total bytes in at most segments parts"""
+    count = max(1, min(segments, total // max(min_size, 1)))
+    size = -(-total // count)
+    return [[start, min(start + size, total) - 1] for start in range(0, total, size)]
+
+
+def _load_state(state_path, part_path, total, validator):
+    """Progress of an earlier attempt, None if there is nothing to resume"""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('total') != total or state.get('validator') != validator:
+        return None
+    if not os.path.exists(part_path) or os.path.getsize(part_path) != total:
+        return None
+    return state
+
+
+def _save_state(state_path, state):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def _preallocate(part_path, total):
+    with open(part_path, 'wb') as f:
+        if total and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, total)
+                return
+            except OSError:
+                pass  # Filesystem without fallocate support
+        f.truncate(total)
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def download(url, file_path, headers=None, timeout=300, deadline=None):
+    """
+    Download url to file_path, in parallel ranges when the server allows it
+    Only a complete file ever appears under file_path
+    Raises DownloadIncomplete or DeadlineExceeded (partial file kept) or the
+    request error
+    Returns the number of bytes written
+    """
+    config = get_config()
+    total, ranged, validator = probe(url, headers, timeout=min(timeout, 30))
+
+    if not ranged or not total or total < 2 * config['MIN_SEGMENT_SIZE']:
+        return _download_single(url, file_path, headers, timeout, config, deadline)
+    return _download_segments(url, file_path, headers, timeout, config, total, validator, deadline)
+
+
+def _download_single(url, file_path, headers, timeout, config, deadline=None):
+    """One stream for small files and servers without range support"""
+    part_path = file_path + PART_SUFFIX
+    _remove(file_path + STATE_SUFFIX)
+    response = http_client.get(url, stream=True, timeout=(10, timeout), headers=headers or {})
+    try:
+        response.raise_for_status()
+        size = 0
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=config['BUFFER_SIZE']):
+                # A slow but steady transfer must not outlive the job
+                if deadline is not None:
+                    deadline.check('download')
+                if chunk:
+                    f.write(chunk)
+                    size += len(chunk)
+    except Exception:
+        _remove(part_path)
+        raise
+    finally:
+        response.close()
+
+    os.replace(part_path, file_path)
+    return size
+
+
+def _download_segments(url, file_path, headers, timeout, config, total, validator, deadline=None):
+    part_path = file_path + PART_SUFFIX
+    state_path = file_path + STATE_SUFFIX
+
+    state = _load_state(state_path, part_path, total, validator)
+    if state:
+        logger.info(f"Resuming {file_path} at {sum(done for _, _, done in state['segments'])}/{total} bytes")
+    else:
+        ranges = split_ranges(total, config['SEGMENTS'], config['MIN_SEGMENT_SIZE'])
+        # [start, end, bytes done] per segment
+        state = {'total': total, 'validator': validator,
+                 'segments': [[start, end, 0] for start, end in ranges]}
+        _preallocate(part_path, total)
+        _save_state(state_path, state)
+
+    lock = threading.Lock()
+    last_save = [time.monotonic()]
+
+    def progress(segment, size):
+        with lock:
+            segment[2] += size
+            if time.monotonic() - last_save[0] >= config['SAVE_INTERVAL']:
+                _save_state(state_path, state)
+                last_save[0] = time.monotonic()
+
+    def fetch(segment):
+        start, end, done = segment
+        if start + done > end:
+            return
+        response = http_client.get(url, stream=True, timeout=(10, timeout),
+                                   headers={**(headers or {}), 'Range': f'bytes={start + done}-{end}'})
+        try:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise DownloadIncomplete(f"Range request answered with {response.status_code}")
+            with open(part_path, 'r+b') as f:
+                f.seek(start + done)
+                for chunk in response.iter_content(chunk_size=config['BUFFER_SIZE']):
+                    if deadline is not None:
+                        deadline.check('download')
+                    if chunk:
+                        # Never write past the segment, whatever the server sends
+                        chunk = chunk[:end + 1 - (start + segment[2])]
+                        f.write(chunk)
+                        progress(segment, len(chunk))
+        finally:
+            response.close()
+
+    pending = [segment for segment in state['segments'] if segment[0] + segment[2] <= segment[1]]
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix='segment') as pool:
+        for future in [pool.submit(fetch, segment) for segment in pending]:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+
+    missing = [segment for segment in state['segments'] if segment[0] + segment[2] <= segment[1]]
+    if missing:
+        _save_state(state_path, state)
+        for error in errors:
+            if isinstance(error, DeadlineExceeded):
+                raise error
+        raise DownloadIncomplete(
+            f"{len(missing)} of {len(state['segments'])} ranges incomplete"
+            f"{f': {errors[0]}' if errors else ''}"
+        )
+
+    _remove(state_path)
+    os.replace(part_path, file_path)
+    return total
@@ -0,0 +1,67 @@
+"""
+Serving downloaded files to the browser
+The view checks ownership, the front-end web server sends the bytes when one
+is configured (X-Accel-Redirect for nginx, X-Sendfile for Apache/lighttpd),
+so a multi-hundred-MB download doesn't hold a Django worker for its whole
+transfer
+"""
+
+import logging
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import content_disposition_header
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('python', 'nginx', 'xsendfile')
+
+
+def get_backend():
+    backend = getattr(settings, 'SENDFILE_BACKEND', 'python')
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown SENDFILE_BACKEND {backend!r}, serving files from Python")
+        return 'python'
+    return backend
+
+
+def _internal_url(file_path):
+    """URL of file_path under the nginx internal location, None if outside MEDIA_ROOT"""
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(file_path)
+    if os.path.commonpath([media_root, real_path]) != media_root:
+        return None
+    relative = os.path.relpath(real_path, media_root).replace(os.sep, '/')
+    return getattr(settings, 'SENDFILE_URL', '/protected/').rstrip('/') + '/' + quote(relative)
+
+
+def serve_file(file_path, filename):
+    """Response that sends file_path as an attachment named filename"""
+    backend = get_backend()
+
+    if backend == 'nginx':
+        url = _internal_url(file_path)
+        if url:
+            response = _offload_response(file_path, filename)
+            response['X-Accel-Redirect'] = url
+            return response
+        logger.warning(f"{file_path} is outside MEDIA_ROOT, serving it from Python")
+    elif backend == 'xsendfile':
+        response = _offload_response(file_path, filename)
+        response['X-Sendfile'] = os.path.realpath(file_path)
+        return response
+
+    # No proxy in front: FileResponse hands the open file to the server's
+    # wsgi.file_wrapper, which gunicorn and uWSGI send with sendfile(2)
+    return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=filename)
+
+
+def _offload_response(file_path, filename):
+    """Empty response with the headers of the file, the proxy fills in the body"""
+    content_type, _ = mimetypes.guess_type(file_path)
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
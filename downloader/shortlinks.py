@@ -0,0 +1,106 @@
+"""
+Short-link resolver
+Expands pin.it, vm.tiktok.com, tiktok.com/t, fb.watch and facebook share
+links to their canonical URLs before extraction, so the media ID is known
+up front. Results are kept in the ShortLink table with a TTL. Links that
+couldn't be resolved are kept too, pointing at themselves, for the shorter
+SHORT_LINK_NEGATIVE_TTL so a dead link isn't fetched again on every request
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+from . import http_client
+from .models import ShortLink
+from .rate_limiter import RateLimited
+from .url_classifier import classify_url
+
+logger = logging.getLogger(__name__)
+
+# short url -> (expires monotonic time, canonical url), in front of the table
+_memory_cache = {}
+_MEMORY_CACHE_SIZE = 1000
+
+
+def get_short_link_ttl():
+    return getattr(settings, 'SHORT_LINK_TTL', 24 * 60 * 60)
+
+
+def get_negative_ttl():
+    return getattr(settings, 'SHORT_LINK_NEGATIVE_TTL', 5 * 60)
+
+
+def _follow_redirects(url):
+    """Follow redirects without downloading the final page body"""
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+
+    response = http_client.head(url, allow_redirects=True, timeout=10)
+    if response.status_code in (403, 405) or response.status_code >= 500:
+        # Some hosts reject HEAD, fall back to a GET and drop the body
+        response = http_client.get(url, timeout=10, stream=True)
+        response.close()
+    return response.url
+
+
+def _remember(short_url, canonical_url, ttl):
+    if len(_memory_cache) >= _MEMORY_CACHE_SIZE:
+        _memory_cache.clear()
+    _memory_cache[short_url] = (time.monotonic() + ttl, canonical_url)
+
+
+def _store(short_url, canonical_url, ttl):
+    now = timezone.now()
+    ShortLink.objects.update_or_create(
+        short_url=short_url,
+        defaults={
+            'canonical_url': canonical_url,
+            'resolved_at': now,
+            'expires_at': now + timedelta(seconds=ttl),
+        }
+    )
+    _remember(short_url, canonical_url, ttl)
+
+
+def resolve_short_link(url):
+    """
+    Expand a short link to its canonical media URL
+    Returns the URL unchanged if it is not a short link or can't be resolved
+    """
+    classified = classify_url(url)
+    if not classified.is_short_link:
+        return url
+
+    cached = _memory_cache.get(url)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    link = ShortLink.objects.filter(short_url=url, expires_at__gt=timezone.now()).first()
+    if link:
+        remaining = (link.expires_at - timezone.now()).total_seconds()
+        _remember(url, link.canonical_url, remaining)
+        return link.canonical_url
+
+    try:
+        resolved = _follow_redirects(url)
+    except (requests.RequestException, RateLimited) as e:
+        logger.warning(f"Could not resolve short link {url}: {e}")
+        _store(url, url, get_negative_ttl())
+        return url
+
+    # Only keep results that point at a real media URL of the same platform,
+    # login walls and home page redirects are left to yt-dlp
+    target = classify_url(resolved)
+    if (target.platform != classified.platform or target.is_short_link
+            or not target.media_id or len(resolved) > 500):
+        logger.info(f"Short link {url} resolved to unusable URL {resolved}")
+        _store(url, url, get_negative_ttl())
+        return url
+
+    _store(url, resolved, get_short_link_ttl())
+    return resolved
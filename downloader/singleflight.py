@@ -0,0 +1,144 @@
+"""
+Single-flight coalescing of downloads for the same media
+The first job for a media key does the work. Concurrent jobs for the same
+key are parked on it without holding a worker thread, and put back in the
+queue when the leader is done, where they reuse its result. Works across
+threads through an in-process registry and across processes through the
+MediaLock table
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .jobs import get_lease_seconds, get_worker_id, wake_jobs
+from .models import DownloadedVideo, MediaLock
+
+logger = logging.getLogger(__name__)
+
+# Media keys led by this process, checked before the MediaLock table
+_local_flights = set()
+_local_lock = threading.Lock()
+
+
+def _acquire_db_lock(media_key, owner):
+    """Take the MediaLock row for a key, or steal it if it expired"""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=get_lease_seconds())
+    try:
+        with transaction.atomic():
+            MediaLock.objects.create(media_key=media_key, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        # Lock holder died without releasing, take over the expired lock
+        return bool(MediaLock.objects.filter(
+            media_key=media_key, expires_at__lt=now
+        ).update(owner=owner, expires_at=expires_at))
+
+
+def acquire(media_key, owner=None):
+    """Try to become the leader for a media key"""
+    owner = owner or get_worker_id()
+    with _local_lock:
+        if media_key in _local_flights:
+            return False
+        _local_flights.add(media_key)
+
+    try:
+        if _acquire_db_lock(media_key, owner):
+            return True
+    except Exception:
+        _release_local(media_key)
+        raise
+
+    _release_local(media_key)
+    return False
+
+
+def _release_local(media_key):
+    with _local_lock:
+        _local_flights.discard(media_key)
+
+
+def release(media_key, owner=None):
+    """Give up leadership of a media key and wake the jobs parked on it"""
+    owner = owner or get_worker_id()
+    try:
+        MediaLock.objects.filter(media_key=media_key, owner=owner).delete()
+        _wake_followers(media_key)
+    finally:
+        _release_local(media_key)
+
+
+def renew(owner=None):
+    """Extend every lock held by this process (called by the job heartbeat)"""
+    owner = owner or get_worker_id()
+    expires_at = timezone.now() + timedelta(seconds=get_lease_seconds())
+    MediaLock.objects.filter(owner=owner).update(expires_at=expires_at)
+
+
+def park(video_obj, media_key):
+    """
+    Park a follower job until the leader of media_key is done
+    The job goes back to pending but can't be claimed while waiting_for is
+    set, so it holds no worker thread. The leader clears it on release
+    Returns False if the leader finished before the job was parked
+    """
+    DownloadedVideo.objects.filter(pk=video_obj.pk).update(status='pending', waiting_for=media_key)
+    if MediaLock.objects.filter(media_key=media_key, expires_at__gte=timezone.now()).exists():
+        video_obj.status = 'pending'
+        video_obj.waiting_for = media_key
+        logger.info(f"Job {video_obj.pk} parked on the in-flight download of {media_key}")
+        return True
+    # Released in the meantime, nobody is left to wake the job up
+    DownloadedVideo.objects.filter(pk=video_obj.pk, waiting_for=media_key).update(
+        status=video_obj.status, waiting_for=''
+    )
+    return False
+
+
+def _wake_followers(media_key):
+    """Make the jobs parked on media_key claimable again"""
+    followers = list(DownloadedVideo.objects.filter(waiting_for=media_key).values_list('pk', flat=True))
+    if followers:
+        DownloadedVideo.objects.filter(pk__in=followers, waiting_for=media_key).update(waiting_for='')
+        wake_jobs(followers)
+
+
+def release_expired():
+    """
+    Drop locks whose holder died without releasing them, and wake the jobs
+    parked on them (called with the lease reclaim)
+    """
+    now = timezone.now()
+    for media_key in MediaLock.objects.filter(expires_at__lt=now).values_list('media_key', flat=True):
+        if MediaLock.objects.filter(media_key=media_key, expires_at__lt=now).delete()[0]:
+            logger.info(f"Released expired media lock {media_key}")
+            _wake_followers(media_key)
+
+
+@contextmanager
+def single_flight(media_key):
+    """
+    Coalesce work for a media key
+    Yields True when the caller is the leader and should do the work, and
+    False when another job is downloading it, the caller should then park()
+    (or reuse the result if the leader just finished)
+    """
+    if not media_key:
+        yield True
+        return
+
+    owner = get_worker_id()
+    if acquire(media_key, owner):
+        try:
+            yield True
+        finally:
+            release(media_key, owner)
+        return
+
+    yield False
@@ -0,0 +1,161 @@
+"""
+Crash-safe writes of downloaded files
+Every job downloads into its own staging directory, a finished file is
+fsynced and atomically renamed into the content store, so a file under
+its final name is always complete. What a crashed worker leaves
+behind stays in staging, where recover_staging resumes or removes it
+"""
+
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .deadline import Deadline
+from .models import DownloadedVideo
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = '.staging'
+
+# Partial files writers used to leave next to the finished downloads
+PARTIAL_SUFFIXES = ('.part', '.part.json', '.ytdl', '.temp', '.tmp')
+
+# Partial files a later attempt continues from (segmented sidecars, yt-dlp)
+RESUMABLE_SUFFIXES = ('.part.json', '.ytdl', '.part')
+
+
+def get_downloads_root():
+    return os.path.join(settings.MEDIA_ROOT, 'downloads')
+
+
+def get_staging_root():
+    return os.path.join(get_downloads_root(), STAGING_DIR)
+
+
+def job_dir(video_obj):
+    """Staging directory of a job, created if needed"""
+    path = os.path.join(get_staging_root(), str(video_obj.pk))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish(staged_path, final_path):
+    """
+    Move a finished file from staging to its final place
+    The data is flushed to disk before the rename, and the rename is
+    flushed after it, so a crash never leaves a truncated final file
+    """
+    with open(staged_path, 'rb') as f:
+        os.fsync(f.fileno())
+    final_dir = os.path.dirname(final_path)
+    os.makedirs(final_dir, exist_ok=True)
+    os.replace(staged_path, final_path)
+    _fsync_dir(final_dir)
+    return final_path
+
+
+def discard(video_obj):
+    """Remove what is left in a job's staging directory"""
+    shutil.rmtree(os.path.join(get_staging_root(), str(video_obj.pk)), ignore_errors=True)
+
+
+def has_partials(video_obj):
+    """True if the job left a partial download a later attempt can resume"""
+    try:
+        names = os.listdir(os.path.join(get_staging_root(), str(video_obj.pk)))
+    except FileNotFoundError:
+        return False
+    return any(name.endswith(RESUMABLE_SUFFIXES) for name in names)
+
+
+def _resumable(video_obj):
+    """True if the job will run again, so its partial files are worth keeping"""
+    if video_obj.status != 'pending':
+        return False
+    return not Deadline.for_job(video_obj).expired
+
+
+def recover_staging():
+    """
+    Clean up after crashed workers, run when a worker starts
+    Jobs whose lease expired are put back in the queue first. The staging
+    directories of jobs that will run again are kept so their partial
+    files resume, the rest are deleted. Jobs that are still running on
+    another worker are left alone
+    Returns (kept, removed)
+    """
+    from .jobs import reclaim_expired_leases
+
+    reclaim_expired_leases()
+
+    root = get_staging_root()
+    kept = removed = 0
+    now = timezone.now()
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        names = []
+
+    for name in names:
+        path = os.path.join(root, name)
+        video = DownloadedVideo.objects.filter(pk=name).first() if name.isdigit() else None
+        if video and video.status == 'downloading' and video.lease_expires_at and video.lease_expires_at > now:
+            continue
+        if video and _resumable(video):
+            kept += 1
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+
+    removed += _remove_stray_partials(get_downloads_root())
+
+    if kept or removed:
+        logger.info(f"Staging recovery: {kept} partial job(s) kept for resume, {removed} removed")
+    return kept, removed
+
+
+def _remove_stray_partials(downloads_root, min_age=None):
+    """
+    Delete partial files outside staging that nobody is writing any more
+    (left by writers from before staging existed, in the old per-platform
+    directories, the content store shards never hold partial files)
+    """
+    from .jobs import get_lease_seconds
+
+    min_age = min_age if min_age is not None else get_lease_seconds()
+    cutoff = time.time() - min_age
+    removed = 0
+    try:
+        platform_dirs = [entry for entry in os.scandir(downloads_root)
+                         if entry.is_dir() and entry.name != STAGING_DIR and len(entry.name) > 2]
+    except FileNotFoundError:
+        return 0
+
+    for platform_dir in platform_dirs:
+        for entry in os.scandir(platform_dir.path):
+            if not entry.is_file() or not entry.name.endswith(PARTIAL_SUFFIXES):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
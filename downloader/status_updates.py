@@ -0,0 +1,175 @@
+"""
+Long-poll channel for download status
+A page sends the status it last saw for each job it shows and the request
+blocks until one of them differs (or the timeout passes), then returns every
+changed job at once. Jobs saved in this process wake the waiters at once
+through post_save. Every save and bulk status update also bumps a version
+key in the shared cache, which waiters read every STATUS_POLL_INTERVAL
+seconds to see changes made by other processes. The database itself is only
+queried when that version moved, or every STATUS_DB_POLL_INTERVAL seconds in
+case a bump was lost (cache evicted or unavailable)
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import DownloadedVideo
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'downloading')
+# Upper bound on the jobs one request may watch
+MAX_WATCHED_JOBS = 100
+STATUS_VERSION_KEY = 'download_status_version'
+
+
+def get_timeout():
+    """Seconds a request waits for a change before returning empty"""
+    return getattr(settings, 'STATUS_LONG_POLL_TIMEOUT', 25)
+
+
+def get_poll_interval():
+    return getattr(settings, 'STATUS_POLL_INTERVAL', 1)
+
+
+def get_db_poll_interval():
+    return getattr(settings, 'STATUS_DB_POLL_INTERVAL', 5)
+
+
+def get_status_cache():
+    return caches[getattr(settings, 'STATUS_UPDATES_CACHE', 'default')]
+
+
+class StatusNotifier:
+    """Wakes up waiting requests when a download of this process is saved"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    @property
+    def version(self):
+        with self._condition:
+            return self._version
+
+    def notify(self):
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version, timeout):
+        """Block until notify() is called after version was read, or timeout"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout=timeout)
+
+
+notifier = StatusNotifier()
+
+
+def shared_version():
+    """Status version every process bumps, None if the cache can't be read"""
+    try:
+        return get_status_cache().get(STATUS_VERSION_KEY, 0)
+    except Exception as e:
+        logger.warning(f"Status version unavailable: {e}")
+        return None
+
+
+def bump_status_version():
+    """
+    Tell waiters in every process that job statuses changed
+    Called on each save and after bulk updates that don't send post_save
+    """
+    notifier.notify()
+    cache = get_status_cache()
+    try:
+        if not cache.add(STATUS_VERSION_KEY, 1, timeout=None):
+            cache.incr(STATUS_VERSION_KEY)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(STATUS_VERSION_KEY, 1, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to bump the status version: {e}")
+
+
+@receiver(post_save, sender=DownloadedVideo, dispatch_uid='downloader_status_updates')
+def _download_saved(sender, **kwargs):
+    bump_status_version()
+
+
+def parse_known(value):
+    """
+    {job id: status} from 'id:status,id:status'
+    Raises ValueError if value is malformed
+    """
+    known = {}
+    for item in filter(None, (value or '').split(',')):
+        pk, _, status = item.partition(':')
+        known[int(pk)] = status
+        if len(known) > MAX_WATCHED_JOBS:
+            raise ValueError(f"At most {MAX_WATCHED_JOBS} jobs can be watched")
+    return known
+
+
+def job_payload(video):
+    """Status of one download as the pages show it"""
+    return {
+        'id': video.pk,
+        'status': video.status,
+        'title': video.title,
+        'filename': video.filename,
+        'error_message': video.error_message,
+        'completed_at': video.completed_at.isoformat() if video.completed_at else None,
+        'assets': [
+            {'position': asset.position, 'media_type': asset.media_type, 'filename': asset.filename}
+            for asset in video.assets.all()
+        ],
+    }
+
+
+def wait_for_changes(user, known=None, timeout=None):
+    """
+    Block until the status of a job in known ({id: status}) differs from the
+    database, returns the payloads of the changed jobs ([] on timeout)
+    Without known the user's active jobs are watched from their current status
+    """
+    timeout = get_timeout() if timeout is None else timeout
+    jobs = DownloadedVideo.objects.filter(user=user)
+    if not known:
+        known = dict(
+            jobs.filter(status__in=ACTIVE_STATUSES).order_by('-created_at').values_list('pk', 'status')[:MAX_WATCHED_JOBS]
+        )
+        if not known:
+            return []
+    watched = jobs.filter(pk__in=list(known))
+    deadline = time.monotonic() + timeout
+    # Read before querying so a save between the query and the wait isn't missed
+    version = notifier.version
+    seen = shared_version()
+
+    while True:
+        current = dict(watched.values_list('pk', 'status'))
+        changed = [pk for pk, status in current.items() if known[pk] != status]
+        if changed:
+            return [job_payload(video) for video in jobs.filter(pk__in=changed).prefetch_related('assets')]
+
+        next_query = time.monotonic() + get_db_poll_interval()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            notifier.wait(version, min(get_poll_interval(), remaining))
+            if notifier.version != version:
+                version = notifier.version
+                seen = shared_version()
+                break
+            latest = shared_version()
+            if latest != seen or time.monotonic() >= next_query:
+                seen = latest
+                break
@@ -0,0 +1,231 @@
+"""
+Registry of download strategies
+Every strategy is a function strategy(video_obj, deadline) returning a
+StrategyResult, registered under a name with a timeout budget. Platforms
+declare the order their strategies are tried in, the runner skips circuits
+that are open and records latency and outcome histograms per strategy so
+the order can be tuned from data
+"""
+
+import bisect
+import logging
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import circuit_breaker
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# success: media downloaded, final: no other strategy should run (e.g. the
+# post has no video and the image path already decided the outcome)
+StrategyResult = namedtuple('StrategyResult', ['success', 'error', 'final'], defaults=(None, False))
+
+# Outcome of a whole run, final is set when a strategy decided the outcome
+# itself, primary_error is the error of the first non-fallback strategy
+# (the one the user-facing message is based on)
+StrategyRun = namedtuple('StrategyRun', ['success', 'final', 'tried', 'primary_error', 'last_error'])
+
+Strategy = namedtuple('Strategy', ['name', 'func', 'timeout', 'fallback'])
+
+_registry = {}
+
+# Default order per platform, DOWNLOAD_STRATEGIES in settings overrides it
+DEFAULT_PLATFORM_STRATEGIES = {
+    'instagram': ['ytdlp', 'embed', 'api', 'ytdlp_mobile', 'thumbnail'],
+}
+DEFAULT_STRATEGIES = ['ytdlp']
+
+# Latency histogram bucket upper bounds in seconds, the last one is open
+LATENCY_BUCKETS = [1, 2, 5, 10, 30, 60, 120, 300]
+OUTCOMES = ('success', 'failure', 'timeout')
+
+# Error markers of a blocked or throttled strategy, as opposed to a bad post
+OUTAGE_MESSAGES = (
+    'login', '429', 'too many requests', 'rate-limit', 'rate limit', '403', 'forbidden',
+    'blocked', 'checkpoint', 'timed out', 'timeout', 'connection',
+)
+
+METRICS_PREFIX = 'strategy_metrics:'
+METRICS_TTL = 7 * 24 * 60 * 60
+
+
+def register(name, timeout=60, fallback=False):
+    """
+    Register a strategy function under name
+    timeout is the strategy's budget in seconds, it gets a deadline of at
+    most that long (shorter if the job has less time left),
+    fallback strategies only run when the primary ones hit a login wall or
+    a block, they can't help with a post that doesn't exist
+    """
+    def decorator(func):
+        _registry[name] = Strategy(name, func, timeout, fallback)
+        return func
+    return decorator
+
+
+def get_strategy(name):
+    return _registry[name]
+
+
+def get_timeout(strategy):
+    return getattr(settings, 'STRATEGY_TIMEOUTS', {}).get(strategy.name, strategy.timeout)
+
+
+def get_platform_strategies(platform):
+    """Registered strategy names for a platform in their configured order"""
+    configured = dict(DEFAULT_PLATFORM_STRATEGIES)
+    configured.update(getattr(settings, 'DOWNLOAD_STRATEGIES', {}))
+    return [name for name in configured.get(platform, DEFAULT_STRATEGIES) if name in _registry]
+
+
+def is_access_error(error):
+    """Login wall, private post or block, the errors the fallbacks can get around"""
+    error = str(error).lower()
+    return 'login' in error or 'private' in error or 'not available' in error
+
+
+def ordered_strategies(platform):
+    """
+    The platform's strategies in the order they run: every primary before
+    any fallback, each tier sorted by recent success rate
+    """
+    names = get_platform_strategies(platform)
+    primaries = [name for name in names if not _registry[name].fallback]
+    fallbacks = [name for name in names if _registry[name].fallback]
+    ordered = circuit_breaker.order_strategies(platform, primaries) + circuit_breaker.order_strategies(platform, fallbacks)
+    # Every circuit is open: never leave the platform without a strategy,
+    # they are probed one job at a time as if half open
+    return ordered or primaries + fallbacks
+
+
+def is_outage_error(error):
+    """
+    Errors that say the strategy can't get through right now (block, login
+    wall, throttling, timeouts), the only failures that open its circuit
+    """
+    error = str(error).lower()
+    return any(marker in error for marker in OUTAGE_MESSAGES)
+
+
+def run_strategies(video_obj, deadline):
+    """
+    Try the platform's strategies until one succeeds
+    Strategies with an open circuit are skipped, the rest run best first
+    within their tier, fallbacks only after all the primaries
+    Raises DeadlineExceeded when the job's deadline runs out on the way
+    """
+    platform = video_obj.platform
+    tried = False
+    primary_error = None
+    last_error = None
+
+    names = ordered_strategies(platform)
+    last_resort = circuit_breaker.all_open(platform, names)
+
+    for name in names:
+        deadline.check(name)
+        strategy = _registry[name]
+        if strategy.fallback and primary_error is not None and not is_access_error(primary_error):
+            continue
+        if not circuit_breaker.allow(platform, name, last_resort=last_resort):
+            continue
+
+        tried = True
+        result, outcome = _run_one(video_obj, strategy, deadline)
+        circuit_breaker.record(
+            platform, name, result.success,
+            counted=outcome == 'timeout' or is_outage_error(result.error),
+        )
+        if result.success or result.final:
+            return StrategyRun(result.success, result.final, tried, primary_error, result.error)
+
+        last_error = result.error
+        if not strategy.fallback and primary_error is None:
+            primary_error = result.error
+
+    deadline.check()
+    return StrategyRun(False, False, tried, primary_error, last_error)
+
+
+def _run_one(video_obj, strategy, deadline):
+    timeout = get_timeout(strategy)
+    stage_deadline = deadline.child(timeout)
+    started = time.monotonic()
+    try:
+        result = strategy.func(video_obj, stage_deadline)
+    except DeadlineExceeded as e:
+        result = StrategyResult(False, str(e))
+    except Exception as e:
+        logger.exception(f"Strategy {strategy.name} crashed for {video_obj.url}")
+        result = StrategyResult(False, str(e))
+    elapsed = time.monotonic() - started
+
+    if result.success:
+        outcome = 'success'
+        if stage_deadline.expired:
+            logger.warning(f"Strategy {strategy.name} took {elapsed:.1f}s, over its budget")
+    elif stage_deadline.expired:
+        outcome = 'timeout'
+    else:
+        outcome = 'failure'
+    record_metrics(video_obj.platform, strategy.name, outcome, elapsed)
+    return result, outcome
+
+
+def _metrics_cache():
+    return caches[getattr(settings, 'STRATEGY_METRICS_CACHE', 'default')]
+
+
+def _metric_key(platform, name, outcome, bucket):
+    return f'{METRICS_PREFIX}{platform}:{name}:{outcome}:{bucket}'
+
+
+def _incr(cache, key):
+    cache.add(key, 0, timeout=METRICS_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, timeout=METRICS_TTL)
+
+
+def record_metrics(platform, name, outcome, elapsed):
+    """Count one run in the latency histogram of its outcome"""
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+    try:
+        _incr(_metrics_cache(), _metric_key(platform, name, outcome, bucket))
+    except Exception as e:
+        logger.warning(f"Could not record metrics for strategy {name}: {e}")
+
+
+def strategy_metrics(platform, names=None):
+    """
+    Histograms per strategy of a platform
+    Returns {name: {outcome: [count per latency bucket], 'runs', 'success_rate'}}
+    """
+    names = names or get_platform_strategies(platform)
+    buckets = range(len(LATENCY_BUCKETS) + 1)
+    keys = [_metric_key(platform, name, outcome, bucket)
+            for name in names for outcome in OUTCOMES for bucket in buckets]
+    counts = _metrics_cache().get_many(keys)
+
+    metrics = {}
+    for name in names:
+        entry = {
+            outcome: [counts.get(_metric_key(platform, name, outcome, bucket), 0) for bucket in buckets]
+            for outcome in OUTCOMES
+        }
+        runs = sum(sum(entry[outcome]) for outcome in OUTCOMES)
+        entry['runs'] = runs
+        entry['success_rate'] = sum(entry['success']) / runs if runs else 0.0
+        metrics[name] = entry
+    return metrics
+
+
+def bucket_labels():
+    """Labels of the latency buckets, e.g. '<=1s' ... '>300s'"""
+    return [f'<={bound}s' for bound in LATENCY_BUCKETS] + [f'>{LATENCY_BUCKETS[-1]}s']
@@ -1,10 +1,11 @@
 from celery import shared_task
-from django.core.management import call_command
 from django.utils import timezone
 from datetime import timedelta
-import os
 import logging
 from .models import DownloadedVideo
+from .cleanup import cleanup_old_downloads
+from .content_store import release_file
+from .expiry import release_due, schedule_expiry
 
 logger = logging.getLogger(__name__)
 
@@ -12,63 +13,43 @@ logger = logging.getLogger(__name__)
 def cleanup_old_files(minutes=10):
     """
     Celery task to clean up files older than specified minutes
+    Rows are released in keyset-paginated chunks with bulk updates
+    (see downloader.cleanup)
     """
     cutoff_time = timezone.now() - timedelta(minutes=minutes)
     
-    # Find completed downloads older than cutoff time
-    old_downloads = DownloadedVideo.objects.filter(
-        status='completed',
-        completed_at__lt=cutoff_time,
-        file_path__isnull=False
-    ).exclude(file_path='')
-    
-    deleted_count = 0
-    freed_space = 0
-    
-    for download in old_downloads:
-        if download.file_path and os.path.exists(download.file_path):
-            try:
-                # Get file size before deletion
-                file_size = os.path.getsize(download.file_path)
-                
-                os.remove(download.file_path)
-                
-                # Clear file path in database
-                download.file_path = ''
-                download.filename = ''
-                download.save()
-                
-                deleted_count += 1
-                freed_space += file_size
-                
-                logger.info(
-                    f"Deleted file: {download.filename} "
-                    f"({file_size / (1024*1024):.2f} MB) "
-                    f"from {download.platform}"
-                )
-                
-            except OSError as e:
-                logger.error(f"Error deleting file {download.file_path}: {e}")
+    progress = cleanup_old_downloads(cutoff_time)
     
     logger.info(
-        f"Cleanup task completed: Deleted {deleted_count} files, "
-        f"freed {freed_space / (1024*1024):.2f} MB"
+        f"Cleanup task completed: Deleted {progress.released} files, "
+        f"freed {progress.freed / (1024*1024):.2f} MB"
     )
     
     return {
-        'deleted_count': deleted_count,
-        'freed_space_mb': freed_space / (1024*1024)
+        'deleted_count': progress.released,
+        'freed_space_mb': progress.freed / (1024*1024)
     }
 
 
 def schedule_cleanup_after_download(download_id, delay_minutes=10):
     """
     Schedule cleanup for a specific download after delay
+    The deadline is stored on the row and released by the expiry scheduler
+    (or by release_expired_files), no Celery countdown task is queued
     """
-    cleanup_specific_file.apply_async(
-        args=[download_id],
-        countdown=delay_minutes * 60  # Convert to seconds
-    )
+    schedule_expiry(DownloadedVideo.objects.get(id=download_id), delay_minutes=delay_minutes)
+
+
+@shared_task
+def release_expired_files():
+    """
+    Celery beat task releasing every file whose expiry deadline passed
+    """
+    released, freed = release_due()
+    return {
+        'released_count': released,
+        'freed_space_mb': freed / (1024*1024)
+    }
 
 
 @shared_task
@@ -79,18 +60,13 @@ def cleanup_specific_file(download_id):
     try:
         download = DownloadedVideo.objects.get(id=download_id)
         
-        if download.file_path and os.path.exists(download.file_path):
-            file_size = os.path.getsize(download.file_path)
-            os.remove(download.file_path)
-            
-            # Clear file path in database
-            download.file_path = ''
-            download.filename = ''
-            download.save()
+        if download.file_path:
+            filename = download.filename
+            file_size = release_file(download)
             
             logger.info(
-                f"Auto-deleted file: {download.filename} "
-                f"({file_size / (1024*1024):.2f} MB) "
+                f"Auto-released file: {filename} "
+                f"({file_size / (1024*1024):.2f} MB freed) "
                 f"from {download.platform} after 10 minutes"
             )
             
@@ -2,7 +2,9 @@ import logging
 import requests
 from django.conf import settings
 from django.utils import timezone
+from . import http_client
 from .models import TelegramOTP, TelegramUser
+from .rate_limiter import RateLimited
 from django.contrib.auth.models import User
 
 logger = logging.getLogger(__name__)
@@ -33,7 +35,7 @@ class TelegramAuthService:
                 'parse_mode': 'HTML'
             }
             
-            response = requests.post(url, data=data, timeout=30)
+            response = http_client.post(url, data=data)
             
             if response.status_code == 200:
                 logger.info(f"OTP sent successfully to Telegram ID: {telegram_id}")
@@ -42,7 +44,7 @@ class TelegramAuthService:
                 logger.error(f"Failed to send OTP to Telegram ID {telegram_id}: HTTP {response.status_code}")
                 return False
             
-        except requests.RequestException as e:
+        except (requests.RequestException, RateLimited) as e:
             logger.error(f"Failed to send OTP to Telegram ID {telegram_id}: {e}")
             return False
         except Exception as e:
@@ -183,7 +185,7 @@ class TelegramAuthService:
             url = f"https://api.telegram.org/bot{self.bot_token}/getChat"
             data = {'chat_id': telegram_id}
             
-            response = requests.post(url, data=data, timeout=30)
+            response = http_client.post(url, data=data)
             
             if response.status_code == 200:
                 result = response.json()
@@ -200,7 +202,7 @@ class TelegramAuthService:
             logger.error(f"Failed to get Telegram user info for ID {telegram_id}: HTTP {response.status_code}")
             return None
             
-        except requests.RequestException as e:
+        except (requests.RequestException, RateLimited) as e:
             logger.error(f"Failed to get Telegram user info for ID {telegram_id}: {e}")
             return None
 
@@ -0,0 +1,190 @@
+"""
+Shared fixtures of the downloader tests
+"""
+
+import copy
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import override_settings
+
+from downloader.models import DownloadedVideo
+
+
+class TempMediaMixin:
+    """Runs every test with MEDIA_ROOT in a fresh temporary directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+class ClearCachesMixin:
+    """Starts every test with empty caches (rate buckets, circuits, metrics)"""
+
+    def setUp(self):
+        super().setUp()
+        for alias in ('default', 'shared'):
+            caches[alias].clear()
+
+
+def make_user(username='alice'):
+    return User.objects.create_user(username=username, password='secret')
+
+
+def make_download(user, url='https://www.instagram.com/p/ABC123/', **fields):
+    fields.setdefault('platform', 'instagram')
+    return DownloadedVideo.objects.create(user=user, url=url, **fields)
+
+
+def write_file(path, data=b'data'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def fake_youtube_dl(info, failing_formats=()):
+    """
+    Stand-in class for yt_dlp.YoutubeDL that extracts info and writes a
+    small file for the selected format, formats in failing_formats raise
+    The class records its extractions and downloads
+    """
+
+    class FakeYoutubeDL:
+        extractions = []
+        downloads = []
+
+        def __init__(self, params=None):
+            self.params = params or {}
+            self.format_selector = None
+            self.cookiejar = mock.Mock(**{'get_cookie_header.return_value': ''})
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def extract_info(self, url, download=False):
+            FakeYoutubeDL.extractions.append((url, self.params.get('http_headers')))
+            return copy.deepcopy(info)
+
+        def sanitize_info(self, value):
+            return value
+
+        def build_format_selector(self, spec):
+            return lambda ctx: iter(ctx['formats'][:1])
+
+        def prepare_filename(self, value):
+            return self.params['outtmpl'] % {'id': value.get('id', 'media'), 'ext': value.get('ext', 'mp4')}
+
+        def process_ie_result(self, value, download=True):
+            fmt = next(iter(self.format_selector({'formats': value.get('formats') or []})))
+            if fmt['format_id'] in failing_formats:
+                raise Exception(f"HTTP Error 500 for format {fmt['format_id']}")
+            FakeYoutubeDL.downloads.append(fmt['format_id'])
+            path = self.prepare_filename({**value, 'ext': fmt.get('ext', 'mp4')})
+            write_file(path, f"video {fmt['format_id']}".encode())
+            return {'requested_downloads': [{'filepath': path}]}
+
+    return FakeYoutubeDL
+
+
+def video_format(format_id, height=720, protocol='m3u8_native', **fields):
+    """Format entry of an extracted info dict"""
+    return {
+        'format_id': format_id, 'url': f'https://cdn.example.com/{format_id}.m3u8',
+        'ext': 'mp4', 'height': height, 'protocol': protocol,
+        'vcodec': 'avc1', 'acodec': 'mp4a', **fields,
+    }
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        server = self.server
+        server.requests.append((self.command, self.path, self.headers.get('Range')))
+        data = server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = 0, len(data) - 1
+        range_header = self.headers.get('Range')
+        if range_header and server.ranges:
+            first, _, last = range_header.split('=', 1)[1].partition('-')
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        else:
+            self.send_response(200)
+        if server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Type', 'video/mp4')
+        self.end_headers()
+        if body:
+            self.wfile.write(data[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients hanging up mid-response are expected
+
+
+class LocalHttpServer:
+    """
+    HTTP/1.1 server on 127.0.0.1 in a background thread serving files from
+    a dict of path -> bytes, with Range requests unless ranges is False
+    Records (method, path, Range header) of every request
+    """
+
+    def __init__(self, files, ranges=True):
+        self.httpd = _QuietHTTPServer(('127.0.0.1', 0), _RangeHandler)
+        self.httpd.files = files
+        self.httpd.ranges = ranges
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.httpd.server_port}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        return False
@@ -0,0 +1,96 @@
+import os
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from downloader import carousel
+from downloader.carousel import CarouselItem
+from downloader.deadline import Deadline
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+@override_settings(CAROUSEL_MAX_ITEMS=4)
+class CarouselItemsTests(SimpleTestCase):
+    def test_items_from_bypass_children(self):
+        children = [
+            {'is_video': True, 'video_url': 'https://cdn/1.mp4', 'image_url': 'https://cdn/1.jpg'},
+            {'is_video': False, 'image_url': 'https://cdn/2.jpg'},
+            {'is_video': True},
+            {'image_url': 'https://cdn/4.jpg'},
+            {'image_url': 'https://cdn/5.jpg'},
+        ]
+        self.assertEqual(carousel.items_from_children(children), [
+            CarouselItem(0, 'video', 'https://cdn/1.mp4', None),
+            CarouselItem(1, 'image', 'https://cdn/2.jpg', None),
+            CarouselItem(2, 'image', 'https://cdn/4.jpg', None),
+        ])
+
+    def test_items_from_a_playlist(self):
+        info = {'_type': 'playlist', 'entries': [{'formats': [{}]}, None, {'url': 'https://cdn/2.jpg'}]}
+        items = carousel.items_from_info(info)
+        self.assertEqual([(i.position, i.media_type) for i in items], [(0, 'video'), (1, 'image')])
+        self.assertIsNone(carousel.items_from_info({'id': 'single'}))
+
+
+class DownloadItemsTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user())
+
+    def items(self, count):
+        return [CarouselItem(i, 'image', f'https://cdn/{i}.jpg', None) for i in range(count)]
+
+    @override_settings(CAROUSEL_CONCURRENCY=3)
+    def test_items_download_concurrently(self):
+        started = threading.Barrier(3, timeout=5)
+
+        def fetch(url, media_path, name, *args):
+            # Only passes when three items are in flight at the same time
+            started.wait()
+            return write_file(os.path.join(media_path, f'{name}.jpg'))
+
+        with mock.patch('downloader.carousel._fetch_url', side_effect=fetch):
+            downloaded = carousel.download_items(self.video, self.items(3), Deadline.after(60))
+        self.assertEqual([os.path.basename(path) for _, path in downloaded],
+                         ['item_1.jpg', 'item_2.jpg', 'item_3.jpg'])
+
+    def test_failed_items_are_skipped(self):
+        def fetch(url, media_path, name, *args):
+            if name == 'item_2':
+                raise OSError('reset')
+            return write_file(os.path.join(media_path, f'{name}.jpg'))
+
+        with mock.patch('downloader.carousel._fetch_url', side_effect=fetch), \
+                self.assertLogs('downloader.carousel', 'WARNING'):
+            downloaded = carousel.download_items(self.video, self.items(3), Deadline.after(60))
+        self.assertEqual([item.position for item, _ in downloaded], [0, 2])
+
+    def test_nothing_downloaded_fails_the_carousel(self):
+        with mock.patch('downloader.carousel._fetch_url', side_effect=OSError('reset')), \
+                self.assertLogs('downloader.carousel', 'WARNING'):
+            self.assertFalse(carousel.download_carousel(self.video, self.items(2), Deadline.after(60)))
+
+
+class FetchUrlTests(TempMediaMixin, SimpleTestCase):
+    def test_videos_are_fetched_with_the_platforms_referer(self):
+        with mock.patch('downloader.carousel.segmented.download') as download:
+            path = carousel._fetch_url('https://cdn/1.mp4', self.media_root, 'item_1', 'video', 'tiktok', 30)
+        self.assertEqual(path, os.path.join(self.media_root, 'item_1.mp4'))
+        self.assertEqual(download.call_args.kwargs['headers'], {'Referer': 'https://www.tiktok.com/'})
+
+    def test_unknown_platforms_send_no_referer(self):
+        with mock.patch('downloader.carousel.segmented.download') as download:
+            carousel._fetch_url('https://cdn/1.mp4', self.media_root, 'item_1', 'video', 'other', 30)
+        self.assertEqual(download.call_args.kwargs['headers'], {})
+
+    def test_images_are_streamed_with_the_referer(self):
+        response = mock.Mock(headers={'content-type': 'image/webp'})
+        response.iter_content.return_value = [b'not really an image']
+        with mock.patch('downloader.carousel.http_client.get', return_value=response) as get:
+            path = carousel._fetch_url('https://i.pinimg.com/1', self.media_root, 'item_1', 'image', 'pinterest', 30)
+        self.assertEqual(get.call_args.kwargs['headers'], {'Referer': 'https://www.pinterest.com/'})
+        self.assertTrue(get.call_args.kwargs['stream'])
+        self.assertEqual(path, os.path.join(self.media_root, 'item_1.webp'))
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from downloader import circuit_breaker as breaker
+
+from .helpers import ClearCachesMixin
+
+
+@override_settings(CIRCUIT_BREAKER={'MIN_CALLS': 3, 'FAILURE_RATE': 0.6, 'COOLDOWN': 60, 'CACHE': 'shared'})
+class CircuitBreakerTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 1000.0
+        patcher = mock.patch('downloader.circuit_breaker.time')
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+
+    def fail(self, strategy='ytdlp', times=3):
+        for _ in range(times):
+            breaker.record('instagram', strategy, False)
+
+    def test_circuit_opens_after_enough_failures(self):
+        self.fail(times=2)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.CLOSED)
+        self.fail(times=1)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.OPEN)
+        self.assertFalse(breaker.allow('instagram', 'ytdlp'))
+        self.assertEqual(breaker.get_state('facebook', 'ytdlp'), breaker.CLOSED)
+
+    def test_one_probe_after_the_cooldown(self):
+        self.fail()
+        self.now += 61
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.HALF_OPEN)
+        self.assertTrue(breaker.allow('instagram', 'ytdlp'))
+        self.assertFalse(breaker.allow('instagram', 'ytdlp'))
+
+    def test_probe_outcome_decides_the_circuit(self):
+        self.fail()
+        self.now += 61
+        breaker.allow('instagram', 'ytdlp')
+        breaker.record('instagram', 'ytdlp', False)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.OPEN)
+
+        self.now += 61
+        breaker.allow('instagram', 'ytdlp')
+        breaker.record('instagram', 'ytdlp', True)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.CLOSED)
+        self.assertTrue(breaker.allow('instagram', 'ytdlp'))
+
+    def test_last_resort_probes_an_open_circuit(self):
+        self.fail()
+        self.assertTrue(breaker.allow('instagram', 'ytdlp', last_resort=True))
+        self.assertFalse(breaker.allow('instagram', 'ytdlp', last_resort=True))
+
+    def test_uncounted_failures_dont_open_the_circuit(self):
+        for _ in range(5):
+            breaker.record('instagram', 'ytdlp', False, counted=False)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.CLOSED)
+        self.assertEqual(breaker.breaker_stats('instagram', ['ytdlp'])['ytdlp']['calls'], 0)
+
+    def test_old_outcomes_are_forgotten(self):
+        self.fail(times=2)
+        self.now += 601
+        self.fail(times=1)
+        self.assertEqual(breaker.get_state('instagram', 'ytdlp'), breaker.CLOSED)
+
+    def test_strategies_are_ordered_by_success_rate(self):
+        breaker.record('instagram', 'embed', True)
+        breaker.record('instagram', 'api', False)
+        self.fail('ytdlp')
+        self.assertEqual(breaker.order_strategies('instagram', ['ytdlp', 'api', 'mobile', 'embed']),
+                         ['embed', 'mobile', 'api'])
+        self.assertFalse(breaker.all_open('instagram', ['ytdlp', 'api']))
+        self.fail('api')
+        self.assertTrue(breaker.all_open('instagram', ['ytdlp', 'api']))
+
+    def test_cache_errors_fail_open(self):
+        self.fail()
+        broken = mock.Mock(**{'get.side_effect': ConnectionError('redis down'),
+                              'set.side_effect': ConnectionError('redis down')})
+        with mock.patch('downloader.circuit_breaker._cache', return_value=broken), \
+                self.assertLogs('downloader.circuit_breaker', 'WARNING'):
+            self.assertEqual(breaker.order_strategies('instagram', ['ytdlp', 'api']), ['ytdlp', 'api'])
+            self.assertFalse(breaker.all_open('instagram', ['ytdlp']))
+            self.assertTrue(breaker.allow('instagram', 'ytdlp'))
+            breaker.record('instagram', 'ytdlp', False)
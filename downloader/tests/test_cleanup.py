@@ -0,0 +1,71 @@
+import io
+import os
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from downloader.cleanup import cleanup_old_downloads, iter_cleanup
+from downloader.content_store import attach_blob, store_file
+from downloader.models import DownloadedVideo, MediaBlob
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class CleanupTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.now = timezone.now()
+
+    def completed(self, data=b'video', age_minutes=30):
+        video = make_download(self.user, status='completed',
+                              completed_at=self.now - timedelta(minutes=age_minutes))
+        store_file(video, write_file(os.path.join(self.media_root, 'staging', 'clip.mp4'), data), 'video')
+        video.save()
+        return video
+
+    def test_old_files_are_released_in_chunks(self):
+        old = [self.completed(f'video {i}'.encode()) for i in range(5)]
+        recent = self.completed(b'recent', age_minutes=1)
+
+        progress = list(iter_cleanup(self.now - timedelta(minutes=10), chunk_size=2, workers=2))
+        self.assertEqual([p.rows for p in progress], [2, 2, 1])
+        self.assertEqual((progress[-1].released, progress[-1].freed, progress[-1].failed), (5, 35, 0))
+
+        for video in old:
+            self.assertFalse(os.path.exists(video.file_path))
+            self.assertEqual(DownloadedVideo.objects.get(pk=video.pk).file_path, '')
+        self.assertTrue(os.path.exists(DownloadedVideo.objects.get(pk=recent.pk).file_path))
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+    def test_shared_files_are_kept_for_other_references(self):
+        old = self.completed(b'shared')
+        recent = make_download(self.user, status='completed', completed_at=self.now)
+        attach_blob(recent, old.blob)
+        recent.save()
+
+        self.assertEqual(cleanup_old_downloads(self.now - timedelta(minutes=10)).released, 1)
+        self.assertEqual(MediaBlob.objects.get().ref_count, 1)
+        self.assertTrue(os.path.exists(recent.file_path))
+
+    def test_rows_without_a_blob_remove_their_own_file(self):
+        path = write_file(os.path.join(self.media_root, 'downloads', 'instagram', 'old.mp4'), b'abc')
+        make_download(self.user, status='completed', completed_at=self.now - timedelta(hours=1), file_path=path)
+        self.assertEqual(cleanup_old_downloads(self.now).freed, 3)
+        self.assertFalse(os.path.exists(path))
+
+    def test_dry_run_only_measures(self):
+        video = self.completed(b'12345')
+        progress = cleanup_old_downloads(self.now, dry_run=True)
+        self.assertEqual((progress.released, progress.freed), (1, 5))
+        self.assertTrue(os.path.exists(video.file_path))
+        self.assertEqual(DownloadedVideo.objects.get(pk=video.pk).file_path, video.file_path)
+
+    def test_command_reports_the_totals(self):
+        self.completed(b'12345')
+        out = io.StringIO()
+        call_command('cleanup_files', minutes=10, chunk_size=10, stdout=out)
+        self.assertIn('Chunk 1: 1 rows', out.getvalue())
+        self.assertIn('Cleanup completed: Deleted 1 files', out.getvalue())
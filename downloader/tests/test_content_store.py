@@ -0,0 +1,133 @@
+import os
+from unittest import mock
+
+from django.test import TestCase
+
+from downloader.carousel import CarouselItem, finish_carousel, reuse_carousel
+from downloader.content_store import (
+    attach_blob, blob_path, fallback_variant, find_blob, release_file, store_file,
+)
+from downloader.models import MediaBlob
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class ContentStoreTestCase(TempMediaMixin, TestCase):
+    key = 'instagram:ABC123'
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def staged(self, data=b'video', name='clip.mp4'):
+        return write_file(os.path.join(self.media_root, 'staging', name), data)
+
+    def download(self, **fields):
+        return make_download(self.user, media_key=self.key, **fields)
+
+
+class StoreFileTests(ContentStoreTestCase):
+    def test_file_moves_to_its_content_path(self):
+        video = self.download()
+        staged = self.staged()
+        blob = store_file(video, staged, 'video', variant='hd')
+        self.assertFalse(os.path.exists(staged))
+        self.assertTrue(os.path.exists(blob.file_path))
+        self.assertEqual(blob.file_path, blob_path(blob.sha256, '.mp4'))
+        self.assertEqual((blob.ref_count, blob.media_key, blob.variant), (1, self.key, 'hd'))
+        self.assertEqual(video.file_path, blob.file_path)
+
+    def test_same_content_is_stored_once(self):
+        first, second = self.download(), self.download()
+        blob = store_file(first, self.staged(name='a.mp4'), 'video')
+        staged = self.staged(name='b.mp4')
+        self.assertEqual(store_file(second, staged, 'video').pk, blob.pk)
+        self.assertFalse(os.path.exists(staged))
+        self.assertEqual(MediaBlob.objects.get().ref_count, 2)
+
+
+class ReuseTests(ContentStoreTestCase):
+    def test_attach_takes_a_reference(self):
+        blob = store_file(self.download(), self.staged(), 'video')
+        other = self.download(title='Processing...')
+        self.assertTrue(attach_blob(other, find_blob(self.key)))
+        self.assertEqual(MediaBlob.objects.get(pk=blob.pk).ref_count, 2)
+        self.assertEqual(other.file_path, blob.file_path)
+
+    def test_released_blobs_cant_be_attached(self):
+        blob = store_file(self.download(), self.staged(), 'video')
+        MediaBlob.objects.filter(pk=blob.pk).update(ref_count=0)
+        self.assertFalse(attach_blob(self.download(), blob))
+        self.assertIsNone(find_blob(self.key))
+
+    def test_find_filters_on_media_type_and_variant(self):
+        store_file(self.download(), self.staged(), 'video', variant='hd')
+        self.assertIsNotNone(find_blob(self.key, media_type='video'))
+        self.assertIsNone(find_blob(self.key, media_type='image'))
+        self.assertIsNone(find_blob(self.key, variant='sd'))
+        self.assertIsNone(find_blob(''))
+
+    def test_fallback_blobs_arent_reused(self):
+        store_file(self.download(), self.staged(), 'image', variant=fallback_variant('thumbnail'))
+        self.assertIsNone(find_blob(self.key))
+
+    def test_blobs_with_a_missing_file_arent_reused(self):
+        blob = store_file(self.download(), self.staged(), 'video')
+        os.remove(blob.file_path)
+        self.assertIsNone(find_blob(self.key))
+
+
+class ReleaseTests(ContentStoreTestCase):
+    def test_file_is_kept_until_the_last_reference_is_released(self):
+        first, second = self.download(), self.download()
+        blob = store_file(first, self.staged(b'12345'), 'video')
+        attach_blob(second, blob)
+        second.save()
+
+        self.assertEqual(release_file(first), 0)
+        self.assertEqual(MediaBlob.objects.get(pk=blob.pk).ref_count, 1)
+        self.assertTrue(os.path.exists(blob.file_path))
+
+        self.assertEqual(release_file(second), 5)
+        self.assertFalse(MediaBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(blob.file_path))
+        self.assertEqual(second.file_path, '')
+
+    def test_downloads_without_a_blob_remove_their_file(self):
+        path = write_file(os.path.join(self.media_root, 'downloads', 'old.mp4'), b'abc')
+        video = self.download(file_path=path)
+        self.assertEqual(release_file(video), 3)
+        self.assertFalse(os.path.exists(path))
+
+
+@mock.patch('downloader.utils.schedule_file_cleanup')
+class CarouselStoreTests(ContentStoreTestCase):
+    def finish(self, fallback):
+        video = self.download()
+        downloaded = [
+            (CarouselItem(0, 'image', 'https://cdn.example.com/0.jpg', None), self.staged(b'one', '0.jpg')),
+            (CarouselItem(1, 'video', 'https://cdn.example.com/1.mp4', None), self.staged(b'two', '1.mp4')),
+        ]
+        return video, finish_carousel(video, downloaded, fallback=fallback)
+
+    def test_items_are_stored_under_the_posts_key(self, cleanup):
+        video, assets = self.finish(fallback=False)
+        self.assertEqual([a.blob.media_key for a in assets], [f'{self.key}/0', f'{self.key}/1'])
+        self.assertEqual([a.blob.variant for a in assets], ['image', 'video'])
+        self.assertEqual(video.blob_id, assets[0].blob_id)
+        self.assertEqual(MediaBlob.objects.get(pk=assets[0].blob_id).ref_count, 2)
+
+    def test_fallback_items_get_fallback_variants(self, cleanup):
+        video, assets = self.finish(fallback=True)
+        self.assertEqual([a.blob.variant for a in assets], ['fallback:image', 'fallback:video'])
+        self.assertFalse(reuse_carousel(self.download()))
+
+    def test_items_are_reused_with_a_reference_each(self, cleanup):
+        video, assets = self.finish(fallback=False)
+        other = self.download()
+        self.assertTrue(reuse_carousel(other))
+        self.assertEqual(other.status, 'completed')
+        self.assertEqual(other.assets.count(), 2)
+        self.assertEqual(
+            list(MediaBlob.objects.order_by('media_key').values_list('ref_count', flat=True)), [4, 2],
+        )
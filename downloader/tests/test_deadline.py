@@ -0,0 +1,91 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from downloader import instagram_bypass, utils
+from downloader.deadline import Deadline, DeadlineExceeded
+
+from .helpers import TempMediaMixin, make_download, make_user
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_expiry(self):
+        self.assertFalse(Deadline.after(10).expired)
+        self.assertTrue(Deadline.after(-1).expired)
+        self.assertEqual(Deadline.after(-1).remaining(), 0.0)
+        with self.assertRaisesMessage(DeadlineExceeded, 'Deadline exceeded during download'):
+            Deadline.after(-1).check('download')
+
+    def test_children_never_outlive_their_parent(self):
+        parent = Deadline.after(10)
+        self.assertLessEqual(parent.child(60).expires_at, parent.expires_at)
+        self.assertLess(parent.child(1).expires_at, parent.expires_at)
+
+    def test_timeouts_and_retries_shrink_to_the_time_left(self):
+        deadline = Deadline.after(20)
+        self.assertEqual(deadline.timeout(5), 5)
+        self.assertLessEqual(deadline.timeout(60), 20)
+        self.assertEqual(deadline.retries(8, per_try=5), 2)
+        self.assertEqual(deadline.retries(8, per_try=60), 0)
+
+    @override_settings(DOWNLOAD_JOB_DEADLINE=600)
+    def test_job_deadline_counts_from_acceptance(self):
+        video = mock.Mock(created_at=timezone.now() - timedelta(seconds=599))
+        self.assertLessEqual(Deadline.for_job(video).remaining(), 1)
+        video.created_at = timezone.now() - timedelta(seconds=601)
+        self.assertTrue(Deadline.for_job(video).expired)
+
+
+class ApplyDeadlineTests(SimpleTestCase):
+    def test_ytdlp_options_are_shrunk(self):
+        opts = utils.apply_deadline({'socket_timeout': 90, 'retries': 8, 'progress_hooks': [print]}, Deadline.after(30))
+        self.assertLessEqual(opts['socket_timeout'], 30)
+        self.assertEqual((opts['retries'], opts['fragment_retries']), (0, 0))
+        self.assertEqual(len(opts['progress_hooks']), 2)
+
+    def test_progress_hook_stops_a_slow_transfer(self):
+        deadline = Deadline.after(30)
+        hook = utils.apply_deadline({}, deadline)['progress_hooks'][-1]
+        hook({'status': 'downloading'})
+        deadline.expires_at = 0
+        hook({'status': 'finished'})
+        with self.assertRaises(DeadlineExceeded):
+            hook({'status': 'downloading'})
+
+    def test_no_time_left_raises(self):
+        with self.assertRaises(DeadlineExceeded):
+            utils.apply_deadline({}, Deadline.after(-1))
+
+
+@override_settings(DOWNLOAD_JOB_DEADLINE=600)
+class JobDeadlineTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def test_expired_jobs_fail_with_a_timeout_message(self):
+        video = make_download(self.user, created_at=timezone.now() - timedelta(seconds=700))
+        with mock.patch('downloader.utils._download_media') as download_media:
+            utils.download_video(video)
+        download_media.assert_not_called()
+        video.refresh_from_db()
+        self.assertEqual(video.status, 'failed')
+        self.assertIn('ajratilgan vaqt tugadi', video.error_message)
+
+    def test_running_out_mid_download_fails_the_job(self):
+        video = make_download(self.user)
+        with mock.patch('downloader.utils._download_media', side_effect=DeadlineExceeded('download')):
+            utils.download_video(video)
+        self.assertEqual(video.status, 'failed')
+        self.assertIn('ajratilgan vaqt tugadi', video.error_message)
+
+    def test_direct_media_downloads_pass_the_deadline_on(self):
+        video = make_download(self.user)
+        with mock.patch('downloader.instagram_bypass.segmented.download', side_effect=DeadlineExceeded('download')):
+            with self.assertRaises(DeadlineExceeded):
+                instagram_bypass.download_media_file(video, 'https://cdn.example.com/v.mp4', '/tmp', 'mp4',
+                                                     deadline=Deadline.after(1))
+        with mock.patch('downloader.instagram_bypass.segmented.download', side_effect=OSError('reset')):
+            self.assertFalse(instagram_bypass.download_media_file(video, 'https://cdn.example.com/v.mp4', '/tmp', 'mp4'))
@@ -0,0 +1,88 @@
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from downloader.executor import DownloadExecutor, DownloadQueueFull
+from downloader.models import DownloadedVideo
+
+from .helpers import make_user
+
+
+class DownloadExecutorTests(TestCase):
+    def test_submit_returns_the_result(self):
+        executor = DownloadExecutor(max_workers=2, max_backlog=5)
+        future = executor.submit(lambda a, b: a + b, 2, 3)
+        self.assertEqual(future.result(timeout=5), 5)
+
+    def test_exception_is_set_on_the_future(self):
+        executor = DownloadExecutor(max_workers=1, max_backlog=5)
+
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertLogs('downloader.executor', 'ERROR'):
+            future = executor.submit(fail)
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+
+    def test_full_backlog_rejects_jobs(self):
+        executor = DownloadExecutor(max_workers=1, max_backlog=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        running = executor.submit(block)
+        self.assertTrue(started.wait(5))
+        queued = executor.submit(lambda: 'queued')
+        try:
+            with self.assertRaises(DownloadQueueFull):
+                executor.submit(lambda: 'rejected')
+            self.assertEqual(executor.stats()['active'], 1)
+            self.assertEqual(executor.stats()['queued'], 1)
+        finally:
+            release.set()
+        running.result(timeout=5)
+        self.assertEqual(queued.result(timeout=5), 'queued')
+
+    def test_workers_are_bounded(self):
+        executor = DownloadExecutor(max_workers=2, max_backlog=10)
+        names = set()
+        lock = threading.Lock()
+
+        def record():
+            with lock:
+                names.add(threading.current_thread().name)
+
+        for future in [executor.submit(record) for _ in range(10)]:
+            future.result(timeout=5)
+        self.assertLessEqual(len(names), 2)
+
+
+class HomeSubmitTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.client.force_login(self.user)
+
+    def test_job_is_queued_on_the_executor(self):
+        with mock.patch('downloader.views.submit_download') as submit:
+            response = self.client.post(reverse('home'), {'url': 'https://www.instagram.com/p/ABC123/'})
+        video = DownloadedVideo.objects.get()
+        submit.assert_called_once_with(video)
+        self.assertRedirects(response, reverse('download_status', args=[video.pk]), fetch_redirect_response=False)
+        self.assertEqual(video.status, 'pending')
+
+    def test_full_backlog_fails_the_job(self):
+        with mock.patch('downloader.views.submit_download', side_effect=DownloadQueueFull('full')):
+            self.client.post(reverse('home'), {'url': 'https://www.instagram.com/p/ABC123/'})
+        self.assertEqual(DownloadedVideo.objects.get().status, 'failed')
+
+    @override_settings(DOWNLOAD_QUEUE_OVERFLOW='queue')
+    def test_full_backlog_leaves_the_job_for_workers(self):
+        with mock.patch('downloader.views.submit_download', side_effect=DownloadQueueFull('full')):
+            self.client.post(reverse('home'), {'url': 'https://www.instagram.com/p/ABC123/'})
+        self.assertEqual(DownloadedVideo.objects.get().status, 'pending')
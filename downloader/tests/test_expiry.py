@@ -0,0 +1,91 @@
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from downloader import expiry
+from downloader.content_store import store_file
+from downloader.models import DownloadedVideo
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class ReleaseDueTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.now = timezone.now()
+
+    def stored(self, data, expires_in):
+        video = make_download(self.user, status='completed', expires_at=self.now + timedelta(seconds=expires_in))
+        store_file(video, write_file(os.path.join(self.media_root, 'staging', 'clip.mp4'), data), 'video')
+        video.save()
+        return video
+
+    def test_due_files_are_released(self):
+        due = self.stored(b'12345', -1)
+        later = self.stored(b'other', 60)
+        self.assertEqual(expiry.release_due(self.now), (1, 5))
+        due.refresh_from_db()
+        self.assertEqual((due.file_path, due.expires_at), ('', None))
+        self.assertTrue(os.path.exists(DownloadedVideo.objects.get(pk=later.pk).file_path))
+
+    def test_due_rows_are_released_in_batches(self):
+        for i in range(5):
+            self.stored(f'video {i}'.encode(), -i - 1)
+        self.assertEqual(expiry.release_due(self.now, limit=2)[0], 5)
+        self.assertFalse(DownloadedVideo.objects.filter(expires_at__isnull=False).exists())
+
+    def test_rows_claimed_elsewhere_are_skipped(self):
+        video = self.stored(b'12345', -1)
+        original = DownloadedVideo.objects.filter
+
+        def claimed_meanwhile(*args, **kwargs):
+            # Another process clears expires_at between the select and the claim
+            if 'expires_at' in kwargs and 'pk' in kwargs:
+                original(pk=video.pk).update(expires_at=None)
+            return original(*args, **kwargs)
+
+        with mock.patch.object(DownloadedVideo.objects, 'filter', side_effect=claimed_meanwhile):
+            self.assertEqual(expiry.release_due(self.now), (0, 0))
+        self.assertTrue(os.path.exists(video.file_path))
+
+    def test_schedule_stores_the_deadline_on_the_row(self):
+        video = make_download(self.user)
+        with mock.patch('downloader.expiry.get_expiry_scheduler') as scheduler:
+            expiry.schedule_expiry(video, delay_minutes=10)
+        video.refresh_from_db()
+        self.assertAlmostEqual((video.expires_at - timezone.now()).total_seconds(), 600, delta=5)
+        scheduler.return_value.schedule.assert_called_once_with(video.expires_at)
+
+
+@override_settings(FILE_EXPIRY_POLL_INTERVAL=30)
+class ExpirySchedulerTests(TestCase):
+    def test_due_deadlines_are_popped_together(self):
+        scheduler = expiry.ExpiryScheduler()
+        now = timezone.now()
+        scheduler._heap = [now - timedelta(seconds=2), now - timedelta(seconds=1), now + timedelta(minutes=5)]
+        started = time.monotonic()
+        scheduler._wait_until_due()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(scheduler._heap, [now + timedelta(minutes=5)])
+
+    def test_waits_for_the_earliest_deadline(self):
+        scheduler = expiry.ExpiryScheduler()
+        scheduler._heap = [timezone.now() + timedelta(seconds=0.3)]
+        started = time.monotonic()
+        scheduler._wait_until_due()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(scheduler._heap, [])
+
+    def test_pending_deadlines_are_loaded_from_the_table(self):
+        user = make_user()
+        expires_at = timezone.now() + timedelta(minutes=5)
+        make_download(user, expires_at=expires_at)
+        make_download(user)
+        scheduler = expiry.ExpiryScheduler()
+        scheduler._load_pending()
+        self.assertEqual(scheduler._heap, [expires_at])
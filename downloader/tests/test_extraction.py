@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from downloader import utils
+from downloader.deadline import Deadline
+from downloader.media_cache import LocalMemoryBackend, MediaInfoCache
+
+from .helpers import (
+    ClearCachesMixin, TempMediaMixin, fake_youtube_dl, make_download, make_user, video_format,
+)
+
+
+INFO = {
+    'id': 'ABC123',
+    'title': 'A reel',
+    'formats': [
+        video_format('hd', height=720),
+        video_format('sd', height=480),
+    ],
+}
+
+
+@mock.patch('downloader.utils.schedule_file_cleanup')
+class SingleExtractionTests(ClearCachesMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user())
+        cache = MediaInfoCache(LocalMemoryBackend())
+        patcher = mock.patch('downloader.utils.get_media_info_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_strategy(self, ydl_class):
+        with mock.patch('downloader.utils.yt_dlp.YoutubeDL', ydl_class):
+            return utils._ytdlp_strategy(self.video, Deadline.after(60))
+
+    def test_formats_are_tried_from_one_extraction(self, cleanup):
+        ydl_class = fake_youtube_dl(INFO, failing_formats={'hd'})
+        result = self.run_strategy(ydl_class)
+        self.assertTrue(result.success)
+        self.assertEqual(len(ydl_class.extractions), 1)
+        self.assertEqual(ydl_class.downloads, ['sd'])
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'completed')
+        self.assertEqual(self.video.title, 'A reel')
+
+    def test_the_best_format_is_tried_first(self, cleanup):
+        ydl_class = fake_youtube_dl(INFO)
+        self.assertTrue(self.run_strategy(ydl_class).success)
+        self.assertEqual(ydl_class.downloads, ['hd'])
+
+    def test_extracted_info_is_cached_per_media(self, cleanup):
+        ydl_class = fake_youtube_dl(INFO)
+        self.run_strategy(ydl_class)
+        other = make_download(make_user('bob'), url='https://instagram.com/reel/ABC123/?igsh=x')
+        with mock.patch('downloader.utils.yt_dlp.YoutubeDL', ydl_class):
+            self.assertTrue(utils._ytdlp_strategy(other, Deadline.after(60)).success)
+        self.assertEqual(len(ydl_class.extractions), 1)
+
+    def test_all_formats_failing_reports_the_last_error(self, cleanup):
+        ydl_class = fake_youtube_dl(INFO, failing_formats={'hd', 'sd'})
+        result = self.run_strategy(ydl_class)
+        self.assertFalse(result.success)
+        self.assertIn('format sd', result.error)
+        self.assertEqual(len(ydl_class.extractions), 1)
@@ -0,0 +1,53 @@
+from django.test import SimpleTestCase
+
+from downloader.formats import format_id_selector, get_format_policy, plan_formats
+
+from .helpers import video_format
+
+
+def ids(formats):
+    return [f['format_id'] for f in formats]
+
+
+class PlanFormatsTests(SimpleTestCase):
+    def test_highest_resolution_inside_the_limit_wins(self):
+        formats = [video_format('480', 480), video_format('1080', 1080), video_format('720', 720)]
+        self.assertEqual(ids(plan_formats(formats, 'facebook')), ['720', '480', '1080'])
+
+    def test_limits_are_per_platform(self):
+        formats = [video_format('720', 720), video_format('1080', 1080)]
+        self.assertEqual(ids(plan_formats(formats, 'instagram')), ['1080', '720'])
+        self.assertEqual(get_format_policy('other')['max_height'], 720)
+
+    def test_formats_over_the_limit_go_last_smallest_first(self):
+        formats = [video_format('2160', 2160), video_format('1440', 1440), video_format('480', 480)]
+        self.assertEqual(ids(plan_formats(formats, 'facebook')), ['480', '1440', '2160'])
+
+    def test_oversized_files_go_last(self):
+        formats = [video_format('big', 720, filesize=600 * 1024 * 1024), video_format('small', 480)]
+        self.assertEqual(ids(plan_formats(formats, 'facebook')), ['small', 'big'])
+
+    def test_direct_files_beat_streams(self):
+        formats = [video_format('hls', 720), video_format('mp4', 720, protocol='https')]
+        self.assertEqual(ids(plan_formats(formats, 'facebook')), ['mp4', 'hls'])
+
+    def test_video_only_formats_go_last(self):
+        formats = [video_format('silent', 720, acodec='none'), video_format('muxed', 360)]
+        self.assertEqual(ids(plan_formats(formats, 'facebook')), ['muxed', 'silent'])
+
+    def test_non_video_formats_are_dropped(self):
+        formats = [
+            video_format('audio', vcodec='none'),
+            video_format('storyboard', protocol='mhtml'),
+            video_format('nourl', url=None),
+            video_format('video'),
+        ]
+        self.assertEqual(ids(plan_formats(formats, 'tiktok')), ['video'])
+        self.assertEqual(plan_formats(None, 'tiktok'), [])
+
+
+class FormatSelectorTests(SimpleTestCase):
+    def test_selects_exactly_one_format(self):
+        formats = [video_format('a'), video_format('b')]
+        self.assertEqual(ids(format_id_selector('b')({'formats': formats})), ['b'])
+        self.assertEqual(ids(format_id_selector('c')({'formats': formats})), [])
@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from downloader.http_client import HttpClient
+
+from .helpers import ClearCachesMixin, LocalHttpServer
+
+
+class HttpClientTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = HttpClient(host_pools={
+            'cdninstagram.com': {'pool_maxsize': 3, 'timeout': (1, 5)},
+        })
+        self.addCleanup(self.client.session.close)
+
+    def test_connections_are_reused(self):
+        with LocalHttpServer({'/a': b'abc'}) as server:
+            for _ in range(3):
+                response = self.client.get(server.url('/a'))
+                self.assertEqual(response.content, b'abc')
+        stats = self.client.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+        host = stats['hosts'][f'http://127.0.0.1:{server.httpd.server_port}']
+        self.assertEqual((host['group'], host['requests']), ('default', 3))
+
+    def test_cdn_subdomains_use_their_groups_pool(self):
+        adapter = self.client.session.get_adapter('https://scontent-ams2-1.cdninstagram.com/v/x.mp4')
+        self.assertIs(adapter, self.client.adapters['cdninstagram.com'])
+        self.assertEqual(adapter._pool_maxsize, 3)
+        self.assertIs(self.client.session.get_adapter('https://example.com/'), self.client.default_adapter)
+
+    def test_timeouts_are_per_host_group(self):
+        self.assertEqual(self.client.get_timeout('https://scontent.cdninstagram.com/x'), (1, 5))
+        self.assertEqual(self.client.get_timeout('https://example.com/x'), (10, 30))
+
+    def test_requests_go_through_the_rate_limiter(self):
+        with LocalHttpServer({'/a': b'abc'}) as server, \
+                mock.patch('downloader.rate_limiter.acquire') as acquire, \
+                mock.patch('downloader.rate_limiter.observe_response') as observe_response:
+            response = self.client.get(server.url('/a'), timeout=3)
+        acquire.assert_called_once_with(server.url('/a'))
+        observe_response.assert_called_once_with(server.url('/a'), response)
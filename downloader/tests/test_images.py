@@ -0,0 +1,72 @@
+import io
+import os
+from unittest import mock
+
+from django.test import TestCase
+from PIL import Image
+
+from downloader import utils
+from downloader.deadline import Deadline, DeadlineExceeded
+
+from .helpers import TempMediaMixin, make_download, make_user
+
+
+def image_bytes(fmt='PNG', size=(40, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def streamed(data, chunk_size=16, **fields):
+    """Response mock that streams data in small chunks"""
+    response = mock.Mock(headers=fields.pop('headers', {}), **fields)
+    response.iter_content.side_effect = lambda **kwargs: (
+        data[i:i + chunk_size] for i in range(0, len(data), chunk_size)
+    )
+    return response
+
+
+class StreamImageTests(TempMediaMixin, TestCase):
+    def test_type_and_size_are_sniffed_while_writing(self):
+        data = image_bytes('PNG')
+        path, image_format, size = utils._stream_image_to_temp(streamed(data), self.media_root)
+        self.assertEqual((image_format, size), ('PNG', (40, 30)))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_non_images_are_written_unsniffed(self):
+        path, image_format, size = utils._stream_image_to_temp(streamed(b'<html>' * 100), self.media_root)
+        self.assertEqual((image_format, size), (None, None))
+        self.assertEqual(os.path.getsize(path), 600)
+
+    def test_deadline_removes_the_partial_file(self):
+        with self.assertRaises(DeadlineExceeded):
+            utils._stream_image_to_temp(streamed(image_bytes()), self.media_root, deadline=Deadline.after(-1))
+        self.assertEqual(os.listdir(self.media_root), [])
+
+
+@mock.patch('downloader.utils.schedule_file_cleanup')
+class DownloadImageTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user(), url='https://www.pinterest.com/pin/123456789012/', platform='pinterest')
+
+    def test_image_is_stored_with_the_sniffed_extension(self, cleanup):
+        response = streamed(image_bytes('JPEG'), headers={'content-type': 'image/png'})
+        with mock.patch('downloader.utils.http_client.get', return_value=response) as get:
+            self.assertTrue(utils.download_image_from_url(self.video, 'https://i.pinimg.com/x.png', 'A pin'))
+        self.assertTrue(get.call_args.kwargs['stream'])
+        response.close.assert_called_once()
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.status, self.video.media_type, self.video.title), ('completed', 'image', 'A pin'))
+        self.assertTrue(self.video.file_path.endswith('.jpg'))
+        self.assertTrue(os.path.exists(self.video.file_path))
+
+    def test_http_errors_fail_the_download(self, cleanup):
+        response = streamed(b'')
+        response.raise_for_status.side_effect = Exception('404 Not Found')
+        with mock.patch('downloader.utils.http_client.get', return_value=response):
+            self.assertFalse(utils.download_image_from_url(self.video, 'https://i.pinimg.com/x.png'))
+        response.close.assert_called_once()
+        self.assertEqual(self.video.status, 'failed')
+        self.assertIn('404', self.video.error_message)
@@ -0,0 +1,51 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from downloader.models import DownloadedVideo
+
+
+class QueryPlanTests(TestCase):
+    def run_benchmark(self, *args):
+        out = io.StringIO()
+        call_command('benchmark_queries', '--rows=500', '--users=5', '--repeat=1', *args, stdout=out)
+        return out.getvalue()
+
+    def plans(self, output):
+        """EXPLAIN lines per query label"""
+        plans, label = {}, None
+        for line in output.splitlines():
+            if line.startswith('      '):
+                plans[label] += line
+            elif line.startswith('  '):
+                # '  label: 0.12 ms median, 0.20 ms max'
+                label = line.strip().rsplit(': ', 1)[0]
+                plans[label] = ''
+        return plans
+
+    def test_hot_queries_use_their_indexes(self):
+        plans = self.plans(self.run_benchmark())
+        expected = {
+            'home: recent downloads': 'download_user_created_idx',
+            'download_list: first page': 'download_user_created_idx',
+            'download_list: last page': 'download_user_created_idx',
+            'cleanup: expired chunk': 'download_status_completed_idx',
+            'dedup: same media key': 'download_media_key_idx',
+        }
+        for label, index in expected.items():
+            with self.subTest(label=label):
+                self.assertIn(index, plans[label])
+
+    def test_synthetic_rows_are_rolled_back(self):
+        output = self.run_benchmark('--no-explain')
+        self.assertIn('Synthetic rows rolled back', output)
+        self.assertFalse(DownloadedVideo.objects.exists())
+
+    def test_compare_reports_both_plans(self):
+        output = self.run_benchmark('--compare', '--no-explain')
+        if connection.features.can_rollback_ddl:
+            self.assertIn('Without indexes', output)
+        else:
+            self.assertIn("--compare is ignored", output)
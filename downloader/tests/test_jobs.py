@@ -0,0 +1,143 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from downloader import jobs
+from downloader.models import DownloadedVideo
+
+from .helpers import make_download, make_user
+
+
+@override_settings(DOWNLOAD_LEASE_SECONDS=60, DOWNLOAD_MAX_ATTEMPTS=3)
+class ClaimTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_claim_takes_a_lease(self):
+        video = make_download(self.user)
+        claimed = jobs.claim_job(video.pk, 'worker-a')
+        self.assertEqual(claimed.status, 'downloading')
+        self.assertEqual(claimed.lease_owner, 'worker-a')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertGreater(claimed.lease_expires_at, timezone.now())
+
+    def test_a_leased_job_cant_be_claimed_again(self):
+        video = make_download(self.user)
+        jobs.claim_job(video.pk, 'worker-a')
+        self.assertIsNone(jobs.claim_job(video.pk, 'worker-b'))
+
+    def test_an_expired_lease_can_be_claimed(self):
+        video = make_download(self.user, status='downloading', lease_owner='dead',
+                              lease_expires_at=timezone.now() - timedelta(seconds=1), attempts=1)
+        claimed = jobs.claim_job(video.pk, 'worker-b')
+        self.assertEqual((claimed.lease_owner, claimed.attempts), ('worker-b', 2))
+
+    def test_jobs_out_of_attempts_arent_claimed(self):
+        video = make_download(self.user, attempts=3)
+        self.assertIsNone(jobs.claim_job(video.pk, 'worker-a'))
+
+    def test_claim_next_takes_the_oldest_job(self):
+        now = timezone.now()
+        newer = make_download(self.user, created_at=now)
+        older = make_download(self.user, created_at=now - timedelta(minutes=1))
+        self.assertEqual(jobs.claim_next_job('worker-a').pk, older.pk)
+        self.assertEqual(jobs.claim_next_job('worker-a').pk, newer.pk)
+        self.assertIsNone(jobs.claim_next_job('worker-a'))
+
+    def test_release_drops_only_the_owners_lease(self):
+        video = jobs.claim_job(make_download(self.user).pk, 'worker-a')
+        jobs.release_job(video, 'worker-b')
+        self.assertEqual(DownloadedVideo.objects.get(pk=video.pk).lease_owner, 'worker-a')
+        jobs.release_job(video, 'worker-a')
+        self.assertEqual(DownloadedVideo.objects.get(pk=video.pk).lease_owner, '')
+
+
+@override_settings(DOWNLOAD_LEASE_SECONDS=60, DOWNLOAD_MAX_ATTEMPTS=3)
+class ReclaimTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.expired = timezone.now() - timedelta(seconds=1)
+
+    def test_expired_leases_are_requeued(self):
+        video = make_download(self.user, status='downloading', lease_owner='dead',
+                              lease_expires_at=self.expired, attempts=1)
+        self.assertEqual(jobs.reclaim_expired_leases(), (1, 0))
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.lease_owner), ('pending', ''))
+
+    def test_jobs_out_of_attempts_fail(self):
+        video = make_download(self.user, status='downloading', lease_owner='dead',
+                              lease_expires_at=self.expired, attempts=3)
+        self.assertEqual(jobs.reclaim_expired_leases(), (0, 1))
+        video.refresh_from_db()
+        self.assertEqual(video.status, 'failed')
+        self.assertTrue(video.error_message)
+
+    def test_live_leases_are_left_alone(self):
+        video = make_download(self.user, status='downloading', lease_owner='alive',
+                              lease_expires_at=timezone.now() + timedelta(seconds=30), attempts=1)
+        self.assertEqual(jobs.reclaim_expired_leases(), (0, 0))
+        video.refresh_from_db()
+        self.assertEqual(video.status, 'downloading')
+
+    def test_heartbeat_extends_the_lease(self):
+        video = jobs.claim_job(make_download(self.user).pk, 'worker-a')
+        DownloadedVideo.objects.filter(pk=video.pk).update(lease_expires_at=timezone.now() + timedelta(seconds=1))
+        heartbeat = jobs.JobHeartbeat('worker-a')
+        heartbeat._jobs[video.pk] = video
+        heartbeat.beat()
+        video.refresh_from_db()
+        self.assertGreater(video.lease_expires_at, timezone.now() + timedelta(seconds=30))
+
+
+@override_settings(DOWNLOAD_LEASE_SECONDS=60, DOWNLOAD_MAX_ATTEMPTS=3)
+class RunJobTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_run_job_claims_runs_and_releases(self):
+        video = make_download(self.user)
+
+        def finish(video_obj, deadline):
+            video_obj.status = 'completed'
+            video_obj.save()
+            return video_obj
+
+        with mock.patch('downloader.utils.download_video', side_effect=finish) as download:
+            result = jobs.run_job(video.pk)
+        download.assert_called_once()
+        self.assertEqual(result.status, 'completed')
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.lease_owner, video.attempts), ('completed', '', 1))
+
+    def test_run_job_skips_jobs_owned_by_another_worker(self):
+        video = make_download(self.user)
+        jobs.claim_job(video.pk, 'someone-else')
+        with mock.patch('downloader.utils.download_video') as download:
+            result = jobs.run_job(video.pk)
+        download.assert_not_called()
+        self.assertEqual(result.lease_owner, 'someone-else')
+
+
+class QueueMaintenanceTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_only_requeued_jobs_are_resubmitted_once(self):
+        requeued = make_download(self.user, attempts=1)
+        make_download(self.user, attempts=0)
+        make_download(self.user, attempts=1, waiting_for='instagram:OTHER')
+        maintenance = jobs.QueueMaintenance()
+        with mock.patch('downloader.executor.DownloadExecutor.submit') as submit:
+            maintenance.resubmit()
+            maintenance.resubmit()
+        submit.assert_called_once_with(jobs.run_job, requeued.pk)
+
+    @override_settings(DOWNLOAD_QUEUE_OVERFLOW='queue')
+    def test_worker_processes_drain_the_queue_in_queue_mode(self):
+        make_download(self.user, attempts=1)
+        with mock.patch('downloader.executor.DownloadExecutor.submit') as submit:
+            jobs.QueueMaintenance().resubmit()
+        submit.assert_not_called()
@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from downloader.media_cache import DjangoCacheBackend, LocalMemoryBackend, MediaInfoCache
+
+from .helpers import ClearCachesMixin
+
+
+class LocalMemoryBackendTests(SimpleTestCase):
+    def test_entries_expire(self):
+        backend = LocalMemoryBackend()
+        with mock.patch('downloader.media_cache.time.monotonic', return_value=100):
+            backend.set('k', {'id': 1}, ttl=10)
+        with mock.patch('downloader.media_cache.time.monotonic', return_value=105):
+            self.assertEqual(backend.get('k'), {'id': 1})
+        with mock.patch('downloader.media_cache.time.monotonic', return_value=111):
+            self.assertIsNone(backend.get('k'))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        backend = LocalMemoryBackend(max_entries=2)
+        backend.set('a', 1, ttl=60)
+        backend.set('b', 2, ttl=60)
+        backend.get('a')
+        backend.set('c', 3, ttl=60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual((backend.get('a'), backend.get('c')), (1, 3))
+
+    def test_callers_get_a_copy(self):
+        backend = LocalMemoryBackend()
+        backend.set('k', {'formats': []}, ttl=60)
+        backend.get('k')['formats'].append('changed')
+        self.assertEqual(backend.get('k'), {'formats': []})
+
+
+class MediaInfoCacheTests(ClearCachesMixin, TestCase):
+    def test_hits_and_misses_are_counted(self):
+        cache = MediaInfoCache(LocalMemoryBackend())
+        self.assertIsNone(cache.get('instagram:ABC'))
+        cache.set('instagram:ABC', {'id': 'ABC'})
+        self.assertEqual(cache.get('instagram:ABC'), {'id': 'ABC'})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_unkeyed_media_isnt_cached(self):
+        cache = MediaInfoCache(LocalMemoryBackend())
+        cache.set(None, {'id': 'ABC'})
+        self.assertIsNone(cache.get(None))
+        self.assertEqual(cache.stats()['misses'], 0)
+
+    def test_backend_errors_count_as_misses(self):
+        backend = mock.Mock(**{'get.side_effect': ConnectionError, 'set.side_effect': ConnectionError})
+        cache = MediaInfoCache(backend)
+        cache.set('instagram:ABC', {'id': 'ABC'})
+        self.assertIsNone(cache.get('instagram:ABC'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_django_backend_round_trip(self):
+        cache = MediaInfoCache(DjangoCacheBackend('shared'))
+        cache.set('tiktok:123', {'id': '123'})
+        self.assertEqual(cache.get('tiktok:123'), {'id': '123'})
+        cache.delete('tiktok:123')
+        self.assertIsNone(cache.get('tiktok:123'))
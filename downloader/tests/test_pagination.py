@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from downloader.models import DownloadedVideo
+from downloader.pagination import decode_cursor, download_stats, downloads_page, encode_cursor
+
+from .helpers import ClearCachesMixin, make_download, make_user
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        video = make_download(make_user())
+        self.assertEqual(decode_cursor(encode_cursor(video)), (video.created_at, video.pk))
+
+    def test_malformed_cursors_raise_value_error(self):
+        for cursor in ('', 'not base64!', 'bm8gc2VwYXJhdG9y', encode_cursor(make_download(make_user()))[:-4]):
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class DownloadsPageTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        now = timezone.now()
+        # Two rows share a timestamp, the id breaks the tie
+        self.videos = [make_download(self.user, created_at=now - timedelta(minutes=i // 2)) for i in range(7)]
+        self.newest_first = sorted(self.videos, key=lambda v: (v.created_at, v.pk), reverse=True)
+        make_download(make_user('bob'))
+
+    def walk(self, page_size):
+        pages, cursor = [], None
+        while True:
+            downloads, cursor = downloads_page(DownloadedVideo.objects.filter(user=self.user), cursor, page_size)
+            pages.append([v.pk for v in downloads])
+            if cursor is None:
+                return pages
+
+    def test_pages_cover_the_history_once_newest_first(self):
+        pages = self.walk(page_size=3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), [v.pk for v in self.newest_first])
+
+    def test_exact_multiple_of_the_page_size_has_no_empty_page(self):
+        DownloadedVideo.objects.filter(pk=self.newest_first[-1].pk).delete()
+        self.assertEqual([len(page) for page in self.walk(page_size=3)], [3, 3])
+
+    def test_single_page(self):
+        self.assertEqual(self.walk(page_size=10), [[v.pk for v in self.newest_first]])
+
+    def test_pages_only_load_the_list_columns(self):
+        downloads, _ = downloads_page(DownloadedVideo.objects.filter(user=self.user), page_size=1)
+        self.assertIn('error_message', downloads[0].get_deferred_fields())
+        self.assertEqual(downloads[0].error_summary, '')
+
+
+@override_settings(DOWNLOAD_LIST_PAGE_SIZE=2, DOWNLOAD_STATS_CACHE='shared', DOWNLOAD_STATS_TTL=30)
+class DownloadListViewTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        for status in ('completed', 'completed', 'failed', 'pending', 'downloading'):
+            make_download(self.user, status=status)
+        self.client.force_login(self.user)
+
+    def test_stats_are_shown_on_the_first_page_only(self):
+        first = self.client.get(reverse('download_list'))
+        self.assertEqual(first.context['stats'],
+                         {'total': 5, 'completed': 2, 'in_progress': 2, 'failed': 1})
+        self.assertEqual(len(first.context['downloads']), 2)
+
+        second = self.client.get(reverse('download_list'), {'cursor': first.context['next_cursor']})
+        self.assertIsNone(second.context['stats'])
+        self.assertEqual(len(second.context['downloads']), 2)
+
+    def test_stats_are_cached(self):
+        download_stats(self.user)
+        make_download(self.user, status='failed')
+        self.assertEqual(download_stats(self.user)['total'], 5)
+
+    def test_api_pages_follow_the_cursor(self):
+        seen, cursor = [], None
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            data = self.client.get(reverse('download_list_api'), params).json()
+            seen += [d['id'] for d in data['downloads']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(DownloadedVideo.objects.values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 5)
+
+    def test_invalid_cursors_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('download_list'), {'cursor': 'garbage'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('download_list_api'), {'cursor': 'garbage'}).status_code, 400)
@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from downloader import rate_limiter
+
+from .helpers import ClearCachesMixin
+
+URL = 'https://media.example.com/v/1.mp4'
+
+
+@override_settings(RATE_LIMITS={'example.com': {'rate': 5, 'burst': 2}}, RATE_LIMIT_MAX_WAIT=5)
+class RateLimiterTests(ClearCachesMixin, TestCase):
+    def test_burst_passes_without_waiting(self):
+        self.assertLess(rate_limiter.acquire(URL), 0.05)
+        self.assertLess(rate_limiter.acquire(URL), 0.05)
+        self.assertLess(rate_limiter.get_state(URL)['tokens'], 1)
+
+    def test_empty_bucket_waits_for_a_token(self):
+        rate_limiter.acquire(URL)
+        rate_limiter.acquire(URL)
+        self.assertGreater(rate_limiter.acquire(URL), 0.1)
+
+    def test_hosts_outside_the_groups_arent_limited(self):
+        self.assertEqual(rate_limiter.acquire('https://other.org/x'), 0.0)
+        self.assertIsNone(rate_limiter.get_state('https://other.org/x'))
+        self.assertEqual(rate_limiter.match_host_group('https://example.com.evil.org/', ['example.com']), None)
+
+    def test_waits_longer_than_max_wait_raise(self):
+        rate_limiter.report(URL, True, retry_after=30)
+        with self.assertRaises(rate_limiter.RateLimited):
+            rate_limiter.acquire(URL, max_wait=1)
+
+    def test_throttling_halves_the_rate_and_success_restores_it(self):
+        rate_limiter.report(URL, True, retry_after=0)
+        self.assertEqual(rate_limiter.get_state(URL)['rate'], 2.5)
+        rate_limiter.report(URL, False)
+        self.assertEqual(rate_limiter.get_state(URL)['rate'], 2.75)
+
+    def test_throttling_responses_and_errors_are_detected(self):
+        rate_limiter.observe_response(URL, mock.Mock(status_code=429, url=URL, headers={'Retry-After': '0'}))
+        rate_limiter.observe_error(URL, Exception('HTTP Error 404: Not Found'))
+        self.assertEqual(rate_limiter.get_state(URL)['rate'], 2.5)
+        rate_limiter.observe_response(URL, mock.Mock(status_code=200, url='https://example.com/accounts/login/', headers={}))
+        self.assertEqual(rate_limiter.get_state(URL)['rate'], 1.25)
+        rate_limiter.observe_error(URL, Exception('Please wait a few minutes before you try again'))
+        self.assertEqual(rate_limiter.get_state(URL)['rate'], 0.625)
+
+    def test_cache_errors_fail_open(self):
+        broken = mock.Mock(**{'add.side_effect': ConnectionError('redis down')})
+        with mock.patch('downloader.rate_limiter._cache', return_value=broken), \
+                self.assertLogs('downloader.rate_limiter', 'WARNING'):
+            self.assertEqual(rate_limiter.acquire(URL), 0.0)
+            rate_limiter.report(URL, True)
@@ -0,0 +1,152 @@
+import json
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from downloader import segmented, utils
+from downloader.deadline import Deadline, DeadlineExceeded
+
+from .helpers import ClearCachesMixin, LocalHttpServer, TempMediaMixin, make_download, make_user, video_format
+
+DATA = bytes(range(256)) * 64  # 16KB
+SEGMENTS = {'SEGMENTS': 4, 'MIN_SEGMENT_SIZE': 1024, 'BUFFER_SIZE': 512}
+
+
+def ranged_gets(server):
+    """Range headers of the GETs after the size probe"""
+    return [r for method, _, r in server.requests if method == 'GET' and r != 'bytes=0-0']
+
+
+def range_size(header):
+    start, end = header.split('=')[1].split('-')
+    return int(end) - int(start) + 1
+
+
+class SplitRangesTests(SimpleTestCase):
+    def test_ranges_cover_the_file(self):
+        self.assertEqual(segmented.split_ranges(10, 3, 1), [[0, 3], [4, 7], [8, 9]])
+        self.assertEqual(segmented.split_ranges(100, 4, 40), [[0, 49], [50, 99]])
+        self.assertEqual(segmented.split_ranges(10, 4, 100), [[0, 9]])
+
+
+@override_settings(SEGMENTED_DOWNLOAD=SEGMENTS)
+class SegmentedDownloadTests(ClearCachesMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(self.media_root, 'video.mp4')
+        self.part_path = self.file_path + segmented.PART_SUFFIX
+        self.state_path = self.file_path + segmented.STATE_SUFFIX
+
+    def read(self):
+        with open(self.file_path, 'rb') as f:
+            return f.read()
+
+    def test_file_is_fetched_in_parallel_ranges(self):
+        with LocalHttpServer({'/v.mp4': DATA}) as server:
+            self.assertEqual(segmented.download(server.url('/v.mp4'), self.file_path), len(DATA))
+        self.assertEqual(self.read(), DATA)
+        self.assertEqual(sorted(ranged_gets(server)), [
+            'bytes=0-4095', 'bytes=12288-16383', 'bytes=4096-8191', 'bytes=8192-12287',
+        ])
+        self.assertFalse(os.path.exists(self.part_path) or os.path.exists(self.state_path))
+
+    def test_truncated_part_file_is_resumed(self):
+        # An earlier attempt got 1000 bytes of every segment before it died
+        done = 1000
+        ranges = segmented.split_ranges(len(DATA), 4, 1024)
+        part = bytearray(len(DATA))
+        for start, _ in ranges:
+            part[start:start + done] = DATA[start:start + done]
+        with open(self.part_path, 'wb') as f:
+            f.write(part)
+        with open(self.state_path, 'w') as f:
+            json.dump({'total': len(DATA), 'validator': None,
+                       'segments': [[start, end, done] for start, end in ranges]}, f)
+
+        with LocalHttpServer({'/v.mp4': DATA}) as server:
+            segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertEqual(self.read(), DATA)
+        self.assertEqual(sorted(ranged_gets(server)), [
+            'bytes=1000-4095', 'bytes=13288-16383', 'bytes=5096-8191', 'bytes=9192-12287',
+        ])
+
+    def test_part_file_of_other_content_is_restarted(self):
+        with open(self.part_path, 'wb') as f:
+            f.write(b'x' * 100)
+        with open(self.state_path, 'w') as f:
+            json.dump({'total': len(DATA), 'validator': None, 'segments': [[0, len(DATA) - 1, 100]]}, f)
+
+        with LocalHttpServer({'/v.mp4': DATA}) as server:
+            segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertEqual(self.read(), DATA)
+        self.assertIn('bytes=0-4095', ranged_gets(server))
+
+    def test_interrupted_download_keeps_its_progress(self):
+        deadline = Deadline.after(60)
+        checks = iter(range(100))
+
+        def check(stage=None):
+            # Run out of time after the first few chunks
+            if next(checks) >= 4:
+                raise DeadlineExceeded(stage)
+
+        with LocalHttpServer({'/v.mp4': DATA}) as server:
+            with mock.patch.object(deadline, 'check', side_effect=check):
+                with self.assertRaises(DeadlineExceeded):
+                    segmented.download(server.url('/v.mp4'), self.file_path, deadline=deadline)
+            self.assertFalse(os.path.exists(self.file_path))
+            with open(self.state_path) as f:
+                saved = sum(done for _, _, done in json.load(f)['segments'])
+            self.assertEqual(saved, 4 * 512)
+
+            del server.requests[:]
+            segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertEqual(self.read(), DATA)
+        self.assertEqual(sum(range_size(r) for r in ranged_gets(server)), len(DATA) - saved)
+
+    def test_servers_without_ranges_get_one_stream(self):
+        with LocalHttpServer({'/v.mp4': DATA}, ranges=False) as server:
+            segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertEqual(self.read(), DATA)
+        self.assertEqual(ranged_gets(server), [None])
+
+    def test_small_files_get_one_stream(self):
+        with LocalHttpServer({'/v.mp4': DATA[:1000]}) as server:
+            segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertEqual(self.read(), DATA[:1000])
+        self.assertEqual(ranged_gets(server), [None])
+
+    def test_missing_files_raise(self):
+        with LocalHttpServer({}) as server:
+            with self.assertRaises(Exception):
+                segmented.download(server.url('/v.mp4'), self.file_path)
+        self.assertFalse(os.path.exists(self.file_path))
+
+
+@override_settings(SEGMENTED_DOWNLOAD=SEGMENTS)
+class ProgressiveFormatTests(ClearCachesMixin, TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user(), url='https://www.tiktok.com/@a/video/1', platform='tiktok')
+        self.ydl = mock.Mock(**{'cookiejar.get_cookie_header.return_value': 'sid=1'})
+
+    def test_progressive_formats_are_fetched_in_ranges(self):
+        with LocalHttpServer({'/v.mp4': DATA}) as server:
+            fmt = video_format('h264_540p', protocol='https', url=server.url('/v.mp4'),
+                               http_headers={'User-Agent': 'test'})
+            path = utils._download_progressive(self.video, self.ydl, {'id': '1'}, fmt, Deadline.after(60))
+        self.assertEqual(os.path.basename(path), '1.h264_540p.mp4')
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(len(ranged_gets(server)), 4)
+
+    def test_other_formats_are_left_to_ytdlp(self):
+        for fmt in (video_format('hls'), video_format('silent', protocol='https', acodec='none')):
+            with self.subTest(fmt=fmt['format_id']):
+                self.assertIsNone(utils._download_progressive(self.video, self.ydl, {'id': '1'}, fmt, Deadline.after(60)))
+
+    def test_failed_fetches_are_left_to_ytdlp(self):
+        with LocalHttpServer({}) as server:
+            fmt = video_format('h264_540p', protocol='https', url=server.url('/v.mp4'))
+            self.assertIsNone(utils._download_progressive(self.video, self.ydl, {'id': '1'}, fmt, Deadline.after(60)))
@@ -0,0 +1,77 @@
+import os
+import shutil
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from downloader.sendfile import serve_file
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class ServeFileTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = write_file(os.path.join(self.media_root, 'downloads', 'ab', 'cd', 'abcd.mp4'), b'video')
+
+    @override_settings(SENDFILE_BACKEND='nginx', SENDFILE_URL='/protected/')
+    def test_nginx_gets_an_internal_redirect(self):
+        response = serve_file(self.path, 'My reel.mp4')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/downloads/ab/cd/abcd.mp4')
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="My reel.mp4"')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(SENDFILE_BACKEND='nginx')
+    def test_files_outside_media_root_are_served_from_python(self):
+        outside = write_file(os.path.join(self.media_root + '-other', 'x.mp4'), b'video')
+        self.addCleanup(shutil.rmtree, os.path.dirname(outside))
+        with self.assertLogs('downloader.sendfile', 'WARNING'):
+            response = serve_file(outside, 'x.mp4')
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), b'video')
+        response.close()
+
+    @override_settings(SENDFILE_BACKEND='xsendfile')
+    def test_xsendfile_gets_the_real_path(self):
+        response = serve_file(self.path, 'My reel.mp4')
+        self.assertEqual(response['X-Sendfile'], os.path.realpath(self.path))
+
+    @override_settings(SENDFILE_BACKEND='python')
+    def test_python_streams_the_file(self):
+        response = serve_file(self.path, 'My reel.mp4')
+        self.assertEqual(b''.join(response.streaming_content), b'video')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="My reel.mp4"')
+        response.close()
+
+    @override_settings(SENDFILE_BACKEND='bogus')
+    def test_unknown_backends_fall_back_to_python(self):
+        with self.assertLogs('downloader.sendfile', 'WARNING'):
+            response = serve_file(self.path, 'My reel.mp4')
+        self.assertEqual(b''.join(response.streaming_content), b'video')
+        response.close()
+
+
+@override_settings(SENDFILE_BACKEND='nginx')
+class DownloadViewTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        path = write_file(os.path.join(self.media_root, 'downloads', 'ab', 'cd', 'abcd.mp4'), b'video')
+        self.video = make_download(self.user, status='completed', file_path=path, filename='A reel.mp4')
+
+    def test_owner_gets_the_offloaded_file(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_file', args=[self.video.pk]))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/downloads/ab/cd/abcd.mp4')
+
+    def test_other_users_get_a_404(self):
+        self.client.force_login(make_user('bob'))
+        response = self.client.get(reverse('download_file', args=[self.video.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_missing_files_get_a_404(self):
+        os.remove(self.video.file_path)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('download_file', args=[self.video.pk])).status_code, 404)
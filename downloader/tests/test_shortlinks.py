@@ -0,0 +1,79 @@
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.test import TestCase, override_settings
+
+from downloader import shortlinks
+from downloader.models import ShortLink
+from downloader.rate_limiter import RateLimited
+
+SHORT = 'https://vm.tiktok.com/ZMabc123/'
+CANONICAL = 'https://www.tiktok.com/@someone/video/7234567890123456789'
+
+
+def response(url, status_code=200):
+    return mock.Mock(url=url, status_code=status_code)
+
+
+@override_settings(SHORT_LINK_TTL=3600, SHORT_LINK_NEGATIVE_TTL=60)
+class ResolveShortLinkTests(TestCase):
+    def setUp(self):
+        shortlinks._memory_cache.clear()
+        self.addCleanup(shortlinks._memory_cache.clear)
+        patcher = mock.patch('downloader.shortlinks.http_client')
+        self.http = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_short_links_expand_once(self):
+        self.http.head.return_value = response(CANONICAL)
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), CANONICAL)
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), CANONICAL)
+        self.assertEqual(self.http.head.call_count, 1)
+
+        link = ShortLink.objects.get(short_url=SHORT)
+        self.assertEqual(link.canonical_url, CANONICAL)
+        self.assertAlmostEqual((link.expires_at - link.resolved_at).total_seconds(), 3600)
+
+    def test_stored_links_are_used_by_other_processes(self):
+        self.http.head.return_value = response(CANONICAL)
+        shortlinks.resolve_short_link(SHORT)
+        shortlinks._memory_cache.clear()
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), CANONICAL)
+        self.assertEqual(self.http.head.call_count, 1)
+
+    def test_expired_links_are_resolved_again(self):
+        self.http.head.return_value = response(CANONICAL)
+        shortlinks.resolve_short_link(SHORT)
+        shortlinks._memory_cache.clear()
+        ShortLink.objects.update(expires_at=ShortLink.objects.get().resolved_at - timedelta(seconds=1))
+        shortlinks.resolve_short_link(SHORT)
+        self.assertEqual(self.http.head.call_count, 2)
+
+    def test_other_urls_are_left_alone(self):
+        self.assertEqual(shortlinks.resolve_short_link(CANONICAL), CANONICAL)
+        self.http.head.assert_not_called()
+
+    def test_hosts_rejecting_head_get_a_get(self):
+        self.http.head.return_value = response(SHORT, status_code=405)
+        self.http.get.return_value = response(CANONICAL)
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), CANONICAL)
+        self.http.get.return_value.close.assert_called_once()
+
+    def test_unusable_targets_are_cached_negatively(self):
+        self.http.head.return_value = response('https://www.tiktok.com/login')
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), SHORT)
+        self.assertEqual(shortlinks.resolve_short_link(SHORT), SHORT)
+        self.assertEqual(self.http.head.call_count, 1)
+        link = ShortLink.objects.get(short_url=SHORT)
+        self.assertEqual(link.canonical_url, SHORT)
+        self.assertAlmostEqual((link.expires_at - link.resolved_at).total_seconds(), 60)
+
+    def test_failed_requests_are_cached_negatively(self):
+        for error in (requests.ConnectionError('down'), RateLimited('vm.tiktok.com')):
+            with self.subTest(error=error):
+                shortlinks._memory_cache.clear()
+                ShortLink.objects.all().delete()
+                self.http.head.side_effect = error
+                self.assertEqual(shortlinks.resolve_short_link(SHORT), SHORT)
+                self.assertEqual(ShortLink.objects.get().canonical_url, SHORT)
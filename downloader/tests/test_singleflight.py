@@ -0,0 +1,96 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from downloader import jobs, singleflight
+from downloader.models import DownloadedVideo, MediaLock
+
+from .helpers import make_download, make_user
+
+KEY = 'instagram:ABC123'
+
+
+@mock.patch('downloader.singleflight.wake_jobs')
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+
+    def test_first_caller_leads_the_others_follow(self, wake_jobs):
+        with singleflight.single_flight(KEY) as leader:
+            self.assertTrue(leader)
+            self.assertTrue(MediaLock.objects.filter(media_key=KEY).exists())
+            with singleflight.single_flight(KEY) as follower:
+                self.assertFalse(follower)
+        self.assertFalse(MediaLock.objects.exists())
+        with singleflight.single_flight(KEY) as leader:
+            self.assertTrue(leader)
+
+    def test_other_processes_locks_are_respected(self, wake_jobs):
+        MediaLock.objects.create(media_key=KEY, owner='other', expires_at=timezone.now() + timedelta(seconds=60))
+        self.assertFalse(singleflight.acquire(KEY, 'me'))
+
+    def test_expired_locks_are_taken_over(self, wake_jobs):
+        MediaLock.objects.create(media_key=KEY, owner='dead', expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(singleflight.acquire(KEY, 'me'))
+        self.assertEqual(MediaLock.objects.get().owner, 'me')
+        singleflight.release(KEY, 'me')
+
+    def test_unkeyed_media_always_leads(self, wake_jobs):
+        with singleflight.single_flight('') as leader:
+            self.assertTrue(leader)
+        self.assertFalse(MediaLock.objects.exists())
+
+    def test_parked_followers_wake_on_release(self, wake_jobs):
+        video = make_download(self.user, status='downloading')
+        self.assertTrue(singleflight.acquire(KEY, 'leader'))
+        self.assertTrue(singleflight.park(video, KEY))
+
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.waiting_for), ('pending', KEY))
+        self.assertIsNone(jobs.claim_next_job('worker'))
+
+        singleflight.release(KEY, 'leader')
+        wake_jobs.assert_called_once_with([video.pk])
+        self.assertEqual(jobs.claim_next_job('worker').pk, video.pk)
+
+    def test_park_fails_when_the_leader_already_finished(self, wake_jobs):
+        video = make_download(self.user, status='downloading')
+        self.assertFalse(singleflight.park(video, KEY))
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.waiting_for), ('downloading', ''))
+
+    def test_followers_of_a_dead_leader_wake_on_expiry(self, wake_jobs):
+        video = make_download(self.user)
+        MediaLock.objects.create(media_key=KEY, owner='dead', expires_at=timezone.now() + timedelta(seconds=60))
+        singleflight.park(video, KEY)
+        MediaLock.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        singleflight.release_expired()
+        self.assertFalse(MediaLock.objects.exists())
+        wake_jobs.assert_called_once_with([video.pk])
+        self.assertEqual(DownloadedVideo.objects.get(pk=video.pk).waiting_for, '')
+
+    def test_renew_extends_own_locks(self, wake_jobs):
+        soon = timezone.now() + timedelta(seconds=5)
+        MediaLock.objects.create(media_key=KEY, owner='me', expires_at=soon)
+        MediaLock.objects.create(media_key='tiktok:1', owner='other', expires_at=soon)
+        with self.settings(DOWNLOAD_LEASE_SECONDS=60):
+            singleflight.renew('me')
+        self.assertGreater(MediaLock.objects.get(owner='me').expires_at, soon)
+        self.assertEqual(MediaLock.objects.get(owner='other').expires_at, soon)
+
+
+@mock.patch('downloader.singleflight.wake_jobs')
+class ParkedDownloadTests(TestCase):
+    def test_a_concurrent_download_is_parked(self, wake_jobs):
+        from downloader.utils import download_video
+
+        video = make_download(make_user(), url='https://www.instagram.com/reel/ABC123/')
+        MediaLock.objects.create(media_key=KEY, owner='other', expires_at=timezone.now() + timedelta(seconds=60))
+        with mock.patch('downloader.utils._download_media') as download_media:
+            download_video(video)
+        download_media.assert_not_called()
+        video.refresh_from_db()
+        self.assertEqual((video.status, video.waiting_for), ('pending', KEY))
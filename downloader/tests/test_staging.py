@@ -0,0 +1,123 @@
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from downloader import jobs, staging
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class PublishTests(TempMediaMixin, TestCase):
+    def test_staged_file_moves_to_its_final_place(self):
+        video = make_download(make_user())
+        staged = write_file(os.path.join(staging.job_dir(video), 'clip.mp4'), b'video')
+        final = os.path.join(self.media_root, 'downloads', 'ab', 'cd', 'abcd.mp4')
+        self.assertEqual(staging.publish(staged, final), final)
+        self.assertFalse(os.path.exists(staged))
+        with open(final, 'rb') as f:
+            self.assertEqual(f.read(), b'video')
+
+    def test_discard_removes_the_job_dir(self):
+        video = make_download(make_user())
+        write_file(os.path.join(staging.job_dir(video), 'clip.mp4.part'))
+        staging.discard(video)
+        self.assertFalse(os.path.exists(os.path.join(staging.get_staging_root(), str(video.pk))))
+        self.assertFalse(staging.has_partials(video))
+
+
+@override_settings(DOWNLOAD_MAX_ATTEMPTS=3, DOWNLOAD_JOB_DEADLINE=600, DOWNLOAD_LEASE_SECONDS=60)
+class RequeueForResumeTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user(), status='failed', lease_owner='worker', attempts=1)
+
+    def leave_partial(self, name='clip.mp4.part.json'):
+        write_file(os.path.join(staging.job_dir(self.video), name))
+
+    def test_failed_job_with_a_partial_file_is_requeued(self):
+        self.leave_partial()
+        self.assertTrue(jobs.requeue_for_resume(self.video))
+        self.assertEqual(self.video.status, 'pending')
+
+    def test_only_resumable_partials_count(self):
+        self.leave_partial('image.tmp')
+        self.assertFalse(jobs.requeue_for_resume(self.video))
+
+    def test_terminal_failures_arent_requeued(self):
+        self.leave_partial()
+        for fields in ({'attempts': 3}, {'lease_owner': ''},
+                       {'created_at': timezone.now() - timedelta(seconds=601)}):
+            with self.subTest(**fields):
+                video = make_download(self.video.user, status='failed', lease_owner='worker', attempts=1)
+                for name, value in fields.items():
+                    setattr(video, name, value)
+                write_file(os.path.join(staging.job_dir(video), 'clip.mp4.part'))
+                self.assertFalse(jobs.requeue_for_resume(video))
+                self.assertEqual(video.status, 'failed')
+
+    def test_download_video_keeps_the_partial_for_the_retry(self):
+        from downloader.utils import download_video
+
+        self.video.status = 'pending'
+        self.video.save()
+
+        def fail_midway(video_obj, deadline):
+            write_file(os.path.join(staging.job_dir(video_obj), 'clip.mp4.part'))
+            video_obj.status = 'failed'
+            video_obj.error_message = 'connection reset'
+
+        with mock.patch('downloader.utils._download_media', side_effect=fail_midway), \
+                mock.patch('downloader.singleflight.wake_jobs'):
+            download_video(self.video)
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.status, 'pending')
+        self.assertTrue(staging.has_partials(self.video))
+
+
+@override_settings(DOWNLOAD_MAX_ATTEMPTS=3, DOWNLOAD_JOB_DEADLINE=600, DOWNLOAD_LEASE_SECONDS=60)
+class RecoverStagingTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def staged_job(self, **fields):
+        video = make_download(self.user, **fields)
+        write_file(os.path.join(staging.job_dir(video), 'clip.mp4.part'))
+        return video
+
+    def staged(self, video):
+        return os.path.exists(os.path.join(staging.get_staging_root(), str(video.pk)))
+
+    def test_jobs_that_run_again_keep_their_partials(self):
+        pending = self.staged_job(status='pending')
+        crashed = self.staged_job(status='downloading', lease_owner='dead', attempts=1,
+                                  lease_expires_at=timezone.now() - timedelta(seconds=1))
+        running = self.staged_job(status='downloading', lease_owner='alive', attempts=1,
+                                  lease_expires_at=timezone.now() + timedelta(seconds=30))
+        failed = self.staged_job(status='failed')
+        expired = self.staged_job(status='pending', created_at=timezone.now() - timedelta(seconds=601))
+
+        with mock.patch('downloader.singleflight.wake_jobs'), mock.patch('downloader.jobs.wake_jobs'):
+            self.assertEqual(staging.recover_staging(), (2, 2))
+        self.assertTrue(self.staged(pending))
+        self.assertTrue(self.staged(crashed))
+        self.assertTrue(self.staged(running))
+        self.assertFalse(self.staged(failed))
+        self.assertFalse(self.staged(expired))
+
+    def test_orphaned_directories_are_removed(self):
+        os.makedirs(os.path.join(staging.get_staging_root(), '999'))
+        self.assertEqual(staging.recover_staging(), (0, 1))
+
+    def test_old_partials_next_to_downloads_are_removed(self):
+        old = write_file(os.path.join(staging.get_downloads_root(), 'instagram', 'clip.mp4.part'))
+        new = write_file(os.path.join(staging.get_downloads_root(), 'instagram', 'other.mp4.part'))
+        done = write_file(os.path.join(staging.get_downloads_root(), 'instagram', 'done.mp4'))
+        os.utime(old, (time.time() - 120, time.time() - 120))
+        self.assertEqual(staging.recover_staging(), (0, 1))
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new) and os.path.exists(done))
@@ -0,0 +1,123 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from downloader import status_updates
+from downloader.models import DownloadedVideo
+from downloader.status_updates import notifier, parse_known, wait_for_changes
+
+from .helpers import ClearCachesMixin, make_download, make_user
+
+
+class ParseKnownTests(SimpleTestCase):
+    def test_parses_id_status_pairs(self):
+        self.assertEqual(parse_known('1:pending,2:downloading,'), {1: 'pending', 2: 'downloading'})
+        self.assertEqual(parse_known(None), {})
+
+    def test_malformed_values_raise(self):
+        for value in ('x:pending', ','.join(f'{i}:pending' for i in range(101))):
+            with self.subTest(value=value[:20]), self.assertRaises(ValueError):
+                parse_known(value)
+
+
+@override_settings(STATUS_UPDATES_CACHE='shared', STATUS_POLL_INTERVAL=0.05, STATUS_DB_POLL_INTERVAL=60)
+class WaitForChangesTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.video = make_download(self.user, status='downloading')
+
+    def during_wait(self, change):
+        """Run change once, in place of the first wait for a notification"""
+        original = notifier.wait
+        calls = []
+
+        def wait(version, timeout):
+            if not calls:
+                calls.append(version)
+                change()
+            return original(version, timeout)
+
+        return mock.patch.object(notifier, 'wait', side_effect=wait)
+
+    def complete_elsewhere(self):
+        # A bulk update of another process, no post_save in this one
+        DownloadedVideo.objects.filter(pk=self.video.pk).update(status='completed')
+
+    def test_times_out_without_a_change(self):
+        started = time.monotonic()
+        self.assertEqual(wait_for_changes(self.user, {self.video.pk: 'downloading'}, timeout=0.2), [])
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_changed_jobs_return_at_once(self):
+        result = wait_for_changes(self.user, {self.video.pk: 'pending'}, timeout=5)
+        self.assertEqual([(job['id'], job['status']) for job in result], [(self.video.pk, 'downloading')])
+
+    def test_woken_by_a_save_in_this_process(self):
+        def complete():
+            self.video.status = 'completed'
+            self.video.save()
+
+        started = time.monotonic()
+        with self.during_wait(complete):
+            result = wait_for_changes(self.user, {self.video.pk: 'downloading'}, timeout=5)
+        self.assertEqual(result[0]['status'], 'completed')
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_woken_by_the_shared_version_of_another_process(self):
+        def complete():
+            self.complete_elsewhere()
+            status_updates.get_status_cache().set(status_updates.STATUS_VERSION_KEY, 41)
+
+        with self.during_wait(complete):
+            result = wait_for_changes(self.user, {self.video.pk: 'downloading'}, timeout=5)
+        self.assertEqual(result[0]['status'], 'completed')
+
+    def test_lost_bumps_are_caught_by_the_db_poll(self):
+        with self.settings(STATUS_DB_POLL_INTERVAL=0.1), self.during_wait(self.complete_elsewhere):
+            result = wait_for_changes(self.user, {self.video.pk: 'downloading'}, timeout=5)
+        self.assertEqual(result[0]['status'], 'completed')
+
+    def test_unbumped_changes_wait_for_the_db_poll(self):
+        with self.during_wait(self.complete_elsewhere):
+            self.assertEqual(wait_for_changes(self.user, {self.video.pk: 'downloading'}, timeout=0.3), [])
+
+    def test_active_jobs_are_watched_by_default(self):
+        make_download(self.user, status='completed')
+        self.assertEqual(wait_for_changes(make_user('bob'), timeout=5), [])
+        with self.during_wait(self.complete_elsewhere), self.settings(STATUS_DB_POLL_INTERVAL=0.1):
+            result = wait_for_changes(self.user, timeout=5)
+        self.assertEqual([job['id'] for job in result], [self.video.pk])
+
+    def test_bumps_survive_cache_errors(self):
+        broken = mock.Mock(**{'add.side_effect': ConnectionError('redis down'),
+                              'get.side_effect': ConnectionError('redis down')})
+        with mock.patch('downloader.status_updates.get_status_cache', return_value=broken), \
+                self.assertLogs('downloader.status_updates', 'WARNING'):
+            version = notifier.version
+            status_updates.bump_status_version()
+            self.assertIsNone(status_updates.shared_version())
+        self.assertEqual(notifier.version, version + 1)
+
+
+class StatusUpdatesViewTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+        self.client.force_login(self.user)
+
+    def test_changed_jobs_are_returned(self):
+        video = make_download(self.user, status='completed', title='A reel')
+        response = self.client.get(reverse('status_updates'), {'jobs': f'{video.pk}:downloading'})
+        self.assertEqual(response.json()['jobs'][0]['title'], 'A reel')
+
+    def test_other_users_jobs_arent_watched(self):
+        video = make_download(make_user('bob'), status='completed')
+        with self.settings(STATUS_LONG_POLL_TIMEOUT=0.1):
+            response = self.client.get(reverse('status_updates'), {'jobs': f'{video.pk}:downloading'})
+        self.assertEqual(response.json(), {'jobs': []})
+
+    def test_malformed_jobs_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('status_updates'), {'jobs': 'x'}).status_code, 400)
@@ -0,0 +1,46 @@
+import os
+
+from django.test import TestCase
+from django.urls import reverse
+
+from downloader.content_store import blob_path, display_filename, store_file
+
+from .helpers import TempMediaMixin, make_download, make_user, write_file
+
+
+class StorageLayoutTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user()
+
+    def store(self, data, title):
+        video = make_download(self.user, title=title, status='completed')
+        store_file(video, write_file(os.path.join(self.media_root, 'staging', 'clip.mp4'), data), 'video')
+        video.save()
+        return video
+
+    def test_files_are_sharded_by_content_hash(self):
+        sha256 = 'abcdef' + '0' * 58
+        self.assertEqual(blob_path(sha256, '.mp4'),
+                         os.path.join(self.media_root, 'downloads', 'ab', 'cd', f'{sha256}.mp4'))
+
+    def test_same_title_different_content_dont_collide(self):
+        first = self.store(b'first', 'Same title')
+        second = self.store(b'second', 'Same title')
+        self.assertNotEqual(first.file_path, second.file_path)
+        self.assertEqual(first.filename, second.filename)
+        for video, data in ((first, b'first'), (second, b'second')):
+            with open(video.file_path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def test_title_is_only_the_download_name(self):
+        self.assertEqual(display_filename('My / reel: #1!', '/x/ab/cd/abcd.mp4'), 'My  reel 1.mp4')
+        self.assertEqual(display_filename('', '/x/ab/cd/abcd.jpg', 'image'), 'image.jpg')
+        self.assertEqual(len(display_filename('x' * 80, '/x/a.mp4')), 54)
+
+        video = self.store(b'video', 'A reel')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('download_file', args=[video.pk]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="A reel.mp4"')
+        self.assertEqual(b''.join(response.streaming_content), b'video')
+        response.close()
@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from downloader import circuit_breaker, strategies, utils
+from downloader.deadline import Deadline, DeadlineExceeded
+from downloader.strategies import Strategy, StrategyResult
+
+from .helpers import (
+    ClearCachesMixin, TempMediaMixin, fake_youtube_dl, make_download, make_user, video_format,
+)
+
+
+def returning(*results):
+    """Strategy function returning results in turn"""
+    return mock.Mock(side_effect=list(results))
+
+
+@override_settings(DOWNLOAD_STRATEGIES={'tiktok': ['first', 'second', 'rescue']})
+class RunStrategiesTests(ClearCachesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = mock.Mock(platform='tiktok', url='https://www.tiktok.com/@a/video/1')
+
+    def register(self, first, second, rescue=None):
+        registry = {
+            'first': Strategy('first', first, 60, False),
+            'second': Strategy('second', second, 60, False),
+            'rescue': Strategy('rescue', rescue or returning(StrategyResult(True)), 60, True),
+        }
+        patcher = mock.patch.dict(strategies._registry, registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return registry
+
+    def run_strategies(self, seconds=60):
+        return strategies.run_strategies(self.video, Deadline.after(seconds))
+
+    def test_first_success_wins(self):
+        registry = self.register(returning(StrategyResult(False, 'HTTP 500')), returning(StrategyResult(True)))
+        run = self.run_strategies()
+        self.assertTrue(run.success)
+        self.assertEqual(run.primary_error, 'HTTP 500')
+        registry['rescue'].func.assert_not_called()
+
+    def test_fallbacks_only_run_after_an_access_error(self):
+        rescue = returning(StrategyResult(True))
+        self.register(returning(StrategyResult(False, 'Post not found')),
+                      returning(StrategyResult(False, 'HTTP 500')), rescue)
+        self.assertFalse(self.run_strategies().success)
+        rescue.assert_not_called()
+
+        self.register(returning(StrategyResult(False, 'Login required')),
+                      returning(StrategyResult(False, 'HTTP 500')), rescue)
+        self.assertTrue(self.run_strategies().success)
+        rescue.assert_called_once()
+
+    def test_final_results_stop_the_run(self):
+        second = returning(StrategyResult(True))
+        self.register(returning(StrategyResult(False, 'No video', final=True)), second)
+        run = self.run_strategies()
+        self.assertEqual((run.success, run.final), (False, True))
+        second.assert_not_called()
+
+    def test_crashes_count_as_failures(self):
+        self.register(mock.Mock(side_effect=ValueError('boom')), returning(StrategyResult(True)))
+        with self.assertLogs('downloader.strategies', 'ERROR'):
+            self.assertTrue(self.run_strategies().success)
+        self.assertEqual(strategies.strategy_metrics('tiktok', ['first'])['first']['runs'], 1)
+
+    def test_expired_deadline_stops_the_run(self):
+        first = returning(StrategyResult(True))
+        self.register(first, returning(StrategyResult(True)))
+        with self.assertRaises(DeadlineExceeded):
+            self.run_strategies(seconds=-1)
+        first.assert_not_called()
+
+    def test_open_circuits_are_skipped(self):
+        first = returning(StrategyResult(True))
+        self.register(first, returning(StrategyResult(True)))
+        for _ in range(5):
+            circuit_breaker.record('tiktok', 'first', False)
+        self.assertEqual(strategies.ordered_strategies('tiktok'), ['second', 'rescue'])
+        self.assertTrue(self.run_strategies().success)
+        first.assert_not_called()
+
+    def test_primaries_run_before_fallbacks_each_by_success_rate(self):
+        self.register(returning(), returning())
+        circuit_breaker.record('tiktok', 'rescue', True)
+        circuit_breaker.record('tiktok', 'second', True)
+        circuit_breaker.record('tiktok', 'first', False)
+        self.assertEqual(strategies.ordered_strategies('tiktok'), ['second', 'first', 'rescue'])
+
+    def test_only_outage_errors_are_counted_against_a_circuit(self):
+        self.register(returning(*[StrategyResult(False, 'Post not found')] * 5),
+                      returning(*[StrategyResult(False, 'HTTP Error 429')] * 5))
+        for _ in range(5):
+            self.run_strategies()
+        self.assertEqual(circuit_breaker.get_state('tiktok', 'first'), circuit_breaker.CLOSED)
+        self.assertEqual(circuit_breaker.get_state('tiktok', 'second'), circuit_breaker.OPEN)
+
+
+class MetricsTests(ClearCachesMixin, TestCase):
+    def test_runs_are_counted_per_latency_bucket(self):
+        strategies.record_metrics('tiktok', 'ytdlp', 'success', 0.5)
+        strategies.record_metrics('tiktok', 'ytdlp', 'success', 3)
+        strategies.record_metrics('tiktok', 'ytdlp', 'timeout', 400)
+        metrics = strategies.strategy_metrics('tiktok', ['ytdlp'])['ytdlp']
+        self.assertEqual(metrics['success'][:3], [1, 0, 1])
+        self.assertEqual(metrics['timeout'][-1], 1)
+        self.assertEqual(metrics['runs'], 3)
+        self.assertAlmostEqual(metrics['success_rate'], 2 / 3)
+        self.assertEqual(len(strategies.bucket_labels()), len(metrics['success']))
+
+    def test_cache_errors_dont_fail_the_run(self):
+        broken = mock.Mock(**{'add.side_effect': ConnectionError('redis down')})
+        with mock.patch('downloader.strategies._metrics_cache', return_value=broken), \
+                self.assertLogs('downloader.strategies', 'WARNING'):
+            strategies.record_metrics('tiktok', 'ytdlp', 'success', 1)
+
+
+@mock.patch('downloader.utils.schedule_file_cleanup')
+class MobileStrategyTests(ClearCachesMixin, TempMediaMixin, TestCase):
+    info = {'id': 'ABC123', 'title': 'A reel', 'formats': [video_format('sd', height=480)]}
+
+    def setUp(self):
+        super().setUp()
+        self.video = make_download(make_user())
+
+    def run_strategy(self, ydl_class):
+        with mock.patch('downloader.utils.yt_dlp.YoutubeDL', ydl_class):
+            return utils._ytdlp_mobile_strategy(self.video, Deadline.after(60))
+
+    def test_instagram_strategies_are_registered_in_order(self, cleanup):
+        self.assertEqual(strategies.get_platform_strategies('instagram'),
+                         ['ytdlp', 'embed', 'api', 'ytdlp_mobile', 'thumbnail'])
+        self.assertEqual(strategies.get_platform_strategies('tiktok'), ['ytdlp'])
+        self.assertTrue(strategies.get_strategy('ytdlp_mobile').fallback)
+
+    def test_extracts_with_the_mobile_headers(self, cleanup):
+        ydl_class = fake_youtube_dl(self.info)
+        self.assertTrue(self.run_strategy(ydl_class).success)
+        self.assertEqual(ydl_class.extractions, [(self.video.url, utils.INSTAGRAM_MOBILE_CONFIGS[0]['http_headers'])])
+        self.assertEqual(self.video.blob.variant, 'fallback:worst[ext=mp4]')
+
+    def test_every_config_extracts_once(self, cleanup):
+        ydl_class = fake_youtube_dl(self.info, failing_formats={'sd'})
+        result = self.run_strategy(ydl_class)
+        self.assertFalse(result.success)
+        self.assertEqual([headers for _, headers in ydl_class.extractions],
+                         [config['http_headers'] for config in utils.INSTAGRAM_MOBILE_CONFIGS])
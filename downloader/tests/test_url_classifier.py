@@ -0,0 +1,73 @@
+from django.test import SimpleTestCase
+
+from downloader.url_classifier import classify_url, classify_urls, matches_platform
+
+
+# url, platform, kind, media_key
+URL_SHAPES = [
+    ('https://www.instagram.com/p/C8xYz12AbCd/', 'instagram', 'post', 'instagram:C8xYz12AbCd'),
+    ('https://instagram.com/p/C8xYz12AbCd/?img_index=2', 'instagram', 'post', 'instagram:C8xYz12AbCd'),
+    ('https://www.instagram.com/reel/C8xYz12AbCd/?igsh=abc', 'instagram', 'reel', 'instagram:C8xYz12AbCd'),
+    ('https://www.instagram.com/tv/B_tv-Id_1/', 'instagram', 'tv', 'instagram:B_tv-Id_1'),
+    ('https://www.instagram.com/stories/someone/3141592653589/', 'instagram', 'story', 'instagram:3141592653589'),
+    ('https://www.facebook.com/someone/videos/1234567890/', 'facebook', 'video', 'facebook:1234567890'),
+    ('https://m.facebook.com/page/video/1234567890', 'facebook', 'video', 'facebook:1234567890'),
+    ('https://www.facebook.com/watch/?v=1234567890', 'facebook', 'video', 'facebook:1234567890'),
+    ('https://www.facebook.com/reel/1234567890', 'facebook', 'video', 'facebook:1234567890'),
+    ('https://fb.watch/aBc-12_x/', 'facebook', 'short', 'facebook:aBc-12_x'),
+    ('https://www.facebook.com/share/r/AbC123/', 'facebook', 'share', 'facebook:AbC123'),
+    ('https://www.facebook.com/share/v/AbC123/', 'facebook', 'share', 'facebook:AbC123'),
+    ('https://www.tiktok.com/@some.one/video/7234567890123456789', 'tiktok', 'video', 'tiktok:7234567890123456789'),
+    ('https://m.tiktok.com/@someone/video/7234567890123456789?lang=en', 'tiktok', 'video', 'tiktok:7234567890123456789'),
+    ('https://www.tiktok.com/t/ZTRabc123/', 'tiktok', 'short', 'tiktok:ZTRabc123'),
+    ('https://vm.tiktok.com/ZMabc123/', 'tiktok', 'short', 'tiktok:ZMabc123'),
+    ('https://www.pinterest.com/pin/123456789012/', 'pinterest', 'pin', 'pinterest:123456789012'),
+    ('https://pinterest.co.uk/pin/123456789012', 'pinterest', 'pin', 'pinterest:123456789012'),
+    ('https://www.pinterest.com/someone/recipes/pasta/', 'pinterest', 'board', None),
+    ('https://www.pinterest.com/ideas/', 'pinterest', 'other', None),
+    ('https://pin.it/4AbCdEf', 'pinterest', 'short', 'pinterest:4AbCdEf'),
+    ('https://www.pin.it/4AbCdEf', 'pinterest', 'short', 'pinterest:4AbCdEf'),
+]
+
+
+class ClassifyUrlTests(SimpleTestCase):
+    def test_every_supported_url_shape(self):
+        for url, platform, kind, media_key in URL_SHAPES:
+            with self.subTest(url=url):
+                result = classify_url(url)
+                self.assertTrue(result.is_valid)
+                self.assertEqual((result.platform, result.kind, result.media_key), (platform, kind, media_key))
+                self.assertTrue(matches_platform(url, platform))
+
+    def test_unsupported_urls(self):
+        for url in ('https://www.youtube.com/watch?v=abc', 'https://instagram.com/someone/', 'not a url'):
+            with self.subTest(url=url):
+                result = classify_url(url)
+                self.assertFalse(result.is_valid)
+                self.assertEqual(result.platform, 'other')
+                self.assertIsNone(result.media_key)
+                self.assertIn('Unsupported platform', result.message)
+
+    def test_only_platform_wide_ids_are_reusable(self):
+        reusable = {url for url, *_ in URL_SHAPES if classify_url(url).is_reusable}
+        self.assertIn('https://www.instagram.com/reel/C8xYz12AbCd/?igsh=abc', reusable)
+        self.assertIn('https://www.facebook.com/reel/1234567890', reusable)
+        self.assertNotIn('https://www.instagram.com/stories/someone/3141592653589/', reusable)
+        self.assertNotIn('https://vm.tiktok.com/ZMabc123/', reusable)
+        self.assertNotIn('https://www.pinterest.com/someone/recipes/pasta/', reusable)
+
+    def test_short_links(self):
+        self.assertTrue(classify_url('https://fb.watch/aBc-12_x/').is_short_link)
+        self.assertTrue(classify_url('https://www.facebook.com/share/r/AbC123/').is_short_link)
+        self.assertFalse(classify_url('https://www.facebook.com/reel/1234567890').is_short_link)
+
+    def test_same_post_from_different_url_shapes_shares_a_key(self):
+        keys = {r.media_key for r in classify_urls([
+            'https://www.instagram.com/p/C8xYz12AbCd/',
+            'https://instagram.com/reel/C8xYz12AbCd',
+        ])}
+        self.assertEqual(keys, {'instagram:C8xYz12AbCd'})
+
+    def test_urls_only_match_their_own_platform(self):
+        self.assertFalse(matches_platform('https://www.instagram.com/p/C8xYz12AbCd/', 'tiktok'))
+        self.assertFalse(matches_platform('https://www.instagram.com/p/C8xYz12AbCd/', 'unknown'))
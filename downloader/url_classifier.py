@@ -0,0 +1,125 @@
+"""
+Single-pass URL classifier for the supported platforms
+All platform patterns are compiled into one regex, so a URL is parsed once
+to get its platform, canonical media ID, URL kind and validity
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+
+# (platform, kind, pattern) in match order, the first group is the media ID
+URL_RULES = [
+    ('instagram', 'post', r'(?:https?://)?(?:www\.)?instagram\.com/p/([A-Za-z0-9_-]+)/?'),
+    ('instagram', 'reel', r'(?:https?://)?(?:www\.)?instagram\.com/reel/([A-Za-z0-9_-]+)/?'),
+    ('instagram', 'tv', r'(?:https?://)?(?:www\.)?instagram\.com/tv/([A-Za-z0-9_-]+)/?'),
+    ('instagram', 'story', r'(?:https?://)?(?:www\.)?instagram\.com/stories/[^/]+/([0-9]+)/?'),
+    ('facebook', 'video', r'(?:https?://)?(?:www\.|m\.)?facebook\.com/.*/videos?/([0-9]+)/?'),
+    ('facebook', 'video', r'(?:https?://)?(?:www\.|m\.)?facebook\.com/watch/\?v=([0-9]+)'),
+    # Reel IDs are video IDs, share/r links resolve to these
+    ('facebook', 'video', r'(?:https?://)?(?:www\.|m\.)?facebook\.com/reel/([0-9]+)/?'),
+    ('facebook', 'short', r'(?:https?://)?fb\.watch/([A-Za-z0-9_-]+)/?'),
+    ('facebook', 'share', r'(?:https?://)?(?:www\.|m\.)?facebook\.com/share/r/([A-Za-z0-9_-]+)/?'),
+    ('facebook', 'share', r'(?:https?://)?(?:www\.|m\.)?facebook\.com/share/v/([A-Za-z0-9_-]+)/?'),
+    ('tiktok', 'video', r'(?:https?://)?(?:www\.|vm\.|m\.)?tiktok\.com/@[^/]+/video/([0-9]+)/?'),
+    ('tiktok', 'short', r'(?:https?://)?(?:www\.|vm\.|m\.)?tiktok\.com/t/([A-Za-z0-9_-]+)/?'),
+    ('tiktok', 'short', r'(?:https?://)?vm\.tiktok\.com/([A-Za-z0-9_-]+)/?'),
+    ('pinterest', 'pin', r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/pin/([0-9]+)/?'),
+    ('pinterest', 'board', r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/([^/]+/[^/]+/[A-Za-z0-9_-]+)/?'),
+    ('pinterest', 'other', r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/.*'),
+    ('pinterest', 'short', r'(?:https?://)?pin\.it/([A-Za-z0-9_-]+)/?'),  # Pinterest short URLs
+    ('pinterest', 'short', r'(?:https?://)?(?:www\.)?pin\.it/([A-Za-z0-9_-]+)/?'),  # Alternative pin.it format
+]
+
+# URL kinds that redirect to the real media URL
+SHORT_LINK_KINDS = {'short', 'share'}
+
+# URL kinds whose ID doesn't name one piece of media, they get no media key
+# so they are never deduplicated or cached
+UNKEYED_KINDS = {'board', 'other'}
+
+# URL kinds whose ID is unique across the platform, only their stored files
+# are reused for other downloads of the same key
+REUSABLE_KINDS = {'post', 'reel', 'tv', 'video', 'pin'}
+
+SUPPORTED_PLATFORMS_MESSAGE = "Unsupported platform. Supported: Instagram, Facebook, TikTok, Pinterest"
+
+
+class ClassifiedUrl(namedtuple('ClassifiedUrl', ['url', 'platform', 'media_id', 'kind', 'is_valid'])):
+    """Result of classifying a URL"""
+    __slots__ = ()
+
+    @property
+    def media_key(self):
+        """Canonical media ID, e.g. 'instagram:C8xYz12AbCd' (None if unknown)"""
+        if self.media_id and self.kind not in UNKEYED_KINDS:
+            return f"{self.platform}:{self.media_id}"
+        return None
+
+    @property
+    def is_reusable(self):
+        return self.media_key is not None and self.kind in REUSABLE_KINDS
+
+    @property
+    def is_short_link(self):
+        return self.kind in SHORT_LINK_KINDS
+
+    @property
+    def message(self):
+        if self.is_valid:
+            return f"Valid {self.platform.title()} URL"
+        return SUPPORTED_PLATFORMS_MESSAGE
+
+
+def _build_regex(rules):
+    """
+    Join the rule patterns into one alternation
+    Returns the compiled regex and a map of outer group index to
+    (platform, kind, media ID group index or None)
+    """
+    parts = []
+    groups = {}
+    index = 1
+    for platform, kind, pattern in rules:
+        inner_groups = re.compile(pattern).groups
+        groups[index] = (platform, kind, index + 1 if inner_groups else None)
+        parts.append(f'({pattern})')
+        index += 1 + inner_groups
+    return re.compile('|'.join(parts), re.IGNORECASE), groups
+
+
+_URL_REGEX, _URL_GROUPS = _build_regex(URL_RULES)
+
+# Per-platform regexes for validating a URL against a given platform
+_PLATFORM_REGEXES = {
+    platform: re.compile(
+        '|'.join(f'(?:{pattern})' for p, _, pattern in URL_RULES if p == platform),
+        re.IGNORECASE
+    )
+    for platform in dict.fromkeys(p for p, _, _ in URL_RULES)
+}
+
+
+@lru_cache(maxsize=4096)
+def classify_url(url):
+    """Classify a URL in a single regex pass"""
+    match = _URL_REGEX.match(url)
+    if not match:
+        return ClassifiedUrl(url, 'other', None, None, False)
+
+    # The outer group of the matching rule is the last one closed
+    platform, kind, id_group = _URL_GROUPS[match.lastindex]
+    media_id = match.group(id_group) if id_group else None
+    return ClassifiedUrl(url, platform, media_id, kind, True)
+
+
+def classify_urls(urls):
+    """Classify a batch of URLs, repeated URLs are only parsed once"""
+    return [classify_url(url) for url in urls]
+
+
+def matches_platform(url, platform):
+    """Check a URL against the patterns of one platform"""
+    regex = _PLATFORM_REGEXES.get(platform)
+    return bool(regex and regex.match(url))
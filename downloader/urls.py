@@ -6,8 +6,12 @@ urlpatterns = [
     path('status/<int:pk>/', views.download_status, name='download_status'),
     path('list/', views.download_list, name='download_list'),
     path('download/<int:pk>/', views.download_file, name='download_file'),
+    path('download/<int:pk>/<int:position>/', views.download_asset, name='download_asset'),
+    path('api/downloads/', views.download_list_api, name='download_list_api'),
+    path('api/status/', views.status_updates, name='status_updates'),
     path('api/status/<int:pk>/', views.check_status, name='check_status'),
     path('api/preview/', views.preview_video, name='preview_video'),
+    path('api/formats/', views.available_formats, name='available_formats'),
     # Authentication URLs
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('logout/', views.logout_view, name='logout'),
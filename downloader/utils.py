@@ -1,40 +1,33 @@
 import os
 import re
-import requests
+import copy
+import tempfile
 import yt_dlp
 from django.conf import settings
 from django.utils import timezone
+from . import http_client, rate_limiter, segmented, staging
 from .models import DownloadedVideo
+from .formats import plan_formats, format_id_selector, describe_format
+from .media_cache import get_media_info_cache
+from .url_classifier import URL_RULES, SUPPORTED_PLATFORMS_MESSAGE, classify_url, matches_platform
+from .content_store import find_blob, attach_blob, store_file, fallback_variant
+from .singleflight import park, single_flight
+from .shortlinks import resolve_short_link
+from .strategies import StrategyResult, register, run_strategies, is_access_error
+from .deadline import Deadline, DeadlineExceeded
+from .jobs import requeue_for_resume
+from .expiry import schedule_expiry
+from .carousel import items_from_info, download_carousel, get_carousel_max_items, reuse_carousel
+from . import instagram_bypass  # noqa: F401 registers the embed and api strategies
 from urllib.parse import urlparse
-from PIL import Image
-
-
-# Platform detection patterns
-PLATFORM_PATTERNS = {
-    'instagram': [
-        r'(?:https?://)?(?:www\.)?instagram\.com/(?:p|reel|tv)/([A-Za-z0-9_-]+)/?',
-        r'(?:https?://)?(?:www\.)?instagram\.com/stories/[^/]+/([0-9]+)/?'
-    ],
-    'facebook': [
-        r'(?:https?://)?(?:www\.|m\.)?facebook\.com/.*/videos?/([0-9]+)/?',
-        r'(?:https?://)?(?:www\.|m\.)?facebook\.com/watch/\?v=([0-9]+)',
-        r'(?:https?://)?fb\.watch/([A-Za-z0-9_-]+)/?',
-        r'(?:https?://)?(?:www\.|m\.)?facebook\.com/share/r/([A-Za-z0-9_-]+)/?',
-        r'(?:https?://)?(?:www\.|m\.)?facebook\.com/share/v/([A-Za-z0-9_-]+)/?'
-    ],
-    'tiktok': [
-        r'(?:https?://)?(?:www\.|vm\.|m\.)?tiktok\.com/@[^/]+/video/([0-9]+)/?',
-        r'(?:https?://)?(?:www\.|vm\.|m\.)?tiktok\.com/t/([A-Za-z0-9_-]+)/?',
-        r'(?:https?://)?vm\.tiktok\.com/([A-Za-z0-9_-]+)/?'
-    ],
-    'pinterest': [
-        r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/pin/([0-9]+)/?',
-        r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/[^/]+/[^/]+/([A-Za-z0-9_-]+)/?',
-        r'(?:https?://)?(?:www\.)?pinterest\.[^/]+/.*',
-        r'(?:https?://)?pin\.it/([A-Za-z0-9_-]+)/?',  # Pinterest short URLs
-        r'(?:https?://)?(?:www\.)?pin\.it/([A-Za-z0-9_-]+)/?'  # Alternative pin.it format
-    ]
-}
+from PIL import ImageFile
+
+
+# Platform detection patterns (kept for backward compatibility, the
+# classifier in url_classifier is the source of truth)
+PLATFORM_PATTERNS = {}
+for _platform, _kind, _pattern in URL_RULES:
+    PLATFORM_PATTERNS.setdefault(_platform, []).append(_pattern)
 
 
 def _get_random_instagram_headers():
@@ -83,37 +76,61 @@ def detect_platform(url):
     """
     Detect the platform from URL
     """
-    for platform, patterns in PLATFORM_PATTERNS.items():
-        for pattern in patterns:
-            if re.match(pattern, url, re.IGNORECASE):
-                return platform
-    return 'other'
+    return classify_url(url).platform
 
 
 def validate_url(url, platform=None):
     """
     Validate URL format for specific platform
     """
+    classified = classify_url(url)
     if not platform:
-        platform = detect_platform(url)
+        platform = classified.platform
     
     if platform == 'other':
-        return False, "Unsupported platform. Supported: Instagram, Facebook, TikTok, Pinterest"
+        return False, SUPPORTED_PLATFORMS_MESSAGE
     
-    patterns = PLATFORM_PATTERNS.get(platform, [])
-    for pattern in patterns:
-        if re.match(pattern, url, re.IGNORECASE):
-            return True, f"Valid {platform.title()} URL"
+    if classified.platform == platform or matches_platform(url, platform):
+        return True, f"Valid {platform.title()} URL"
     
     return False, f"Invalid {platform.title()} URL format"
 
 
+def get_media_key(url):
+    """
+    Canonical media ID for a URL, e.g. 'instagram:C8xYz12AbCd'
+    Built from the ID captured by the URL patterns, None if there is none
+    """
+    return classify_url(url).media_key
+
+
+def extract_media_info(ydl, url, deadline=None):
+    """
+    Extract info for a URL through the media info cache
+    Returns a JSON-safe info dict that can be passed to process_ie_result
+    """
+    cache = get_media_info_cache()
+    key = get_media_key(url)
+    
+    info = cache.get(key)
+    if info is None:
+        # Only a real extraction hits the site, wait for the host's budget
+        rate_limiter.acquire(url, max_wait=deadline.remaining() if deadline else None)
+        try:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        except Exception as e:
+            rate_limiter.observe_error(url, e)
+            raise
+        rate_limiter.report(url, False)
+        cache.set(key, info)
+    return info
+
+
 def get_platform_config(platform):
     """
     Get platform-specific yt-dlp configuration
     Enhanced for hosting environments with better error handling
     """
-    from django.conf import settings
     import random
     
     # Determine if we're in production (hosting)
@@ -134,9 +151,6 @@ def get_platform_config(platform):
         # Add geo-bypass for restricted content
         'geo_bypass': True,
         'geo_bypass_country': 'US',
-        # Add rate limiting to avoid blocks
-        'sleep_interval': 2 if is_production else 1,
-        'max_sleep_interval': 5 if is_production else 3,
         # Enable verbose logging for debugging on hosting
         'verbose': False,  # Keep false to avoid log spam
         # Add fragment retries for unstable connections
@@ -146,6 +160,8 @@ def get_platform_config(platform):
         'continuedl': True,
         # Force TLS version for better compatibility
         'http_chunk_size': 10485760 if is_production else None,  # 10MB chunks for hosting
+        # Fetch DASH/HLS fragments of long videos in parallel
+        'concurrent_fragment_downloads': segmented.get_config()['SEGMENTS'],
     }
     
     # Add proxy configuration for production environment (disabled for now)
@@ -164,8 +180,6 @@ def get_platform_config(platform):
         'instagram': {
             'http_headers': _get_random_instagram_headers(),
             # Enhanced Instagram options for hosting
-            'sleep_interval': 3 if is_production else 1,
-            'max_sleep_interval': 8 if is_production else 3,
             'extractor_args': {
                 'instagram': {
                     'api_version': 'v1',
@@ -206,88 +220,110 @@ def get_platform_config(platform):
     return config
 
 
-def download_image_from_url(video_obj, image_url, title="Unknown"):
+def apply_deadline(ydl_opts, deadline):
+    """
+    Shrink the yt-dlp timeouts and retries of ydl_opts to fit in deadline
+    Raises DeadlineExceeded if no time is left
+    """
+    socket_timeout = deadline.timeout(ydl_opts.get('socket_timeout') or 30)
+    ydl_opts['socket_timeout'] = socket_timeout
+    for option, default in (('retries', 10), ('fragment_retries', 10)):
+        ydl_opts[option] = deadline.retries(ydl_opts.get(option, default), socket_timeout)
+    
+    # Timeouts only catch a stalled socket, a slow but steady transfer is
+    # stopped by checking the deadline on every progress update
+    def check_deadline(progress):
+        if progress.get('status') == 'downloading':
+            deadline.check('download')
+    
+    ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks') or []) + [check_deadline]
+    return ydl_opts
+
+
+IMAGE_FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+def _image_ext_from_response(response, image_url):
+    """Guess the image extension from the content type or the URL"""
+    content_type = response.headers.get('content-type', '')
+    if 'jpeg' in content_type or 'jpg' in content_type:
+        return 'jpg'
+    elif 'png' in content_type:
+        return 'png'
+    elif 'webp' in content_type:
+        return 'webp'
+    
+    # Try to determine from URL
+    parsed_url = urlparse(image_url)
+    if parsed_url.path.endswith(('.jpg', '.jpeg', '.png', '.webp')):
+        return parsed_url.path.split('.')[-1]
+    return 'jpg'  # Default
+
+
+def _stream_image_to_temp(response, directory, chunk_size=64 * 1024, deadline=None):
+    """
+    Write a streamed image response to a temp file in directory
+    The first chunks are fed to an incremental PIL parser to sniff the
+    image type and dimensions without reading the file back
+    Raises DeadlineExceeded if deadline runs out during the transfer
+    Returns (temp path, PIL format or None, (width, height) or None)
+    """
+    parser = ImageFile.Parser()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if deadline is not None:
+                    deadline.check('download')
+                if not chunk:
+                    continue
+                f.write(chunk)
+                # Stop parsing as soon as the header is known
+                if parser is not None and parser.image is None:
+                    try:
+                        parser.feed(chunk)
+                    except Exception:
+                        parser = None  # Not something PIL can parse
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    
+    if parser is not None and parser.image is not None:
+        return tmp_path, parser.image.format, parser.image.size
+    return tmp_path, None, None
+
+
+def download_image_from_url(video_obj, image_url, title="Unknown", timeout=30, variant='image', deadline=None):
     """
     Download image from direct URL
     """
     try:
-        # Create media directory
-        media_path = os.path.join(settings.MEDIA_ROOT, 'downloads', video_obj.platform)
-        os.makedirs(media_path, exist_ok=True)
-        
-        # Get image
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(image_url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        # Determine file extension
-        content_type = response.headers.get('content-type', '')
-        if 'jpeg' in content_type or 'jpg' in content_type:
-            ext = 'jpg'
-        elif 'png' in content_type:
-            ext = 'png'
-        elif 'webp' in content_type:
-            ext = 'webp'
-        else:
-            # Try to determine from URL
-            parsed_url = urlparse(image_url)
-            if parsed_url.path.endswith(('.jpg', '.jpeg', '.png', '.webp')):
-                ext = parsed_url.path.split('.')[-1]
-            else:
-                ext = 'jpg'  # Default
-        
-        # Create filename
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
-        if not safe_title:
-            safe_title = "image"
-        
-        filename = f"{safe_title}.{ext}"
-        file_path = os.path.join(media_path, filename)
-        
-        # Save image
-        with open(file_path, 'wb') as f:
-            f.write(response.content)
+        # Stream the image instead of buffering it in memory, into the
+        # job's staging directory
+        response = http_client.get(image_url, timeout=timeout, stream=True)
+        try:
+            response.raise_for_status()
+            tmp_path, image_format, _ = _stream_image_to_temp(response, staging.job_dir(video_obj), deadline=deadline)
+        finally:
+            response.close()
         
-        # Verify it's a valid image
         try:
-            with Image.open(file_path) as img:
-                img.verify()
+            # Determine file extension, sniffed type first
+            ext = IMAGE_FORMAT_EXTENSIONS.get(image_format) or _image_ext_from_response(response, image_url)
+            
+            file_path = f"{os.path.splitext(tmp_path)[0]}.{ext}"
+            os.replace(tmp_path, file_path)
         except Exception:
-            # If verification fails, still consider it successful
-            pass
+            os.remove(tmp_path)
+            raise
         
-        video_obj.filename = filename
-        video_obj.file_path = file_path
         video_obj.title = title
-        video_obj.media_type = 'image'
-        video_obj.status = 'completed'
-        video_obj.completed_at = timezone.now()
-        video_obj.save()
-        
-        # Schedule automatic deletion after 10 minutes
-        try:
-            from .tasks import schedule_cleanup_after_download
-            schedule_cleanup_after_download(video_obj.id, delay_minutes=10)
-        except ImportError:
-            # If Celery is not available, use simple threading approach
-            import threading
-            import time
-            
-            def delayed_cleanup():
-                time.sleep(10 * 60)  # Wait 10 minutes
-                try:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        video_obj.file_path = ''
-                        video_obj.filename = ''
-                        video_obj.save()
-                except Exception as e:
-                    pass  # Silently ignore cleanup errors
-            
-            cleanup_thread = threading.Thread(target=delayed_cleanup, daemon=True)
-            cleanup_thread.start()
+        finish_download(video_obj, file_path, 'image', variant=variant)
         
         return True
         
@@ -298,11 +334,292 @@ def download_image_from_url(video_obj, image_url, title="Unknown"):
         return False
 
 
-def download_video(video_obj):
+def schedule_file_cleanup(video_obj, delay_minutes=10):
+    """Release the downloaded file of video_obj after delay_minutes"""
+    # The deadline is stored on the row, one scheduler thread per process
+    # releases due files in batches (see downloader.expiry)
+    schedule_expiry(video_obj, delay_minutes=delay_minutes)
+
+
+def finish_download(video_obj, file_path, media_type, variant=''):
+    """
+    Mark a download as completed with the file it produced
+    The file goes into the content store, so identical content downloaded
+    by other users is kept only once
+    """
+    store_file(video_obj, file_path, media_type, variant=variant)
+    video_obj.status = 'completed'
+    video_obj.completed_at = timezone.now()
+    video_obj.save()
+    
+    # Schedule automatic deletion after 10 minutes
+    schedule_file_cleanup(video_obj, delay_minutes=10)
+
+
+def _reuse_stored_download(video_obj):
+    """
+    Complete a download from an already stored copy of the same media
+    Only media with a platform-wide unique ID is reused, and only a blob of
+    the requested media type written by a primary strategy
+    """
+    if not classify_url(video_obj.url).is_reusable:
+        return False
+    media_type = video_obj.media_type if video_obj.media_type in ('video', 'image') else None
+    blob = find_blob(video_obj.media_key, media_type=media_type)
+    if not blob or not attach_blob(video_obj, blob):
+        # Carousel items are stored under the post's key plus their position
+        return media_type is None and reuse_carousel(video_obj)
+    
+    video_obj.status = 'completed'
+    video_obj.completed_at = timezone.now()
+    video_obj.save()
+    schedule_file_cleanup(video_obj, delay_minutes=10)
+    return True
+
+
+def _has_video_formats(info):
+    """Check whether an extracted info dict has any video formats"""
+    formats = info.get('formats') or []
+    return any(f.get('vcodec') != 'none' for f in formats)
+
+
+# Protocols of formats that are one plain file on the CDN
+PROGRESSIVE_PROTOCOLS = ('https', 'http')
+
+
+def _download_progressive(video_obj, ydl, info, fmt, deadline):
+    """
+    Fetch a progressive format (one file with audio and video, e.g. the
+    Facebook and TikTok MP4s) in parallel byte ranges, yt-dlp would use a
+    single connection. The file is named after the format so a partial one
+    resumes on the next attempt of the same format
+    Returns the file path, or None if the format isn't progressive or the
+    fetch failed and yt-dlp should download it instead
+    """
+    url = fmt.get('url')
+    if (not url or fmt.get('protocol') not in PROGRESSIVE_PROTOCOLS or fmt.get('fragments')
+            or fmt.get('vcodec') == 'none' or fmt.get('acodec') == 'none'):
+        return None
+
+    headers = dict(fmt.get('http_headers') or {})
+    cookies = ydl.cookiejar.get_cookie_header(url)
+    if cookies:
+        headers['Cookie'] = cookies
+    name = re.sub(r'[^\w.-]', '_', f"{info.get('id') or 'video'}.{fmt['format_id']}")
+    file_path = os.path.join(staging.job_dir(video_obj), f"{name}.{fmt.get('ext') or 'mp4'}")
+    try:
+        segmented.download(url, file_path, headers=headers, timeout=deadline.timeout(300), deadline=deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        return None
+    return file_path
+
+
+def _get_downloaded_filepath(ydl, result):
+    """Get the path of the file written by process_ie_result"""
+    requested = result.get('requested_downloads') or []
+    if requested and requested[0].get('filepath'):
+        return requested[0]['filepath']
+    return ydl.prepare_filename(result)
+
+
+def _download_image_from_info(video_obj, info, deadline=None):
+    """
+    Download the best image from an info dict that has no video formats
+    Marks the video as failed if no image could be found
+    """
+    def image_timeout():
+        return deadline.timeout(30) if deadline else 30
+    
+    # Look for high quality images/thumbnails
+    thumbnails = info.get('thumbnails', [])
+    
+    # Try to find the best quality image
+    best_thumb = None
+    for thumb in thumbnails:
+        if thumb.get('url'):
+            # Prefer larger images
+            if not best_thumb or ((thumb.get('width') or 0) * (thumb.get('height') or 0)) > ((best_thumb.get('width') or 0) * (best_thumb.get('height') or 0)):
+                best_thumb = thumb
+    
+    # If we found a good thumbnail/image, download it
+    if best_thumb and best_thumb.get('url'):
+        success = download_image_from_url(video_obj, best_thumb['url'], video_obj.title, timeout=image_timeout(), deadline=deadline)
+        if success:
+            return True
+    
+    # Try direct image extraction for Pinterest and other image platforms
+    if video_obj.platform in ['pinterest', 'instagram']:
+        image_url = info.get('url') or info.get('webpage_url')
+        if image_url:
+            # For Pinterest, try to extract direct image URL
+            if 'pinterest' in image_url or 'pin.it' in image_url:
+                try:
+                    # Look for Pinterest image URLs in the info
+                    info_str = str(info)
+                    
+                    # Find pinimg.com URLs (Pinterest CDN)
+                    pinimg_urls = re.findall(r'https://[^"\s]+\.pinimg\.com/[^"\s]+', info_str)
+                    for img_url in pinimg_urls:
+                        # Try different sizes: original (236x), 474x, 736x, etc.
+                        if any(size in img_url for size in ['236x', '474x', '736x', '1200x', 'originals']):
+                            if ('jpg' in img_url or 'png' in img_url or 'webp' in img_url):
+                                success = download_image_from_url(video_obj, img_url, video_obj.title, timeout=image_timeout(), deadline=deadline)
+                                if success:
+                                    return True
+                    
+                    # Try to find image URLs in different formats
+                    image_patterns = [
+                        r'https://[^"\s]+\.(jpg|jpeg|png|webp)',
+                        r'"(https://[^"]+pinimg\.com[^"]+)"',
+                        r'"url":\s*"([^"]+\.(jpg|jpeg|png|webp)[^"]*?)"'
+                    ]
+                    
+                    for pattern in image_patterns:
+                        matches = re.findall(pattern, info_str, re.IGNORECASE)
+                        for match in matches:
+                            img_url = match[0] if isinstance(match, tuple) else match
+                            if 'pinimg.com' in img_url or 'pinterest' in img_url:
+                                success = download_image_from_url(video_obj, img_url, video_obj.title, timeout=image_timeout(), deadline=deadline)
+                                if success:
+                                    return True
+                    
+                    # Also try thumbnail URLs from info
+                    if info.get('thumbnail'):
+                        success = download_image_from_url(video_obj, info['thumbnail'], video_obj.title, timeout=image_timeout(), deadline=deadline)
+                        if success:
+                            return True
+                            
+                except Exception as e:
+                    pass
+    
+    # If no image found, return error
+    video_obj.status = 'failed'
+    video_obj.error_message = f'Bu {video_obj.platform.title()} postdan video yoki rasm topilmadi. URL ni tekshiring.'
+    video_obj.save()
+    return False
+
+
+@register('ytdlp', timeout=300)
+def _ytdlp_strategy(video_obj, deadline):
+    """
+    Extract once with yt-dlp and try the planned formats in order
+    """
+    # One YoutubeDL instance and one extraction per job, the info dict is
+    # reused for the image fallback and for every format attempt.
+    # yt-dlp writes into the job's staging directory, the content store
+    # moves the finished file to its final place
+    ydl_opts = {
+        'outtmpl': os.path.join(staging.job_dir(video_obj), '%(id)s.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'playlistend': get_carousel_max_items(),
+        **get_platform_config(video_obj.platform)
+    }
+    
+    last_error = None
+    
+    try:
+        with yt_dlp.YoutubeDL(apply_deadline(ydl_opts, deadline)) as ydl:
+            info = extract_media_info(ydl, video_obj.url, deadline)
+            video_obj.title = info.get('title', 'Unknown')
+            video_obj.save()
+            
+            # Carousels and boards come back as playlists, fetch every item
+            items = items_from_info(info)
+            if items and len(items) > 1:
+                if download_carousel(video_obj, items, deadline, ydl_opts):
+                    return StrategyResult(True, final=True)
+                return StrategyResult(False, 'No carousel item could be downloaded')
+            if items:
+                info = items[0].entry
+            
+            # If no video formats, try to get image/thumbnail
+            if not _has_video_formats(info):
+                success = _download_image_from_info(video_obj, info, deadline)
+                return StrategyResult(success, video_obj.error_message, final=True)
+            
+            # Candidates ranked locally from the extracted formats
+            candidates = plan_formats(info.get('formats'), video_obj.platform)
+            
+            for fmt in candidates:
+                if deadline.expired:
+                    last_error = last_error or 'Timed out'
+                    break
+                try:
+                    # Fetch this candidate from the cached info, a failed
+                    # fetch moves on to the next one on the same instance
+                    ydl.format_selector = format_id_selector(fmt['format_id'])
+                    rate_limiter.acquire(fmt.get('url') or video_obj.url, max_wait=deadline.remaining())
+                    expected_filename = _download_progressive(video_obj, ydl, info, fmt, deadline)
+                    if expected_filename is None:
+                        result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                        # Find the downloaded file
+                        expected_filename = _get_downloaded_filepath(ydl, result)
+                    
+                    if os.path.exists(expected_filename):
+                        finish_download(video_obj, expected_filename, 'video', variant=fmt['format_id'])
+                        return StrategyResult(True, final=True)
+                        
+                except rate_limiter.RateLimited:
+                    raise
+                except Exception as e:
+                    last_error = str(e)
+                    rate_limiter.observe_error(fmt.get('url') or video_obj.url, e)
+                    # Continue to next candidate format
+                    continue
+                    
+    except Exception as e:
+        # Extraction failed, fall through to the platform specific fallbacks
+        last_error = str(e)
+    
+    return StrategyResult(False, last_error)
+
+
+def _failure_message(platform, error):
+    """User-friendly error message for a failed download"""
+    if platform == 'pinterest' and ('No video formats found' in str(error) or 'video formats' in str(error).lower()):
+        return 'Bu Pinterest post videosiz. Faqat video bor postlarni yuklab olish mumkin.'
+    if platform == 'instagram' and (error is None or is_access_error(error)):
+        return 'Bu Instagram post maxfiy, mavjud emas yoki server tomonidan bloklangan. Ochiq postlarni tanlang yoki keyinroq urinib ko\'ring.'
+    if platform == 'facebook' and ('login' in str(error).lower() or 'private' in str(error).lower()):
+        return 'Bu Facebook video maxfiy yoki mavjud emas. Ochiq videolarni tanlang.'
+    if platform == 'tiktok' and 'video' in str(error).lower():
+        return 'TikTok videosini yuklab olishda xatolik. URL ni tekshiring.'
+    return f'Yuklab olish muvaffaqiyatsiz tugadi. Xatolik: {error}'
+
+
+def _download_media(video_obj, deadline):
+    """
+    Download the media of video_obj with the platform's strategies
+    Sets the final status on video_obj, the caller saves it
+    """
+    run = run_strategies(video_obj, deadline)
+    if run.success or run.final:
+        # Done, or a strategy already set its own failure message
+        return video_obj
+    
+    video_obj.status = 'failed'
+    if not run.tried:
+        # Every strategy for this platform is failing right now, fail fast
+        video_obj.error_message = 'Yuklab olish vaqtincha ishlamayapti. Birozdan keyin qayta urinib ko\'ring.'
+    else:
+        video_obj.error_message = _failure_message(video_obj.platform, run.primary_error or run.last_error)
+    
+    return video_obj
+
+
+def download_video(video_obj, deadline=None):
     """
     Universal video downloader that handles all supported platforms
+    Every stage has to fit in deadline, by default the job's budget counted
+    from when it was accepted
     """
+    deadline = deadline or Deadline.for_job(video_obj)
     try:
+        deadline.check('queue')
+        
         # Update status to downloading
         video_obj.status = 'downloading'
         video_obj.save()
@@ -320,212 +637,40 @@ def download_video(video_obj):
             video_obj.save()
             return video_obj
         
-        # Try to get media info first
-        try:
-            info_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                **get_platform_config(video_obj.platform)
-            }
-            
-            with yt_dlp.YoutubeDL(info_opts) as ydl:
-                info = ydl.extract_info(video_obj.url, download=False)
-                video_obj.title = info.get('title', 'Unknown')
-                
-                # Check if it has video formats
-                formats = info.get('formats', [])
-                video_formats = [f for f in formats if f.get('vcodec') != 'none']
-                
-                # If no video formats, try to get image/thumbnail
-                if not video_formats:
-                    # Look for high quality images/thumbnails
-                    thumbnails = info.get('thumbnails', [])
-                    
-                    # Try to find the best quality image
-                    best_thumb = None
-                    for thumb in thumbnails:
-                        if thumb.get('url'):
-                            # Prefer larger images
-                            if not best_thumb or (thumb.get('width', 0) * thumb.get('height', 0)) > (best_thumb.get('width', 0) * best_thumb.get('height', 0)):
-                                best_thumb = thumb
-                    
-                    # If we found a good thumbnail/image, download it
-                    if best_thumb and best_thumb.get('url'):
-                        success = download_image_from_url(video_obj, best_thumb['url'], video_obj.title)
-                        if success:
-                            return video_obj
-                    
-                    # Try direct image extraction for Pinterest and other image platforms
-                    if video_obj.platform in ['pinterest', 'instagram']:
-                        image_url = info.get('url') or info.get('webpage_url')
-                        if image_url:
-                            # For Pinterest, try to extract direct image URL
-                            if 'pinterest' in image_url or 'pin.it' in image_url:
-                                try:
-                                    # Pinterest specific image extraction
-                                    import re
-                                    
-                                    # Look for Pinterest image URLs in the info
-                                    info_str = str(info)
-                                    
-                                    # Find pinimg.com URLs (Pinterest CDN)
-                                    pinimg_urls = re.findall(r'https://[^"\s]+\.pinimg\.com/[^"\s]+', info_str)
-                                    for img_url in pinimg_urls:
-                                        # Try different sizes: original (236x), 474x, 736x, etc.
-                                        if any(size in img_url for size in ['236x', '474x', '736x', '1200x', 'originals']):
-                                            if ('jpg' in img_url or 'png' in img_url or 'webp' in img_url):
-                                                success = download_image_from_url(video_obj, img_url, video_obj.title)
-                                                if success:
-                                                    return video_obj
-                                    
-                                    # Try to find image URLs in different formats
-                                    image_patterns = [
-                                        r'https://[^"\s]+\.(jpg|jpeg|png|webp)',
-                                        r'"(https://[^"]+pinimg\.com[^"]+)"',
-                                        r'"url":\s*"([^"]+\.(jpg|jpeg|png|webp)[^"]*?)"'
-                                    ]
-                                    
-                                    for pattern in image_patterns:
-                                        matches = re.findall(pattern, info_str, re.IGNORECASE)
-                                        for match in matches:
-                                            img_url = match[0] if isinstance(match, tuple) else match
-                                            if 'pinimg.com' in img_url or 'pinterest' in img_url:
-                                                success = download_image_from_url(video_obj, img_url, video_obj.title)
-                                                if success:
-                                                    return video_obj
-                                    
-                                    # Also try thumbnail URLs from info
-                                    if info.get('thumbnail'):
-                                        success = download_image_from_url(video_obj, info['thumbnail'], video_obj.title)
-                                        if success:
-                                            return video_obj
-                                            
-                                except Exception as e:
-                                    pass
-                    
-                    # If no image found, return error
-                    video_obj.status = 'failed'
-                    video_obj.error_message = f'Bu {video_obj.platform.title()} postdan video yoki rasm topilmadi. URL ni tekshiring.'
-                    video_obj.save()
-                    return video_obj
-                    
-        except Exception as e:
-            # If info extraction fails, continue with regular download attempt
-            pass
-        
-        # Create media directory if it doesn't exist
-        media_path = os.path.join(settings.MEDIA_ROOT, 'downloads', video_obj.platform)
-        os.makedirs(media_path, exist_ok=True)
+        # Expand short links so the media ID is known before extraction
+        deadline.check('resolve')
+        video_obj.url = resolve_short_link(video_obj.url)
         
-        # Get platform-specific configuration
-        platform_config = get_platform_config(video_obj.platform)
-        
-        # Try different format options in order of preference
-        format_options = [
-            'best[height<=720]/best',  # Prefer 720p or lower, fallback to best
-            'best[height<=1080]/best',  # Prefer 1080p or lower, fallback to best
-            'best',  # Just best available
-            'worst',  # Last resort
-        ]
-        
-        download_success = False
-        last_error = None
+        # Reuse the file if someone already downloaded this media
+        video_obj.media_key = get_media_key(video_obj.url) or ''
+        if _reuse_stored_download(video_obj):
+            return video_obj
         
-        for format_selector in format_options:
-            try:
-                # Configure yt-dlp options
-                ydl_opts = {
-                    'outtmpl': os.path.join(media_path, '%(title)s.%(ext)s'),
-                    'format': format_selector,
-                    **platform_config
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    # Get video info first (only on first attempt)
-                    if not video_obj.title or video_obj.title == 'Unknown':
-                        info = ydl.extract_info(video_obj.url, download=False)
-                        video_obj.title = info.get('title', 'Unknown')
-                        video_obj.save()
-                    else:
-                        info = ydl.extract_info(video_obj.url, download=False)
-                    
-                    # Download the video
-                    ydl.download([video_obj.url])
-                    
-                    # Find the downloaded file
-                    expected_filename = ydl.prepare_filename(info)
-                    if os.path.exists(expected_filename):
-                        video_obj.filename = os.path.basename(expected_filename)
-                        video_obj.file_path = expected_filename
-                        video_obj.media_type = 'video'
-                        video_obj.status = 'completed'
-                        video_obj.completed_at = timezone.now()
-                        video_obj.save()
-                        
-                        # Schedule automatic deletion after 10 minutes
-                        try:
-                            from .tasks import schedule_cleanup_after_download
-                            schedule_cleanup_after_download(video_obj.id, delay_minutes=10)
-                        except ImportError:
-                            # If Celery is not available, use simple threading approach
-                            import threading
-                            import time
-                            
-                            def delayed_cleanup():
-                                time.sleep(10 * 60)  # Wait 10 minutes
-                                try:
-                                    if os.path.exists(expected_filename):
-                                        os.remove(expected_filename)
-                                        video_obj.file_path = ''
-                                        video_obj.filename = ''
-                                        video_obj.save()
-                                except Exception as e:
-                                    pass  # Silently ignore cleanup errors
-                            
-                            cleanup_thread = threading.Thread(target=delayed_cleanup, daemon=True)
-                            cleanup_thread.start()
-                        
-                        download_success = True
-                        break
-                    
-            except Exception as e:
-                last_error = str(e)
-                # Continue to next format option
-                continue
+        # Concurrent jobs for the same media are parked until the first one
+        # is done, then run again and reuse its file
+        with single_flight(video_obj.media_key) as leader:
+            if not leader:
+                if park(video_obj, video_obj.media_key):
+                    return video_obj
+                # The leader finished in the meantime
+                if _reuse_stored_download(video_obj):
+                    return video_obj
+            deadline.check('download')
+            _download_media(video_obj, deadline)
         
-        if not download_success:
-            video_obj.status = 'failed'
-            # Provide user-friendly error messages
-            if video_obj.platform == 'pinterest' and ('No video formats found' in str(last_error) or 'video formats' in str(last_error).lower()):
-                video_obj.error_message = 'Bu Pinterest post videosiz. Faqat video bor postlarni yuklab olish mumkin.'
-            elif video_obj.platform == 'instagram' and ('login' in str(last_error).lower() or 'private' in str(last_error).lower() or 'not available' in str(last_error).lower()):
-                # Try bypass methods specifically designed for hosting
-                try:
-                    from .instagram_bypass import download_instagram_content_bypass
-                    bypass_success, bypass_message = download_instagram_content_bypass(video_obj)
-                    if bypass_success:
-                        return video_obj
-                except ImportError:
-                    pass
-                    
-                # Try alternative Instagram extraction methods as fallback
-                try:
-                    alternative_success = _try_alternative_instagram_download(video_obj)
-                    if alternative_success:
-                        return video_obj
-                except Exception:
-                    pass
-                video_obj.error_message = 'Bu Instagram post maxfiy, mavjud emas yoki server tomonidan bloklangan. Ochiq postlarni tanlang yoki keyinroq urinib ko\'ring.'
-            elif video_obj.platform == 'facebook' and ('login' in str(last_error).lower() or 'private' in str(last_error).lower()):
-                video_obj.error_message = 'Bu Facebook video maxfiy yoki mavjud emas. Ochiq videolarni tanlang.'
-            elif video_obj.platform == 'tiktok' and 'video' in str(last_error).lower():
-                video_obj.error_message = 'TikTok videosini yuklab olishda xatolik. URL ni tekshiring.'
-            else:
-                video_obj.error_message = f'Yuklab olish muvaffaqiyatsiz tugadi. Xatolik: {last_error}'
-                
+    except DeadlineExceeded:
+        video_obj.status = 'failed'
+        video_obj.error_message = 'Yuklab olish uchun ajratilgan vaqt tugadi. Keyinroq qayta urinib ko\'ring.'
     except Exception as e:
         video_obj.status = 'failed'
         video_obj.error_message = f'Download failed: {str(e)}'
+    finally:
+        # Finished files were published. A failed job that left a partial
+        # download goes back to the queue and keeps it for the resume
+        # (recover_staging removes it if the job never runs again), what is
+        # left of any other job is discarded
+        if not requeue_for_resume(video_obj):
+            staging.discard(video_obj)
     
     video_obj.save()
     return video_obj
@@ -546,169 +691,147 @@ def download_instagram_video(video_obj):
 def get_available_formats(url):
     """
     Get available formats for a video URL (for debugging)
+    Also shows the order the format planner would try them in
     """
     try:
+        url = resolve_short_link(url)
+        platform = detect_platform(url)
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
-            'listformats': True,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            },
+            **get_platform_config(platform)
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            info = extract_media_info(ydl, url)
             formats = info.get('formats', [])
+            plan = plan_formats(formats, platform)
             return {
-                'formats': [
-                    {
-                        'format_id': f.get('format_id', 'unknown'),
-                        'ext': f.get('ext', 'unknown'),
-                        'resolution': f.get('resolution', 'unknown'),
-                        'filesize': f.get('filesize', 0),
-                    }
-                    for f in formats
-                ],
-                'format_count': len(formats)
+                'formats': [describe_format(f) for f in formats],
+                'format_count': len(formats),
+                'platform': platform,
+                'plan': [describe_format(f) for f in plan],
             }
     except Exception as e:
         return {'error': str(e)}
 
 
-def _try_alternative_instagram_download(video_obj):
+# Instagram mobile app and mobile browser configs for the ytdlp_mobile strategy
+INSTAGRAM_MOBILE_CONFIGS = [
+    {
+        'http_headers': {
+            'User-Agent': 'Instagram 302.0.0.23.109 Android (33/13; 420dpi; 1080x2400; samsung; SM-G991B; o1s; qcom; en_US; 511558019)',
+            'X-Instagram-AJAX': '1',
+            'X-Requested-With': 'XMLHttpRequest',
+            'Accept': '*/*',
+            'Accept-Language': 'en-US,en;q=0.9'
+        },
+        'extractor_args': {'instagram': {'variant': 'mobile', 'api_version': 'v1'}},
+    },
+    {
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Linux; Android 12; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Mobile Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Referer': 'https://www.instagram.com/'
+        },
+    }
+]
+
+# Low quality formats, they are the least likely to be blocked on hosting
+MOBILE_FORMAT_SELECTORS = ['worst[ext=mp4]', 'worst']
+
+
+@register('ytdlp_mobile', timeout=180, fallback=True)
+def _ytdlp_mobile_strategy(video_obj, deadline):
     """
-    Try multiple alternative methods to download Instagram content when main method fails
-    Enhanced for hosting environments with multiple fallback strategies
+    yt-dlp with Instagram mobile app and mobile browser headers
     """
-    import time
-    import random
-    from django.conf import settings
-    
-    try:
-        # Wait to avoid rate limiting
-        time.sleep(random.uniform(2, 5))
-        
-        media_path = os.path.join(settings.MEDIA_ROOT, 'downloads', video_obj.platform)
-        os.makedirs(media_path, exist_ok=True)
-        
-        # Strategy 1: Try with Instagram mobile app user agents
-        mobile_configs = [
-            {
-                'http_headers': {
-                    'User-Agent': 'Instagram 302.0.0.23.109 Android (33/13; 420dpi; 1080x2400; samsung; SM-G991B; o1s; qcom; en_US; 511558019)',
-                    'X-Instagram-AJAX': '1',
-                    'X-Requested-With': 'XMLHttpRequest',
-                    'Accept': '*/*',
-                    'Accept-Language': 'en-US,en;q=0.9'
-                },
-                'extractor_args': {'instagram': {'variant': 'mobile', 'api_version': 'v1'}},
-                'format': 'worst[height<=360]/worst'  # Very low quality for hosting
-            },
-            {
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Linux; Android 12; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Mobile Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Referer': 'https://www.instagram.com/'
-                },
-                'format': 'best[height<=480]/worst'
-            }
-        ]
-        
-        # Strategy 2: Try with different format selectors
-        format_strategies = [
-            'worst[ext=mp4]',
-            'worst',
-            'best[height<=240]',
-            'best[height<=360]',
-            'best[filesize<=10M]'
-        ]
+    last_error = None
+    for config in INSTAGRAM_MOBILE_CONFIGS:
+        base_opts = {
+            'outtmpl': os.path.join(staging.job_dir(video_obj), '%(id)s.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True,
+            'socket_timeout': 90,  # Longer timeout for hosting
+            'retries': 8,
+            'fragment_retries': 15,
+            'skip_unavailable_fragments': True,
+            'geo_bypass': True,
+            'geo_bypass_country': 'US',
+            'prefer_ipv4': True,
+            **config
+        }
         
-        # Try each mobile config
-        for i, config in enumerate(mobile_configs):
-            try:
-                base_opts = {
-                    'outtmpl': os.path.join(media_path, '%(title)s.%(ext)s'),
-                    'quiet': True,
-                    'no_warnings': True,
-                    'socket_timeout': 90,  # Longer timeout for hosting
-                    'retries': 8,
-                    'fragment_retries': 15,
-                    'skip_unavailable_fragments': True,
-                    'geo_bypass': True,
-                    'geo_bypass_country': 'US',
-                    'prefer_ipv4': True,
-                    'sleep_interval': 4,
-                    'max_sleep_interval': 8,
-                    **config
-                }
+        if deadline.expired:
+            return StrategyResult(False, last_error or 'Timed out')
+        try:
+            with yt_dlp.YoutubeDL(apply_deadline(base_opts, deadline)) as ydl:
+                # Extract again with the mobile headers, the cached extraction
+                # of the ytdlp strategy has the desktop format URLs and headers
+                rate_limiter.acquire(video_obj.url, max_wait=deadline.remaining())
+                try:
+                    info = ydl.sanitize_info(ydl.extract_info(video_obj.url, download=False))
+                except Exception as e:
+                    rate_limiter.observe_error(video_obj.url, e)
+                    raise
+                rate_limiter.report(video_obj.url, False)
+                video_obj.title = info.get('title', 'Instagram Video')
                 
-                # Try different formats with this config
-                for format_sel in format_strategies[:2]:  # Limit attempts
+                for format_sel in MOBILE_FORMAT_SELECTORS:
+                    if deadline.expired:
+                        return StrategyResult(False, last_error or 'Timed out')
                     try:
-                        ydl_opts = {**base_opts, 'format': format_sel}
-                        
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            info = ydl.extract_info(video_obj.url, download=False)
-                            video_obj.title = info.get('title', 'Instagram Video')
-                            
-                            # Try to download
-                            ydl.download([video_obj.url])
-                            
-                            # Find the downloaded file
-                            expected_filename = ydl.prepare_filename(info)
-                            if os.path.exists(expected_filename):
-                                video_obj.filename = os.path.basename(expected_filename)
-                                video_obj.file_path = expected_filename
-                                video_obj.media_type = 'video'
-                                video_obj.status = 'completed'
-                                video_obj.completed_at = timezone.now()
-                                video_obj.save()
-                                return True
-                                
-                        # Wait between format attempts
-                        time.sleep(random.uniform(3, 6))
+                        ydl.format_selector = ydl.build_format_selector(format_sel)
+                        result = ydl.process_ie_result(copy.deepcopy(info), download=True)
                         
+                        # Find the downloaded file
+                        expected_filename = _get_downloaded_filepath(ydl, result)
+                        if os.path.exists(expected_filename):
+                            finish_download(video_obj, expected_filename, 'video', variant=fallback_variant(format_sel))
+                            return StrategyResult(True)
                     except Exception as e:
-                        continue
-                
-                # Wait between config attempts
-                time.sleep(random.uniform(5, 8))
-                
-            except Exception as e:
-                continue
-        
-        # Strategy 3: Try image extraction if video fails
-        try:
-            info_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'http_headers': _get_random_instagram_headers(),
-                'socket_timeout': 60,
-                'prefer_ipv4': True,
-                'geo_bypass': True
-            }
-            
-            with yt_dlp.YoutubeDL(info_opts) as ydl:
-                info = ydl.extract_info(video_obj.url, download=False)
-                
-                # Look for thumbnails/images
-                thumbnails = info.get('thumbnails', [])
-                if thumbnails:
-                    # Get the best quality thumbnail
-                    best_thumb = max(thumbnails, key=lambda x: x.get('width', 0) * x.get('height', 0))
-                    if best_thumb.get('url'):
-                        success = download_image_from_url(video_obj, best_thumb['url'], info.get('title', 'Instagram Image'))
-                        if success:
-                            return True
-        except Exception:
-            pass
-                
-        return False
-        
+                        last_error = str(e)
+                        
+        except Exception as e:
+            last_error = str(e)
+            continue
+    
+    return StrategyResult(False, last_error or 'Mobile download failed')
+
+
+@register('thumbnail', timeout=60, fallback=True)
+def _thumbnail_strategy(video_obj, deadline):
+    """
+    Download the best thumbnail when no video could be fetched
+    """
+    info_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'http_headers': _get_random_instagram_headers(),
+        'socket_timeout': 60,
+        'prefer_ipv4': True,
+        'geo_bypass': True
+    }
+    
+    try:
+        with yt_dlp.YoutubeDL(apply_deadline(info_opts, deadline)) as ydl:
+            info = extract_media_info(ydl, video_obj.url, deadline)
     except Exception as e:
-        return False
+        return StrategyResult(False, str(e))
+    
+    # Look for thumbnails/images
+    thumbnails = [t for t in info.get('thumbnails', []) if t.get('url')]
+    if not thumbnails:
+        return StrategyResult(False, 'No thumbnail found')
+    
+    # Get the best quality thumbnail
+    best_thumb = max(thumbnails, key=lambda x: (x.get('width') or 0) * (x.get('height') or 0))
+    if download_image_from_url(video_obj, best_thumb['url'], info.get('title', 'Instagram Image'),
+                               timeout=deadline.timeout(30), variant=fallback_variant('thumbnail'),
+                               deadline=deadline):
+        return StrategyResult(True)
+    return StrategyResult(False, 'Thumbnail download failed')
 
 
 def get_video_info(url):
@@ -716,6 +839,7 @@ def get_video_info(url):
     Get video information without downloading
     """
     try:
+        url = resolve_short_link(url)
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
@@ -726,7 +850,7 @@ def get_video_info(url):
         }
         
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+            info = extract_media_info(ydl, url)
             return {
                 'title': info.get('title', 'Unknown'),
                 'duration': info.get('duration', 0),
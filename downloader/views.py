@@ -3,19 +3,23 @@ from django.contrib import messages
 from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView, LogoutView
-from django.http import JsonResponse, FileResponse, Http404
+from django.http import JsonResponse, Http404
+from django.template.loader import render_to_string
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, CreateView
 from django.urls import reverse_lazy
 import os
-import threading
 import logging
 from django.utils import timezone
 
-from .models import DownloadedVideo, TelegramOTP, TelegramUser
+from .models import DownloadedVideo, MediaAsset, TelegramOTP, TelegramUser
 from .forms import VideoDownloadForm, CustomUserCreationForm
-from .utils import download_video, get_video_info, detect_platform
+from .utils import get_video_info, get_available_formats, detect_platform
+from .executor import submit_download, queue_overflow_to_workers, DownloadQueueFull
+from .pagination import download_stats, downloads_page
+from .sendfile import serve_file
+from .status_updates import job_payload, parse_known, wait_for_changes
 from .telegram_utils import telegram_service
 
 logger = logging.getLogger(__name__)
@@ -36,10 +40,19 @@ def home(request):
             video.media_type = 'unknown'  # Will be determined during download
             video.save()
             
-            # Start download in background thread
-            thread = threading.Thread(target=download_video, args=(video,))
-            thread.daemon = True
-            thread.start()
+            # Queue download on the shared worker pool
+            try:
+                submit_download(video)
+            except DownloadQueueFull:
+                if queue_overflow_to_workers():
+                    # Row stays pending, a download worker will pick it up
+                    messages.info(request, f'Yuklab olish navbatga qo\'yildi: {video.url}')
+                    return redirect('download_status', pk=video.pk)
+                video.status = 'failed'
+                video.error_message = 'Server hozir band. Iltimos, birozdan keyin qaytadan urinib ko\'ring.'
+                video.save()
+                messages.error(request, video.error_message)
+                return redirect('download_status', pk=video.pk)
             
             messages.success(request, f'Download started for: {video.url}')
             return redirect('download_status', pk=video.pk)
@@ -63,9 +76,51 @@ def download_status(request, pk):
 
 @login_required
 def download_list(request):
-    """List all downloads for the current user"""
-    downloads = DownloadedVideo.objects.filter(user=request.user)
-    return render(request, 'downloader/list.html', {'downloads': downloads})
+    """List the downloads of the current user, one keyset page at a time"""
+    user_downloads = DownloadedVideo.objects.filter(user=request.user)
+    try:
+        downloads, next_cursor = downloads_page(user_downloads, request.GET.get('cursor'))
+    except ValueError:
+        raise Http404("Invalid cursor")
+
+    # The totals are shown above the first page only
+    stats = None if request.GET.get('cursor') else download_stats(request.user)
+    return render(request, 'downloader/list.html', {
+        'downloads': downloads,
+        'next_cursor': next_cursor,
+        'stats': stats,
+    })
+
+
+@login_required
+def download_list_api(request):
+    """JSON page of download_list for infinite scroll"""
+    try:
+        downloads, next_cursor = downloads_page(
+            DownloadedVideo.objects.filter(user=request.user), request.GET.get('cursor')
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'downloads': [
+            {
+                'id': download.pk,
+                'title': download.title,
+                'filename': download.filename,
+                'media_type': download.media_type,
+                'platform': download.platform,
+                'url': download.url,
+                'status': download.status,
+                'error_message': download.error_summary,
+                'created_at': download.created_at.isoformat(),
+                'completed_at': download.completed_at.isoformat() if download.completed_at else None,
+            }
+            for download in downloads
+        ],
+        'html': render_to_string('downloader/download_rows.html', {'downloads': downloads}, request=request),
+        'next_cursor': next_cursor,
+    })
 
 
 @login_required
@@ -79,11 +134,24 @@ def download_file(request, pk):
     if not os.path.exists(video.file_path):
         raise Http404("File not found")
     
-    return FileResponse(
-        open(video.file_path, 'rb'),
-        as_attachment=True,
-        filename=video.filename
-    )
+    # Ownership is checked above, the bytes may be sent by the web server
+    return serve_file(video.file_path, video.filename)
+
+
+@login_required
+def download_asset(request, pk, position):
+    """Download one item of a carousel"""
+    video = get_object_or_404(DownloadedVideo, pk=pk, user=request.user)
+    asset = get_object_or_404(MediaAsset, video=video, position=position)
+    
+    if video.status != 'completed' or not asset.file_path:
+        raise Http404("File not available")
+    
+    if not os.path.exists(asset.file_path):
+        raise Http404("File not found")
+    
+    # Ownership is checked above, the bytes may be sent by the web server
+    return serve_file(asset.file_path, asset.filename)
 
 
 @login_required
@@ -91,13 +159,20 @@ def download_file(request, pk):
 def check_status(request, pk):
     """AJAX endpoint to check download status"""
     video = get_object_or_404(DownloadedVideo, pk=pk, user=request.user)
-    return JsonResponse({
-        'status': video.status,
-        'title': video.title,
-        'filename': video.filename,
-        'error_message': video.error_message,
-        'completed_at': video.completed_at.isoformat() if video.completed_at else None,
-    })
+    return JsonResponse(job_payload(video))
+
+
+@login_required
+def status_updates(request):
+    """
+    Long-poll endpoint: ?jobs=id:status,... blocks until one of the jobs no
+    longer has the given status and returns all the changed ones
+    """
+    try:
+        known = parse_known(request.GET.get('jobs'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'jobs': wait_for_changes(request.user, known)})
 
 
 @csrf_exempt
@@ -111,6 +186,17 @@ def preview_video(request):
     return JsonResponse({'error': 'Invalid request'})
 
 
+@login_required
+@csrf_exempt
+def available_formats(request):
+    """AJAX endpoint listing formats and the planner's download order (for debugging)"""
+    if request.method == 'POST':
+        url = request.POST.get('url')
+        if url:
+            return JsonResponse(get_available_formats(url))
+    return JsonResponse({'error': 'Invalid request'})
+
+
 class CustomLoginView(LoginView):
     template_name = 'registration/login.html'
     redirect_authenticated_user = True
@@ -98,6 +98,29 @@ DATABASES = {
     }
 }
 
+# 'shared' is seen by every process (web server, download workers, Celery):
+# rate limiter buckets, circuit breakers and strategy metrics live there.
+# A database table by default (created by the downloader migrations), Redis
+# when SHARED_CACHE_URL is set, e.g. redis://localhost:6379/1
+if os.getenv('SHARED_CACHE_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('SHARED_CACHE_URL'),
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'downloader_shared_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': SHARED_CACHE,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -149,6 +172,14 @@ os.makedirs(MEDIA_ROOT / 'downloads' / 'facebook', exist_ok=True)
 os.makedirs(MEDIA_ROOT / 'downloads' / 'tiktok', exist_ok=True)
 os.makedirs(MEDIA_ROOT / 'downloads' / 'pinterest', exist_ok=True)
 
+# How downloads are sent to the browser, ownership is always checked in Django
+#  'python'    stream from Django (sendfile(2) under gunicorn/uWSGI)
+#  'nginx'     X-Accel-Redirect to SENDFILE_URL, an internal location:
+#                  location /protected/ { internal; alias /path/to/media/; }
+#  'xsendfile' X-Sendfile with the file path (Apache mod_xsendfile, lighttpd)
+SENDFILE_BACKEND = os.getenv('SENDFILE_BACKEND', 'python')
+SENDFILE_URL = '/protected/'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -166,6 +197,110 @@ LOGOUT_REDIRECT_URL = '/'
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8276877025:AAFFPx5w397Zris6iSzFCe4cs6yrcwnnx0E')
 TELEGRAM_BOT_USERNAME = os.getenv('TELEGRAM_BOT_USERNAME', 'social_downloader_site_bot')
 
+# Download worker pool (per process)
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+DOWNLOAD_QUEUE_SIZE = int(os.getenv('DOWNLOAD_QUEUE_SIZE', '50'))
+# 'reject' fails jobs when the local backlog is full, 'queue' leaves them
+# pending for `manage.py run_download_worker` processes
+DOWNLOAD_QUEUE_OVERFLOW = os.getenv('DOWNLOAD_QUEUE_OVERFLOW', 'reject')
+DOWNLOAD_LEASE_SECONDS = 120
+DOWNLOAD_MAX_ATTEMPTS = 3
+
+# End-to-end budget of a download job in seconds, counted from when it was
+# accepted. Every stage shrinks its timeouts and retries to what is left
+DOWNLOAD_JOB_DEADLINE = int(os.getenv('DOWNLOAD_JOB_DEADLINE', '600'))
+
+# Completed files are released by one expiry thread per process, in batches
+# of FILE_EXPIRY_BATCH_SIZE. Deadlines set by other processes are picked up
+# every FILE_EXPIRY_POLL_INTERVAL seconds
+FILE_EXPIRY_BATCH_SIZE = 200
+FILE_EXPIRY_POLL_INTERVAL = 60
+
+# cleanup_files / cleanup_old_files release rows in chunks of CLEANUP_CHUNK_SIZE
+# and delete their files on CLEANUP_WORKERS threads
+CLEANUP_CHUNK_SIZE = 500
+CLEANUP_WORKERS = 8
+
+# Downloads per page of download_list and of its JSON variant (keyset paginated)
+DOWNLOAD_LIST_PAGE_SIZE = 50
+# Per-status totals above the first page are cached in CACHES[DOWNLOAD_STATS_CACHE]
+# for DOWNLOAD_STATS_TTL seconds
+DOWNLOAD_STATS_CACHE = 'shared'
+DOWNLOAD_STATS_TTL = 30
+
+# api/status/ long-poll: a request waits up to STATUS_LONG_POLL_TIMEOUT seconds
+# for a status change. It reads the status version in CACHES[STATUS_UPDATES_CACHE]
+# every STATUS_POLL_INTERVAL seconds and queries the database when it moved, or
+# every STATUS_DB_POLL_INTERVAL seconds regardless. Every waiting browser tab
+# holds a server thread, run a threaded server (gunicorn --worker-class gthread)
+# in production
+STATUS_LONG_POLL_TIMEOUT = 25
+STATUS_POLL_INTERVAL = 1
+STATUS_DB_POLL_INTERVAL = 5
+STATUS_UPDATES_CACHE = 'shared'
+
+# Extracted media metadata cache, keyed by canonical media ID
+# BACKEND: 'local' (per process), 'django' (CACHES[ALIAS]) or 'redis' (LOCATION)
+MEDIA_INFO_CACHE = {
+    'BACKEND': os.getenv('MEDIA_INFO_CACHE_BACKEND', 'local'),
+    'LOCATION': os.getenv('MEDIA_INFO_CACHE_LOCATION', 'redis://localhost:6379/0'),
+    'TTL': 300,  # Signed CDN URLs expire, keep this short
+    'MAX_ENTRIES': 1000,
+}
+
+# How long resolved short links (pin.it, vm.tiktok.com, fb.watch) are kept,
+# and links that failed to resolve before they are tried again
+SHORT_LINK_TTL = 24 * 60 * 60
+SHORT_LINK_NEGATIVE_TTL = 5 * 60
+
+# Carousels, sidecars and boards: items downloaded at once per job, and the
+# most items taken from one post
+CAROUSEL_CONCURRENCY = 4
+CAROUSEL_MAX_ITEMS = 20
+
+# Direct media URLs are fetched in SEGMENTS parallel byte ranges into a
+# preallocated file, partial files are resumed on the next attempt
+SEGMENTED_DOWNLOAD = {
+    'SEGMENTS': 4,
+    'MIN_SEGMENT_SIZE': 4 * 1024 * 1024,
+    'BUFFER_SIZE': 1024 * 1024,
+}
+
+# Shared HTTP client for direct fetches (images, CDN files, Telegram API)
+# HOSTS entries override the per-host pool size and (connect, read) timeout
+HTTP_CLIENT = {
+    'POOL_MAXSIZE': 10,
+    'TIMEOUT': (10, 30),
+    'HOSTS': {},
+}
+
+# Per-host token buckets (requests per second, burst), overrides the defaults
+# in downloader/rate_limiter.py. Buckets live in CACHES[RATE_LIMIT_CACHE],
+# which has to be shared so every process draws from the same budget
+RATE_LIMITS = {}
+RATE_LIMIT_CACHE = 'shared'
+RATE_LIMIT_MAX_WAIT = 60
+
+# Circuit breaker per (platform, download strategy), see downloader/circuit_breaker.py
+# Its state lives in CACHES[CACHE], shared so every process sees an open circuit
+CIRCUIT_BREAKER = {
+    'WINDOW': 20,
+    'MIN_CALLS': 5,
+    'FAILURE_RATE': 0.8,
+    'COOLDOWN': 120,
+    'CACHE': 'shared',
+}
+
+# Download strategies per platform in the order they are tried, and their
+# timeout budgets in seconds (see downloader/strategies.py for the defaults).
+# Latency/success histograms (kept in CACHES[STRATEGY_METRICS_CACHE], shared so
+# the runs of every process add up): python manage.py strategy_stats
+DOWNLOAD_STRATEGIES = {
+    'instagram': ['ytdlp', 'embed', 'api', 'ytdlp_mobile', 'thumbnail'],
+}
+STRATEGY_TIMEOUTS = {}
+STRATEGY_METRICS_CACHE = 'shared'
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -8,8 +8,8 @@ import os
 import sys
 import django
 import logging
-import threading
-from telegram import Update, Bot, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+import asyncio
+from telegram import Update, Bot, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, InputMediaPhoto, InputMediaVideo
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from asgiref.sync import sync_to_async
 
@@ -19,7 +19,9 @@ django.setup()
 
 # Import Django models after setup
 from downloader.models import TelegramUser, DownloadedVideo
-from downloader.utils import detect_platform, validate_url, download_video
+from downloader.url_classifier import classify_url
+from downloader.executor import submit_download, DownloadQueueFull
+from downloader.deadline import Deadline
 from django.contrib.auth.models import User
 
 # Configure logging
@@ -188,8 +190,9 @@ class SimpleWorkingBot:
             )
             return
         
-        # Detect platform
-        platform = detect_platform(url)
+        # Detect platform and validate URL in one pass
+        classified = classify_url(url)
+        platform = classified.platform
         
         if platform == 'other':
             await update.message.reply_text(
@@ -203,15 +206,6 @@ class SimpleWorkingBot:
             )
             return
         
-        # Validate URL
-        is_valid, message = validate_url(url, platform)
-        if not is_valid:
-            await update.message.reply_text(
-                f"❌ {message}\n\n"
-                "Please check your URL and try again."
-            )
-            return
-        
         # Send processing message
         processing_msg = await update.message.reply_text(
             f"🚀 Processing {platform.title()} video...\n"
@@ -229,11 +223,23 @@ class SimpleWorkingBot:
                 status='pending'
             )
             
-            # Start download in background
+            # Queue the download on the shared worker pool
+            try:
+                future = await sync_to_async(submit_download)(video_obj)
+            except DownloadQueueFull:
+                video_obj.status = 'failed'
+                video_obj.error_message = 'Server hozir band. Iltimos, birozdan keyin qaytadan urinib ko\'ring.'
+                await sync_to_async(video_obj.save)()
+                await processing_msg.edit_text(
+                    "⏳ Server hozir band!\n\n"
+                    "Iltimos, birozdan keyin qaytadan urinib ko'ring."
+                )
+                return
+            
             async def download_and_notify():
                 try:
-                    # Run the sync download function in a thread
-                    result = await sync_to_async(download_video)(video_obj)
+                    result = await asyncio.wrap_future(future)
+                    result = await self.wait_for_parked_job(result)
                     await self.send_download_result(update, processing_msg, result)
                 except Exception as e:
                     await processing_msg.edit_text(
@@ -241,8 +247,6 @@ class SimpleWorkingBot:
                         "Please try again or contact support."
                     )
             
-            # Schedule the download task
-            import asyncio
             asyncio.create_task(download_and_notify())
             
         except Exception as e:
@@ -251,10 +255,56 @@ class SimpleWorkingBot:
                 "Please try again or contact support."
             )
     
+    async def wait_for_parked_job(self, video_obj):
+        """
+        A job for media another job is already downloading comes back parked
+        (pending), wait until it was run again and reused that download
+        """
+        deadline = Deadline.for_job(video_obj)
+        while video_obj.status in ('pending', 'downloading') and not deadline.expired:
+            await asyncio.sleep(2)
+            video_obj = await sync_to_async(DownloadedVideo.objects.get)(pk=video_obj.pk)
+        return video_obj
+    
+    async def send_media_group(self, update: Update, video_obj, assets):
+        """Send the items of a carousel as albums (Telegram allows 10 per album)"""
+        caption = (f"✅ {video_obj.platform.title()}dan {len(assets)} ta fayl yuklab olindi!\n\n"
+                   f"📝 Sarlavha: {video_obj.title}")
+        for start in range(0, len(assets), 10):
+            files = []
+            media = []
+            try:
+                for asset in assets[start:start + 10]:
+                    media_file = open(asset.file_path, 'rb')
+                    files.append(media_file)
+                    item_caption = caption if not media else None
+                    if asset.media_type == 'image':
+                        media.append(InputMediaPhoto(media_file, caption=item_caption))
+                    else:
+                        media.append(InputMediaVideo(media_file, caption=item_caption))
+                await update.message.reply_media_group(media=media)
+            finally:
+                for media_file in files:
+                    media_file.close()
+            caption = None
+    
     async def send_download_result(self, update: Update, processing_msg, video_obj):
         """Send download result to user"""
         try:
-            if video_obj.status == 'completed' and video_obj.file_path and os.path.exists(video_obj.file_path):
+            assets = await sync_to_async(list)(video_obj.assets.all()) if video_obj.status == 'completed' else []
+            assets = [asset for asset in assets if asset.file_path and os.path.exists(asset.file_path)]
+            if len(assets) > 1:
+                try:
+                    await self.send_media_group(update, video_obj, assets)
+                    await processing_msg.delete()
+                except Exception as e:
+                    await processing_msg.edit_text(
+                        f"✅ {len(assets)} ta fayl yuklab olindi!\n\n"
+                        f"📝 Sarlavha: {video_obj.title}\n\n"
+                        f"⚠️ Could not send files (too large or format issue)\n"
+                        f"🌐 Access via web: http://127.0.0.1:8001/"
+                    )
+            elif video_obj.status == 'completed' and video_obj.file_path and os.path.exists(video_obj.file_path):
                 # Try to send media file (video or image)
                 try:
                     with open(video_obj.file_path, 'rb') as media_file:
@@ -270,6 +320,7 @@ class SimpleWorkingBot:
                         else:
                             await update.message.reply_video(
                                 video=media_file,
+                                filename=video_obj.filename,
                                 caption=f"✅ {video_obj.platform.title()}dan video yuklab olindi!\n\n"
                                        f"🎥 Sarlavha: {video_obj.title}\n"
                                        f"📅 Yuklangan: {video_obj.completed_at.strftime('%Y-%m-%d %H:%M')}"